@@ -0,0 +1,2 @@
+from . import bench_buffers, bench_engine, bench_writer
+from .common import BENCHMARKS
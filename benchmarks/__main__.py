@@ -0,0 +1,96 @@
+"""
+Microbenchmarks of the framework overhead of TorchLiter.
+
+Usage:
+
+```
+python -m benchmarks --output results.json
+python -m benchmarks --output results.json --baseline baseline.json
+```
+
+All metrics are seconds per operation, lower is better. With `--baseline`,
+metrics slower than the baseline by more than `--tolerance` are reported as
+regressions and the exit code is 1.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+import torchliter
+
+from . import BENCHMARKS
+
+
+def run(names: List[str], scale: int) -> Dict[str, Dict[str, float]]:
+    torch.set_num_threads(1)
+    results = {}
+    for name in names:
+        print(f">> {name}", file=sys.stderr)
+        results[name] = BENCHMARKS[name](scale)
+        for metric, value in results[name].items():
+            print(f"   {metric}: {value * 1e6:.3f} us", file=sys.stderr)
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if not reference:
+                continue
+            ratio = value / reference
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{name}.{metric}: {value * 1e6:.3f} us vs"
+                    f" {reference * 1e6:.3f} us ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--scale", type=int, default=2000)
+    parser.add_argument("--only", nargs="*", default=sorted(BENCHMARKS))
+    args = parser.parse_args()
+
+    results = run(args.only, args.scale)
+    payload = {
+        "meta": {
+            "torchliter": torchliter.__version__,
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scale": args.scale,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(payload, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import random
+import warnings
+
+import numpy as np
+import torch
+
+import torchliter.engine.buffers as buffers
+
+from .common import benchmark, best_of
+
+# buffer class name -> (constructor, update value, statistics to read)
+BUFFER_CASES = {
+    "SequenceContainer": (lambda: buffers.SequenceContainer(), [1.0, 2.0], ("values",)),
+    "ArrayContainer": (
+        lambda: buffers.ArrayContainer(),
+        np.ones((32, 16), dtype=np.float32),
+        ("values",),
+    ),
+    "ExponentialMovingAverage": (
+        lambda: buffers.ExponentialMovingAverage(0.01),
+        1.0,
+        ("mean", "std"),
+    ),
+    "ScalarSummaryStatistics": (
+        lambda: buffers.ScalarSummaryStatistics(),
+        1.0,
+        ("mean", "median", "std", "max", "min"),
+    ),
+    "ScalarSummaryStatistics_sketched": (
+        lambda: buffers.ScalarSummaryStatistics(rank_error=0.01),
+        1.0,
+        ("mean", "median", "std", "max", "min"),
+    ),
+    "ScalarSmoother": (
+        lambda: buffers.ScalarSmoother(1000),
+        1.0,
+        ("mean", "median", "std", "max", "min"),
+    ),
+    "ModelEMA": (
+        lambda: buffers.ModelEMA(
+            torch.nn.Sequential(*(torch.nn.Linear(64, 64) for _ in range(32)))
+        ),
+        None,
+        ("state_dict",),
+    ),
+    "HistogramBuffer": (
+        lambda: buffers.HistogramBuffer(-4.0, 4.0, bins=100),
+        torch.randn(256, 256),
+        ("median", "mean"),
+    ),
+    "ThroughputMeter": (
+        lambda: buffers.ThroughputMeter(),
+        32,
+        ("summary",),
+    ),
+    "TimeWindowSmoother": (
+        lambda: buffers.TimeWindowSmoother(60.0),
+        1.0,
+        ("mean", "median", "std", "max", "min"),
+    ),
+    "BufferBank": (
+        lambda: buffers.BufferBank([f"metric_{i}" for i in range(16)]),
+        {f"metric_{i}": 1.0 for i in range(16)},
+        ("summary",),
+    ),
+}
+
+
+@benchmark("buffers")
+def buffer_throughput(scale: int):
+    missing = set(buffers.__all__) - set(BUFFER_CASES) - {"BufferBase"}
+    if missing:
+        warnings.warn(f"Buffers without benchmark: {sorted(missing)}")
+
+    results = {}
+    for name, (build, value, stats) in BUFFER_CASES.items():
+        buffer = build()
+        results[f"{name}_update"] = best_of(lambda: buffer.update(value), scale)
+
+        # reads on a filled buffer
+        buffer = build()
+        for _ in range(min(scale, 10000)):
+            buffer.update(value if not isinstance(value, float) else random.random())
+
+        def read():
+            for stat in stats:
+                value = getattr(buffer, stat)
+                if callable(value):
+                    value()
+
+        results[f"{name}_read"] = best_of(read, max(1, scale // 100))
+    return results
+
+
+@benchmark("buffers_update_many")
+def buffer_batch_throughput(scale: int):
+    batch = torch.rand(1024, dtype=torch.float64)
+    cases = {
+        "ExponentialMovingAverage": lambda: buffers.ExponentialMovingAverage(
+            0.01, batched=True
+        ),
+        "ScalarSummaryStatistics": lambda: buffers.ScalarSummaryStatistics(),
+        "ScalarSmoother": lambda: buffers.ScalarSmoother(1000),
+    }
+    results = {}
+    for name, build in cases.items():
+        buffer = build()
+        number = max(1, scale // 100)
+        results[f"{name}_per_value"] = best_of(
+            lambda: buffer.update_many(batch), number
+        ) / len(batch)
+    return results
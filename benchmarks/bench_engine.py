@@ -0,0 +1,123 @@
+import torch
+import torch.nn as nn
+
+import torchliter
+from torchliter.engine.events import PostIterationHandler
+
+from .common import benchmark, best_of
+
+
+def _batches(num_batches: int):
+    # pre-collated batches, such that data loading is not measured
+    data = [torch.randn(4, 8) for _ in range(num_batches)]
+    return torch.utils.data.DataLoader(data, batch_size=None)
+
+
+def _step(model, optimizer, batch):
+    loss = model(batch).mean()
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+    return loss
+
+
+class _LoopEngine(torchliter.engine.EngineBase):
+    def __init__(self, num_batches: int):
+        super().__init__()
+        self.model = nn.Linear(8, 1)
+        self.optimizer = torch.optim.SGD(self.model.parameters(), lr=1e-3)
+        self.dataloader = _batches(num_batches)
+
+    def per_batch(self, batch):
+        _step(self.model, self.optimizer, batch)
+
+
+@benchmark("engine_base_per_epoch")
+def engine_base_per_epoch(scale: int):
+    engine = _LoopEngine(scale)
+    model, optimizer, dataloader = engine.model, engine.optimizer, engine.dataloader
+
+    def raw_loop():
+        for batch in dataloader:
+            _step(model, optimizer, batch)
+
+    def engine_loop():
+        engine(torchliter.stub.Train("dataloader")(1))
+
+    raw = best_of(raw_loop, 1) / scale
+    engine_time = best_of(engine_loop, 1) / scale
+    return {
+        "raw_per_iteration": raw,
+        "engine_per_iteration": engine_time,
+        "overhead_per_iteration": max(engine_time - raw, 0.0),
+    }
+
+
+@benchmark("auto_engine_to_buffer")
+def auto_engine_to_buffer(scale: int):
+    def train_step(_, batch, **kwargs):
+        loss = _step(_.model, _.optimizer, batch)
+        yield "loss", loss.detach()
+        yield "batch mean", batch.mean()
+
+    model = nn.Linear(8, 1)
+    buffers = torchliter.engine.AutoEngine.auto_buffers(
+        train_step, torchliter.buffers.ExponentialMovingAverage
+    )
+    engine = torchliter.engine.AutoEngine.build("BenchEngine", train_step)(
+        model=model,
+        optimizer=torch.optim.SGD(model.parameters(), lr=1e-3),
+        dataloader=_batches(scale),
+        **buffers,
+    )
+    raw_engine = _LoopEngine(scale)
+
+    def auto_loop():
+        engine(torchliter.stub.Train("dataloader")(1))
+
+    def base_loop():
+        raw_engine(torchliter.stub.Train("dataloader")(1))
+
+    auto = best_of(auto_loop, 1) / scale
+    base = best_of(base_loop, 1) / scale
+    return {
+        "auto_per_iteration": auto,
+        "overhead_vs_engine_base": max(auto - base, 0.0),
+    }
+
+
+@benchmark("engine_event_dispatch")
+def engine_event_dispatch(scale: int):
+    results = {}
+    for num_handlers in (0, 10, 100):
+        for every, label in ((1, "dense"), (1000, "sparse")):
+            engine = torchliter.engine.Engine()
+            for _ in range(num_handlers):
+                engine.attach_event(PostIterationHandler(lambda _: None, every=every))
+            engine.current_stub = torchliter.stub.Train("dataloader")
+
+            def dispatch():
+                engine.iteration += 1
+                engine.after_iteration()
+
+            key = f"{label}_{num_handlers}_handlers_per_iteration"
+            results[key] = best_of(dispatch, scale)
+    return results
+
+
+@benchmark("engine_state_dict")
+def engine_state_dict(scale: int):
+    engine = torchliter.engine.EngineBase()
+    engine.model = nn.Sequential(nn.Linear(256, 256), nn.ReLU(), nn.Linear(256, 256))
+    engine.optimizer = torch.optim.Adam(engine.model.parameters())
+    engine.model(torch.randn(2, 256)).sum().backward()
+    engine.optimizer.step()
+    engine.ema = torchliter.buffers.ExponentialMovingAverage()
+    engine.ema(1.0)
+
+    state = engine.state_dict()
+    number = max(1, scale // 100)
+    return {
+        "state_dict": best_of(engine.state_dict, number),
+        "load_state_dict": best_of(lambda: engine.load_state_dict(state), number),
+    }
@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+from torchliter.writer import CSVWriter
+
+from .common import benchmark, best_of
+
+
+@benchmark("csv_writer")
+def csv_writer(scale: int):
+    row = {"epoch": 1, "iteration": 10, "loss": 0.123456, "acc": 0.98765}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.csv")
+        with CSVWriter(path, list(row)) as writer:
+            write_row = best_of(lambda: writer.write_row(row), scale)
+    return {"write_row": write_row}
@@ -0,0 +1,52 @@
+import gc
+import time
+from typing import Callable, Dict
+
+__all__ = ["BENCHMARKS", "benchmark", "best_of"]
+
+BENCHMARKS: Dict[str, Callable[[int], Dict[str, float]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    """
+    Registers a benchmark function.
+
+    The function takes a `scale` (number of operations to time) and returns
+    a dict of metrics in seconds, lower is better.
+    """
+
+    def decorator(func: Callable[[int], Dict[str, float]]):
+        assert name not in BENCHMARKS, f"Benchmark `{name}` already exists."
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def best_of(func: Callable[[], None], number: int, repeat: int = 5) -> float:
+    """
+    Returns the best time per call of `func` in seconds.
+
+    Parameters
+    ----------
+    func : Callable[[], None]
+        Function to time
+    number : int
+        Number of calls per measurement
+    repeat : int, optional
+        Number of measurements, by default 5
+    """
+    number = max(1, int(number))
+    best = float("inf")
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            best = min(best, (time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# usage: scripts/benchmark.sh [--baseline baseline.json] [--only buffers csv_writer]
+PYTHONPATH=src python -m benchmarks --output bench_output.json "$@"
@@ -2,4 +2,6 @@ from .. import REPR_INDENT
 from .auto import *
 from .base import *
 from .buffers import *
+from .distributed import *
 from .events import *
+from .executor import *
@@ -2,10 +2,18 @@ import warnings
 from inspect import isfunction, isgeneratorfunction
 from typing import Any, Callable, Dict, Generator, Optional, Tuple, Type, Union
 
+from torch.optim.lr_scheduler import ReduceLROnPlateau
+
 from .. import REPR_INDENT
 from ..factory import FACTORY_PRODUCT_REGISTRY, FactoryRecord
 from ..utils import _convert_str_to_py_object_name as _py_name
-from .buffers import BufferBase, ExponentialMovingAverage, ScalarSummaryStatistics
+from .buffers import (
+    BufferBank,
+    BufferBase,
+    ExponentialMovingAverage,
+    ModelEMA,
+    ScalarSummaryStatistics,
+)
 from .events import Engine, EventHandler
 from .utils import _find_output_names, to_buffer
 
@@ -120,11 +128,11 @@ class AutoEngine(Engine):
          loss.backward()
          _.optimizer.step()
 
-         yield "cross entropy loss", loss.item()
+         yield "cross entropy loss", loss.detach()
 
          acc = (logits.max(-1).indices == target).float().mean()
 
-         yield "train acc", acc.item()
+         yield "train acc", acc
 
      def eval_step(_, batch, **kwargs):
          image, target = batch
@@ -148,6 +156,24 @@ class AutoEngine(Engine):
      test_engine = TestEngineClass(**{**cart.kwargs, **train_buffers, **eval_buffers})
 
     ```
+
+    Gradient accumulation:
+
+    With `Train("train_loader", accumulate=8)` (or `accumulate=8` on the engine),
+    8 consecutive batches make one iteration. Use `backward` and
+    `optimizer_step` in the train step, the optimizers, gradscaler and
+    schedulers are stepped only at the accumulation boundaries and the
+    buffers receive the mean over the micro-batches.
+
+    ```
+    def train_step(_, batch, **kwargs):
+        image, target = batch
+        loss = F.cross_entropy(_.model(image), target)
+        _.backward(loss)
+        _.optimizer_step()
+
+        yield "cross entropy loss", loss.detach()
+    ```
     """
 
     def __init__(self, *events, **kwargs):
@@ -179,6 +205,80 @@ class AutoEngine(Engine):
 
         warnings.warn(f"Current stub type {type(self.current_stub)} is not recognized.")
 
+    def _find_gradscaler(self) -> Optional[Any]:
+        """Returns the registered gradscaler if any."""
+        if len(self.gradscaler_registry) > 1:
+            raise RuntimeError(
+                "Multiple gradscalers are registered: "
+                f"{list(self.gradscaler_registry)}."
+            )
+        for scaler in self.gradscaler_registry.values():
+            return scaler
+        return None
+
+    def backward(self, loss: Any, **kwargs: Any) -> None:
+        """
+        Backward pass of a micro-batch loss.
+
+        The loss is divided by the size of the accumulation group and scaled
+        by the gradscaler if registered.
+
+        Parameters
+        ----------
+        loss : Tensor
+            Loss of current micro-batch
+        **kwargs : Any
+            Keyword arguments of `Tensor.backward`
+        """
+        size = self.accumulation_size
+        if size > 1:
+            loss = loss / size
+        scaler = self._find_gradscaler()
+        if scaler is not None:
+            loss = scaler.scale(loss)
+        loss.backward(**kwargs)
+
+    def optimizer_step(self, step_schedulers: bool = True) -> bool:
+        """
+        Steps the registered optimizers at accumulation boundaries.
+
+        At a boundary, every optimizer is stepped (through the gradscaler if
+        registered), the gradscaler is updated, schedulers other than
+        `ReduceLROnPlateau` are stepped, the gradients are zeroed and the
+        registered `ModelEMA` buffers are updated.
+
+        Parameters
+        ----------
+        step_schedulers : bool, optional
+            Whether or not step the schedulers, by default True
+
+        Returns
+        -------
+        bool
+            True if the optimizers were stepped
+        """
+        if not self.is_accumulation_boundary:
+            return False
+
+        scaler = self._find_gradscaler()
+        for optimizer in self.optimizer_registry.values():
+            if scaler is not None:
+                scaler.step(optimizer)
+            else:
+                optimizer.step()
+        if scaler is not None:
+            scaler.update()
+        if step_schedulers:
+            for scheduler in self.scheduler_registry.values():
+                if not isinstance(scheduler, ReduceLROnPlateau):
+                    scheduler.step()
+        for optimizer in self.optimizer_registry.values():
+            optimizer.zero_grad()
+        for buffer in self.buffer_registry.values():
+            if isinstance(buffer, ModelEMA):
+                buffer.update()
+        return True
+
     @to_buffer()
     def train_step(self, batch: Any, **kwargs: Any) -> Generator:
         """
@@ -255,3 +355,8 @@ class AutoEngine(Engine):
     ):
         names = [_py_name(n) for n in _find_output_names(step_function)]
         return {n: buffer_type(**buffer_kwargs) for n in names}
+
+    @staticmethod
+    def auto_buffer_bank(step_function: Generator, **bank_kwargs) -> BufferBank:
+        """Returns a `BufferBank` of the names yielded by `step_function`."""
+        return BufferBank(names=_find_output_names(step_function), **bank_kwargs)
@@ -1,11 +1,21 @@
 import collections
+import time
 import warnings
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from .. import REPR_INDENT
 from ..exception import BreakIteration, ContinueIteration
-from ..stub import Evaluate, Lambda, StubBase, Train
+from ..stub import Evaluate, Lambda, Repeat, StubBase, Train, build_stub
 from ._types import COMPONENTS, map_str_to_types, map_types_to_str
+from .buffers import ThroughputMeter
+from .profiler import EngineProfiler
+from .utils import (
+    BatchPrefetcher,
+    get_sampler_rng_state,
+    infer_batch_size,
+    set_sampler_rng_state,
+    skip_batches,
+)
 
 __all__ = ["EngineBase"]
 
@@ -28,6 +38,23 @@ class EngineBase:
         Total number of iterations in an epoch
     absolute_iterations : int
         absolute_iterations = epoch_length * epoch + iteration
+    global_iteration : int
+        Number of train iterations since the engine was reset, which does not
+        depend on the lengths of the epochs
+    samples_seen : int
+        Number of train samples since the engine was reset
+    elapsed_seconds : float
+        Wall-clock seconds since the engine was reset
+    _profiler : Optional[EngineProfiler]
+        Timings of the engine loop if profiling is enabled
+    prefetch : int
+        Default number of batches prefetched on a background thread,
+        0 disables prefetching. Stubs can override it with a `prefetch` kwarg.
+    accumulate : int
+        Default number of micro-batches per optimizer step of train stubs.
+        Train stubs can override it with an `accumulate` kwarg.
+    micro_iteration : int
+        Index of current micro-batch within the accumulation group
     _registry : Tuple[Dict[str, Any]]
         Registry of engine components.
     """
@@ -38,6 +65,12 @@ class EngineBase:
     fractional_iteration: float
     epoch_length: Optional[int]
     absolute_iterations: int
+    global_iteration: int
+    samples_seen: int
+    elapsed_seconds: float
+    prefetch: int = 0
+    accumulate: int = 1
+    micro_iteration: int
 
     _registry: Tuple[Dict[str, Any]] = tuple(
         [f"{c}_registry" for c in map_str_to_types]
@@ -46,6 +79,9 @@ class EngineBase:
     def __init__(self):
         for name in self._registry:
             object.__setattr__(self, name, {})
+        # bumped when a component is registered or deregistered
+        object.__setattr__(self, "_registry_version", 0)
+        self._profiler = None
         self.reset_engine()
 
     def reset_engine(self) -> None:
@@ -56,10 +92,25 @@ class EngineBase:
         """
         self.epoch = 0
         self.iteration = 0
+        self.micro_iteration = 0
+        self.global_iteration = 0
+        self.samples_seen = 0
+        self._clock_start = time.perf_counter()
+        # last crossings of non-periodic schedules, and the level values they
+        # start from, see `load_state_dict`
+        self._crossings = {}
+        self._level_origins = {}
         self.epoch_length = None
+        self._batch_index = 0
+        self._num_batches = None
+        self._accumulation_staging = {}
         self.stubs_in_queue = collections.deque()
+        # stubs of a loaded state dict, queued if the engine is called without
+        # stubs
+        self._restored_stubs = collections.deque()
         self.stubs_done = []
         self.current_stub = None
+        self._in_epoch = False
 
     def __setattr__(self, name: str, value: Any):
         """
@@ -103,6 +154,7 @@ class EngineBase:
             "Components should be registered and deregistered "
             "through setting and deleting attribues."
             registry[name] = value
+            object.__setattr__(self, "_registry_version", self._registry_version + 1)
 
         object.__setattr__(self, name, value)
 
@@ -120,6 +172,7 @@ class EngineBase:
                     break
             registry = getattr(self, f"{typestr}_registry")
             del registry[name]
+            object.__setattr__(self, "_registry_version", self._registry_version + 1)
 
         object.__delattr__(self, name)
 
@@ -134,7 +187,13 @@ class EngineBase:
         """
         out = {}
 
-        out["engine"] = {"epoch": self.epoch, "iteration": self.iteration}
+        out["engine"] = {
+            "epoch": self.epoch,
+            "iteration": self.iteration,
+            "global_iteration": self.global_iteration,
+            "samples_seen": self.samples_seen,
+            "stubs": [stub.state_dict() for stub in self._pending_stubs()],
+        }
 
         for rname in self._registry:
             registry = getattr(self, rname)
@@ -147,6 +206,14 @@ class EngineBase:
 
         return out
 
+    def _pending_stubs(self) -> List[StubBase]:
+        """Returns the stubs to execute including the one in progress."""
+        stubs = list(self._restored_stubs) + list(self.stubs_in_queue)
+        in_progress = self._in_epoch and self.current_stub is not None
+        if in_progress and not (stubs and stubs[0] is self.current_stub):
+            stubs.insert(0, self.current_stub)
+        return stubs
+
     def load_state_dict(self, state_dict: Dict[str, Dict[str, Any]]) -> None:
         """
         Load state into engine.
@@ -175,6 +242,19 @@ class EngineBase:
                 else:
                     self.epoch = epoch
                     self.iteration = iteration
+                    self.global_iteration = int(cstate.get("global_iteration", 0))
+                    self.samples_seen = int(cstate.get("samples_seen", 0))
+                    # schedules resume from the loaded values
+                    self._crossings = {}
+                    self._level_origins = {
+                        "global_iteration": self.global_iteration,
+                        "samples_seen": self.samples_seen,
+                        "elapsed_seconds": self.elapsed_seconds,
+                    }
+                if "stubs" in cstate:
+                    self._restored_stubs = collections.deque(
+                        build_stub(stub) for stub in cstate["stubs"]
+                    )
                 continue
 
             # otherwise
@@ -224,6 +304,32 @@ class EngineBase:
     def absolute_iterations(self) -> int:
         return self.epoch * self.epoch_length + self.iteration
 
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self._clock_start
+
+    @property
+    def accumulation_steps(self) -> int:
+        """Number of micro-batches per optimizer step in current stub."""
+        if not self.is_train_stub:
+            return 1
+        return max(1, int(getattr(self.current_stub, "accumulate", self.accumulate)))
+
+    @property
+    def accumulation_size(self) -> int:
+        """Number of micro-batches in current accumulation group, the last group
+        of an epoch can be smaller than `accumulation_steps`."""
+        steps = self.accumulation_steps
+        if steps == 1 or self._num_batches is None:
+            return steps
+        remaining = self._num_batches - (self._batch_index - self.micro_iteration)
+        return max(1, min(steps, remaining))
+
+    @property
+    def is_accumulation_boundary(self) -> bool:
+        """Whether current micro-batch completes an optimizer step."""
+        return self.micro_iteration + 1 >= self.accumulation_size
+
     @property
     def is_train_stub(self) -> bool:
         return isinstance(self.current_stub, Train)
@@ -236,6 +342,40 @@ class EngineBase:
     def is_lambda_stub(self) -> bool:
         return isinstance(self.current_stub, Lambda)
 
+    def _batch_transfer(self) -> Optional[Callable[[Any], Any]]:
+        """Returns the `transfer` function of current stub if any."""
+        transfer = getattr(self.current_stub, "transfer", None)
+        if isinstance(transfer, str):
+            transfer = getattr(self, transfer)
+        return transfer
+
+    def iterate_batches(self, dataloader: Iterable) -> Iterable:
+        """
+        Returns the batch iterable of current stub.
+
+        If `prefetch` (stub kwarg or engine attribute) is positive, the batches
+        are pulled on a background thread by `BatchPrefetcher`. The stub kwarg
+        `transfer`, either a callable or the name of an engine method, is
+        applied to every batch, on the background thread when prefetching.
+
+        Parameters
+        ----------
+        dataloader : Iterable
+            Dataloader of current stub
+
+        Returns
+        -------
+        Iterable
+            Batches
+        """
+        prefetch = int(getattr(self.current_stub, "prefetch", self.prefetch) or 0)
+        transfer = self._batch_transfer()
+        if prefetch > 0:
+            return BatchPrefetcher(dataloader, depth=prefetch, transfer=transfer)
+        if transfer is not None:
+            return map(transfer, dataloader)
+        return dataloader
+
     def per_epoch(self, **kwargs):
         """
         Train, eval model or performe a lambda op by one epoch.
@@ -252,7 +392,11 @@ class EngineBase:
                 f"`{self.current_stub.dataloader}` is not in dataloader registry."
             )
 
-        self.epoch_length = len(dataloader)
+        self._num_batches = len(dataloader)
+        # one iteration is one optimizer step
+        self.epoch_length = -(-self._num_batches // self.accumulation_steps)
+        self.micro_iteration = 0
+        self._accumulation_staging.clear()
         self.when_epoch_starts()
         try:
             # if current stub was paused, then pick up from there
@@ -262,34 +406,144 @@ class EngineBase:
             # if stub does not have iteration
             self.current_stub.iteration = 0
 
-        for batch in dataloader:
-            try:
-                self.before_iteration()
-                self.per_batch(batch, **kwargs)  # the iteration
-                self.current_stub.iteration += 1
-                if self.is_train_stub:
-                    self.iteration += 1
-                self.after_iteration()
-                if self.iteration == self.epoch_length:
-                    # terminate such that total iterations equal epoch length
-                    # NOTE: so far assume sampling with replacement
-                    # which is a good approximiation if batch is large
-                    # TODO: add sampling without replacement
-                    raise BreakIteration(False)
-            except ContinueIteration:
-                continue
-            except BreakIteration as e:
-                if e.shutdown_engine:
-                    raise BreakIteration
-                break
-            except Exception as e:
-                raise e
+        # resume a paused stub from the batch position at which it stopped,
+        # the sampler replays the same order from the saved random state
+        position = int(getattr(self.current_stub, "_position", 0))
+        if position > 0 and hasattr(self.current_stub, "_rng_state"):
+            set_sampler_rng_state(dataloader, self.current_stub._rng_state)
+            dataloader = skip_batches(dataloader, position)
+        else:
+            position = 0
+            self.current_stub._rng_state = get_sampler_rng_state(dataloader)
+        self.current_stub._position = position
+
+        meters = [
+            buffer
+            for buffer in self.buffer_registry.values()
+            if isinstance(buffer, ThroughputMeter) and buffer.auto
+        ]
+        for meter in meters:
+            meter.start(total=self._num_batches - position)
+        count_samples = self.is_train_stub
+
+        batches = self.iterate_batches(dataloader)
+        if self._profiler is not None:
+            batches = self._profiler.iterate(batches)
+        self._in_epoch = True
+        try:
+            for index, batch in enumerate(batches, start=position):
+                self._batch_index = index
+                try:
+                    if self.micro_iteration == 0:
+                        self.before_iteration()
+                    self.per_batch(batch, **kwargs)  # the iteration
+                    if meters or count_samples:
+                        size = infer_batch_size(batch) or 1
+                        if count_samples:
+                            self.samples_seen += size
+                        for meter in meters:
+                            meter.update(size)
+                    if not self.is_accumulation_boundary:
+                        self.micro_iteration += 1
+                        continue
+                    self.micro_iteration = 0
+                    self.current_stub._position = index + 1
+                    self.current_stub.iteration += 1
+                    if self.is_train_stub:
+                        self.iteration += 1
+                        self.global_iteration += 1
+                    self.after_iteration()
+                    if self.iteration == self.epoch_length:
+                        # terminate such that total iterations equal epoch length
+                        # NOTE: so far assume sampling with replacement
+                        # which is a good approximiation if batch is large
+                        # TODO: add sampling without replacement
+                        raise BreakIteration(False)
+                except ContinueIteration:
+                    # the skipped batch keeps its place in the accumulation
+                    # group, such that the groups stay aligned with the epoch
+                    if self.is_accumulation_boundary:
+                        self.micro_iteration = 0
+                        self.current_stub._position = index + 1
+                    else:
+                        self.micro_iteration += 1
+                    continue
+                except BreakIteration as e:
+                    if e.shutdown_engine:
+                        raise BreakIteration
+                    break
+                except Exception as e:
+                    raise e
+        finally:
+            if hasattr(batches, "close"):
+                # shut down the producer thread on break, error or interrupt
+                batches.close()
+            self._in_epoch = False
 
         # update engine epoch only when stub is Train
         if self.is_train_stub:
             self.epoch += 1
         self.when_epoch_finishes()
 
+    def enable_profiling(self, window: int = 1000) -> EngineProfiler:
+        """
+        Enables the timing of the engine loop.
+
+        The engine hooks are shadowed by timed wrappers and the timings of
+        each phase are kept in `profile_<phase>` buffers. They are not in the
+        buffer registry, such that they are not saved in the state dict nor
+        reduced across ranks. When profiling is disabled, the engine loop is
+        untouched.
+
+        Parameters
+        ----------
+        window : int, optional
+            Number of recent timings kept per phase, by default 1000
+
+        Returns
+        -------
+        EngineProfiler
+            The profiler
+        """
+        if self._profiler is not None:
+            self.disable_profiling()
+        profiler = EngineProfiler(window)
+        for method, phase in profiler.HOOKS.items():
+            # keep the methods set on the instance to restore them later
+            profiler.shadowed[method] = self.__dict__.get(method)
+            timed = profiler.wrap(getattr(self, method), phase)
+            object.__setattr__(self, method, timed)
+        for phase, buffer in profiler.buffers.items():
+            object.__setattr__(self, f"profile_{phase}", buffer)
+        self._profiler = profiler
+        return profiler
+
+    def disable_profiling(self) -> None:
+        """Disables the timing of the engine loop and removes its buffers."""
+        if self._profiler is None:
+            return
+        for method, original in self._profiler.shadowed.items():
+            if original is None:
+                object.__delattr__(self, method)
+            else:
+                object.__setattr__(self, method, original)
+        for phase in self._profiler.PHASES:
+            object.__delattr__(self, f"profile_{phase}")
+        self._profiler = None
+
+    def profile_summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Summary of the engine loop timings, see `EngineProfiler.summary`.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Dict[str, float]]]
+            Timings of phases and handlers
+        """
+        if self._profiler is None:
+            raise RuntimeError("Profiling is not enabled, see `enable_profiling`.")
+        return self._profiler.summary()
+
     def queue(self, stubs: List[StubBase]) -> None:
         """
         Adds stubs to queue.
@@ -308,6 +562,7 @@ class EngineBase:
     def reset_queue(self) -> None:
         """Resets stubs queue to empty."""
         self.stubs_in_queue = collections.deque()
+        self._restored_stubs = collections.deque()
 
     def execute(self, **kwargs: Any) -> None:
         """
@@ -328,6 +583,14 @@ class EngineBase:
         """
         while len(self.stubs_in_queue) > 0:
             self.current_stub = self.stubs_in_queue.popleft()
+            if isinstance(self.current_stub, Repeat):
+                # copies of a lazy range are made one at a time
+                repeat = self.current_stub
+                if len(repeat) == 0:
+                    continue
+                self.current_stub = repeat.pop()
+                if len(repeat) > 0:
+                    self.stubs_in_queue.appendleft(repeat)
             if hasattr(self.current_stub, "dataloader"):
                 try:
                     self.per_epoch(**kwargs)
@@ -354,7 +617,8 @@ class EngineBase:
         Parameters
         ----------
         stubs : Optional[List[StubBase]]
-            A Todo list of stubs
+            A Todo list of stubs. If empty, the stubs pending in a loaded state
+            dict are resumed, otherwise they are discarded.
         **kwargs : Any
             Keyword arguments for the engine
 
@@ -367,8 +631,11 @@ class EngineBase:
         KeyboardInterrupt
             When raised current iteration is written to the current stub.
         """
+        restored, self._restored_stubs = self._restored_stubs, collections.deque()
         if stubs:
             self.queue(stubs)
+        elif restored:
+            self.stubs_in_queue.extendleft(reversed(restored))
         elif len(self.stubs_in_queue) == 0:
             raise ValueError("No job in queue. Stubs should not be empty")
 
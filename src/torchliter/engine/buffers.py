@@ -1,22 +1,48 @@
+import bisect
 import collections
-from typing import Any, List, Optional, Tuple, Union
+import contextlib
+import math
+import os
+import shutil
+import tempfile
+import time
+import weakref
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
-from torch import Tensor
+import torch
+from torch import Tensor, nn
 
+from ..utils import _attributes
+from ..utils import _convert_str_to_py_object_name as _py_name
 from . import REPR_INDENT
+from .sketch import KLLSketch, Moments
 
 __all__ = [
     "BufferBase",
     "SequenceContainer",
+    "ArrayContainer",
     "ExponentialMovingAverage",
     "ScalarSummaryStatistics",
     "ScalarSmoother",
+    "BufferBank",
+    "ModelEMA",
+    "HistogramBuffer",
+    "ThroughputMeter",
+    "TimeWindowSmoother",
 ]
 
 
 class BufferBase:
-    """Buffer base class."""
+    """
+    Buffer base class.
+
+    Subclasses store their arguments and state in `__slots__`. Other kwargs
+    are stored in the instance `__dict__`, which is only allocated when used.
+    """
+
+    __slots__ = ("__dict__", "__weakref__")
 
     def __init__(self, *args, **kwargs):
         assert len(args) == 0, "There should not be any args only kwargs allowed."
@@ -24,9 +50,21 @@ class BufferBase:
             setattr(self, k, v)
         self.reset()
 
+    # whether 1-D arrays and tensors are pushed as batches by `to_buffer`
+    batched: bool = False
+    # how `to_buffer` combines the values of the micro-batches of a gradient
+    # accumulation group: "mean", "sum", "each" (one update per value) or
+    # "concat" (one batch of the flattened values)
+    accumulation: str = "mean"
+
     def update(self, x: Any):
         raise NotImplementedError("Method `update` must be implemented.")
 
+    def update_many(self, values: Union[Sequence, np.ndarray, Tensor]):
+        """Updates the buffer with a batch of observations."""
+        for x in values:
+            self.update(x)
+
     def reset(self):
         raise NotImplementedError("Method `reset` must be implemented.")
 
@@ -36,13 +74,37 @@ class BufferBase:
     def load_state_dict(self, state_dict):
         raise NotImplementedError("Method `load_state_dict` must be implemented.")
 
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Reduces the states of buffers over disjoint streams into one state.
+
+        The states are `state_dict` payloads of buffers built with the same
+        arguments, e.g. gathered from threads, processes or ranks.
+
+        Parameters
+        ----------
+        states : List[Dict[str, Any]]
+            States to reduce
+
+        Returns
+        -------
+        Dict[str, Any]
+            State of the buffer over all streams
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot be reduced.")
+
+    def merge(self, other: "BufferBase") -> "BufferBase":
+        """Merges the stream of `other` into the buffer in place."""
+        self.load_state_dict(self.reduce([self.state_dict(), other.state_dict()]))
+        return self
+
     def __call__(self, x: Any):
         self.update(x)
 
     def __repr__(self):
         out = []
         out.append(self.__class__.__name__)
-        for k, v in self.__dict__.items():
+        for k, v in _attributes(self).items():
             if k.startswith("_"):
                 continue
             out.append(" " * REPR_INDENT + f"{k}: {v}")
@@ -52,7 +114,11 @@ class BufferBase:
 class SequenceContainer(BufferBase):
     """Sequence container Ingests new values and extends `self.value`"""
 
+    __slots__ = ("values",)
+
     values: List[Any]
+    batched = True
+    accumulation = "each"
 
     def reset(self):
         self.values = []
@@ -61,16 +127,187 @@ class SequenceContainer(BufferBase):
         s = list(sequence)
         self.values.extend(s)
 
+    def update_many(self, values: Union[Sequence, np.ndarray, Tensor]):
+        # the elements are kept as they are given by `update`, e.g. 0-d tensors
+        if isinstance(values, Tensor):
+            values = values.unbind(0)
+        self.values.extend(values)
+
     def state_dict(self):
         return dict(values=self.values)
 
     def load_state_dict(self, state_dict):
         self.values = list(state_dict["values"])
 
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        values = []
+        for state in states:
+            values.extend(state["values"])
+        return {"values": values}
+
     def __len__(self) -> int:
         return len(self.values)
 
 
+class ArrayContainer(BufferBase):
+    """
+    Typed container of batches of arrays, e.g. predictions or embeddings.
+
+    The rows of the ingested batches are copied into preallocated NumPy
+    storage, which grows geometrically. When the storage would exceed
+    `max_memory` bytes, it is moved to a `np.memmap` file in a temporary
+    directory (in `spill_dir` if given), which is removed on `reset`.
+    `values` returns the collected rows as one contiguous array without a copy.
+
+    Parameters
+    ----------
+    dtype : Optional[Any], optional
+        NumPy dtype of the storage, by default the dtype of the first batch
+    capacity : int, optional
+        Initial number of rows, by default 1024
+    max_memory : Optional[int], optional
+        Bytes of in-memory storage before spilling to disk, by default None
+        (never spill)
+    spill_dir : Optional[str], optional
+        Directory of the temporary spill files, by default None
+    """
+
+    __slots__ = (
+        "dtype",
+        "capacity",
+        "max_memory",
+        "spill_dir",
+        "_data",
+        "_size",
+        "_spill_path",
+        "_finalizer",
+    )
+
+    batched = True
+    accumulation = "each"
+
+    def __init__(
+        self,
+        dtype: Optional[Any] = None,
+        capacity: int = 1024,
+        max_memory: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        capacity = int(capacity)
+        assert capacity > 0, f"capacity should be positive but got {capacity}"
+        if max_memory is not None:
+            assert max_memory > 0, f"max_memory should be positive but got {max_memory}"
+        super().__init__(
+            dtype=dtype,
+            capacity=capacity,
+            max_memory=max_memory,
+            spill_dir=spill_dir,
+            **kwargs,
+        )
+
+    def reset(self):
+        self._release()
+        self._data = None
+        self._size = 0
+        self._spill_path = None
+
+    def _release(self):
+        if getattr(self, "_spill_path", None) is not None:
+            self._data = None
+            self._finalizer()
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_path is not None
+
+    @property
+    def values(self) -> np.ndarray:
+        if self._data is None:
+            return np.empty((0,), dtype=self.dtype)
+        return self._data[: self._size]
+
+    def update(self, batch: Union[Sequence, np.ndarray, Tensor]):
+        """Appends the rows of `batch`, a 0-d value is appended as one row."""
+        if isinstance(batch, Tensor):
+            batch = batch.detach().cpu().numpy()
+        dtype = self.dtype if self._data is None else self._data.dtype
+        batch = np.asarray(batch, dtype=dtype)
+        if batch.ndim == 0:
+            batch = batch.reshape(1)
+
+        if self._data is None:
+            self._data = self._allocate((self.capacity,) + batch.shape[1:], batch.dtype)
+        elif batch.shape[1:] != self._data.shape[1:]:
+            raise ValueError(
+                f"Rows of shape {batch.shape[1:]} do not match the rows of shape "
+                f"{self._data.shape[1:]} in the container."
+            )
+
+        size = self._size + len(batch)
+        if size > len(self._data):
+            self._grow(size)
+        self._data[self._size : size] = batch
+        self._size = size
+
+    def update_many(self, values: Union[Sequence, np.ndarray, Tensor]):
+        self.update(values)
+
+    def _grow(self, size: int):
+        capacity = len(self._data)
+        while capacity < size:
+            capacity *= 2
+        shape = (capacity,) + self._data.shape[1:]
+        dtype = self._data.dtype
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        if self.spilled:
+            # the file is extended in place, the rows are kept
+            self._data.flush()
+            self._data = None
+            with open(self._spill_path, "r+b") as f:
+                f.truncate(nbytes)
+            self._data = np.memmap(self._spill_path, dtype, "r+", shape=shape)
+            return
+
+        data = self._allocate(shape, dtype)
+        data[: self._size] = self._data[: self._size]
+        self._data = data
+
+    def _allocate(self, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        """Allocates in memory, or in a spill file beyond `max_memory`."""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.max_memory is None or nbytes <= self.max_memory:
+            return np.empty(shape, dtype=dtype)
+        directory = tempfile.mkdtemp(prefix="torchliter-", dir=self.spill_dir)
+        self._finalizer = weakref.finalize(
+            self, shutil.rmtree, directory, ignore_errors=True
+        )
+        self._spill_path = os.path.join(directory, "values.dat")
+        return np.memmap(self._spill_path, dtype, "w+", shape=shape)
+
+    def as_tensor(self) -> Tensor:
+        """Returns the collected rows as a tensor sharing the storage."""
+        return torch.from_numpy(self.values)
+
+    def state_dict(self):
+        return {"values": np.asarray(self.values)}
+
+    def load_state_dict(self, state_dict):
+        self.reset()
+        if len(state_dict["values"]) > 0:
+            self.update(state_dict["values"])
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        values = [np.asarray(s["values"]) for s in states if len(s["values"]) > 0]
+        if not values:
+            return {"values": np.empty((0,), dtype=self.dtype)}
+        return {"values": np.concatenate(values)}
+
+    def __len__(self) -> int:
+        return self._size
+
+
 class ExponentialMovingAverage(BufferBase):
     """
     Exponential Moving Average of a series of Tensors.
@@ -79,58 +316,461 @@ class ExponentialMovingAverage(BufferBase):
         EMA[x[t]] := (1 - alpha) * EMA[x[t-1]] + alpha * x[t]
     diff:
         delta[x[t]] := x[t] - EMA[x[t-1]]
+
+    Tensors are detached and the moving averages stay on their device. The
+    statistics of 0-d tensors are converted to Python floats only when read.
+    The statistics of floating point tensors of a fixed shape are updated in
+    place without allocating new tensors.
+
+    If `batched`, `to_buffer` pushes 1-D arrays and tensors as batches of
+    scalar observations to `update_many`, which applies the closed-form
+    multi-step update; otherwise they are averaged element-wise.
     """
 
+    __slots__ = ("alpha", "batched", "_mean", "_variance", "_delta", "_count")
+
     mean: Union[float, Tensor]
     variance: Union[float, Tensor]
 
     def __init__(
         self,
         alpha: float = 0.01,
+        batched: bool = False,
         **kwargs: Any,
     ):
         assert 0 <= alpha <= 1, "Value `alpha` should be in [0, 1]."
-        super().__init__(alpha=alpha, **kwargs)
+        super().__init__(alpha=alpha, batched=batched, **kwargs)
 
     def reset(self):
-        self.mean = None
-        self.variance = 0.0
+        self._mean = None
+        self._variance = 0.0
+        self._delta = None
         self._count = 0
 
     def update(self, x):
 
+        if isinstance(x, Tensor):
+            x = x.detach()
+            if x.is_floating_point():
+                if self._count == 0:
+                    self._mean = x.clone()
+                    self._variance = torch.zeros_like(x)
+                    self._delta = torch.zeros_like(x)
+                    self._count += 1
+                    return
+                if self._updates_in_place(x):
+                    self._update_in_place(x)
+                    return
+
         if self._count == 0:
-            self.mean = x
+            self._mean = x
 
-        delta = x - self.mean
+        delta = x - self._mean
 
-        self.mean = self.mean + self.alpha * delta
-        self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta**2)
+        self._mean = self._mean + self.alpha * delta
+        self._variance = (1 - self.alpha) * (self._variance + self.alpha * delta**2)
 
         self._count += 1
         self._delta = delta
 
+    def _updates_in_place(self, x: Tensor) -> bool:
+        return all(
+            isinstance(t, Tensor)
+            and t.shape == x.shape
+            and t.dtype == x.dtype
+            and t.device == x.device
+            for t in (self._mean, self._variance, self._delta)
+        )
+
+    def _update_in_place(self, x: Tensor):
+        # same update without allocating new tensors
+        delta = torch.sub(x, self._mean, out=self._delta)
+        self._mean.add_(delta, alpha=self.alpha)
+        self._variance.addcmul_(delta, delta, value=self.alpha).mul_(1 - self.alpha)
+        self._count += 1
+
+    def update_many(self, values: Union[Sequence[float], np.ndarray, Tensor]):
+        """
+        Updates the statistics with a batch of scalar observations.
+
+        The result equals `update` on each value in order, computed by
+        vectorized discounted sums.
+        """
+        if isinstance(values, Tensor):
+            x = values.detach().reshape(-1)
+            if not x.is_floating_point():
+                x = x.to(torch.get_default_dtype())
+            arange = partial(torch.arange, dtype=x.dtype, device=x.device)
+            limit = math.log(torch.finfo(x.dtype).max) / 2
+        else:
+            x = np.asarray(values, dtype=np.float64).reshape(-1)
+            arange = partial(np.arange, dtype=np.float64)
+            limit = math.log(np.finfo(np.float64).max) / 2
+        if len(x) == 0:
+            return
+
+        if self._count == 0:
+            mean, variance = x[0], 0.0 * x[0]
+        else:
+            mean, variance = self._mean, self._variance
+            if isinstance(x, Tensor):
+                mean = torch.as_tensor(mean, dtype=x.dtype, device=x.device)
+                variance = torch.as_tensor(variance, dtype=x.dtype, device=x.device)
+            else:
+                mean = float(self._materialize(mean))
+                variance = float(self._materialize(variance))
+
+        # chunks keep the inverse powers of the decay finite
+        decay = 1 - self.alpha
+        if decay == 0:
+            chunk = len(x)
+        else:
+            chunk = max(1, int(limit / max(-math.log(decay), 1e-12)))
+        for start in range(0, len(x), chunk):
+            mean, variance, delta = _ema_chunk(
+                x[start : start + chunk], mean, variance, self.alpha, arange
+            )
+
+        self._mean = mean
+        self._variance = variance
+        self._delta = delta
+        self._count += len(x)
+
     def state_dict(self):
-        return {"count": self._count, "mean": self.mean, "variance": self.variance}
+        # the tensors are updated in place so they are copied
+        return {
+            "count": self._count,
+            "mean": _clone(self._mean),
+            "variance": _clone(self._variance),
+        }
 
     def load_state_dict(self, state_dict):
         self._count = max(state_dict["count"], 0)
-        self.mean = state_dict["mean"]
-        self.variance = state_dict["variance"]
+        self._mean = _clone(state_dict["mean"])
+        self._variance = _clone(state_dict["variance"])
+        self._delta = None
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Count-weighted mean and pooled variance of the moving averages.
+
+        The variance is the weighted within-stream variance plus the
+        variance of the means (Chan et al.).
+        """
+        states = [s for s in states if s["count"] > 0]
+        if not states:
+            return {"count": 0, "mean": None, "variance": 0.0}
+        count = sum(s["count"] for s in states)
+        mean = sum(s["count"] * s["mean"] for s in states) / count
+        variance = (
+            sum(s["count"] * (s["variance"] + (s["mean"] - mean) ** 2) for s in states)
+            / count
+        )
+        return {"count": count, "mean": mean, "variance": variance}
+
+    @staticmethod
+    def _materialize(x: Union[float, Tensor, None]) -> Union[float, Tensor, None]:
+        if isinstance(x, Tensor) and x.dim() == 0:
+            return x.item()
+        return x
+
+    @property
+    def mean(self):
+        return self._materialize(self._mean)
+
+    @mean.setter
+    def mean(self, value):
+        self._mean = value
+
+    @property
+    def variance(self):
+        return self._materialize(self._variance)
+
+    @variance.setter
+    def variance(self, value):
+        self._variance = value
 
     @property
     def std(self):
         return self.variance**0.5
 
 
+class ModelEMA(BufferBase):
+    """
+    Moving average of the weights of a model.
+
+    The floating point parameters and buffers of `model` are averaged by
+    multi-tensor `torch._foreach_*` ops every `every` calls of `update`.
+    `AutoEngine.optimizer_step` updates the registered `ModelEMA`s after the
+    optimizers are stepped.
+
+    Modes:
+        - "ema": average := decay * average + (1 - decay) * weights
+        - "swa": equally weighted average of the weights since the reset
+
+    Use `swap` to evaluate the model with the averaged weights, e.g.
+
+        with engine.model_ema.swap():
+            ...
+
+    Parameters
+    ----------
+    model : nn.Module
+        Model to average
+    decay : float, optional
+        Decay of the exponential moving average, by default 0.999
+    every : int, optional
+        Number of `update` calls between two averaging steps, by default 1
+    average : str, optional
+        "ema" or "swa", by default "ema"
+    """
+
+    __slots__ = (
+        "decay",
+        "every",
+        "average",
+        "_model",
+        "_names",
+        "_weights",
+        "_average",
+        "_calls",
+        "_count",
+    )
+
+    def __init__(
+        self,
+        model: nn.Module,
+        decay: float = 0.999,
+        every: int = 1,
+        average: str = "ema",
+        **kwargs: Any,
+    ):
+        if average not in ("ema", "swa"):
+            raise ValueError(f"average can be `ema` or `swa` but got `{average}`.")
+        assert 0 <= decay <= 1, "Value `decay` should be in [0, 1]."
+        every = int(every)
+        assert every > 0, f"every should be positive but got {every}"
+        self._model = model
+        super().__init__(decay=decay, every=every, average=average, **kwargs)
+
+    def reset(self):
+        names, weights, seen = [], [], set()
+        for name, tensor in self._model.state_dict(keep_vars=True).items():
+            if tensor.is_floating_point() and id(tensor) not in seen:
+                seen.add(id(tensor))
+                names.append(name)
+                weights.append(tensor)
+        self._names = names
+        self._weights = weights
+        self._average = [w.detach().clone() for w in weights]
+        self._calls = 0
+        self._count = 0
+
+    @property
+    def model(self) -> nn.Module:
+        return self._model
+
+    @torch.no_grad()
+    def update(self, x: Any = None):
+        """Averages the current weights every `every` calls, `x` is ignored."""
+        self._calls += 1
+        if self._calls % self.every != 0:
+            return
+
+        if self.average == "ema" and self._count > 0:
+            weight = 1 - self.decay
+        else:
+            weight = 1 / (self._count + 1)
+        if hasattr(torch, "_foreach_lerp_"):
+            torch._foreach_lerp_(self._average, self._weights, weight)
+        else:
+            torch._foreach_mul_(self._average, 1 - weight)
+            torch._foreach_add_(self._average, self._weights, alpha=weight)
+        self._count += 1
+
+    def __call__(self, x: Any = None):
+        self.update(x)
+
+    def _swap(self):
+        # swaps the storages, such that no weights are copied
+        for weight, average in zip(self._weights, self._average):
+            weight.data, average.data = average.data, weight.data
+
+    @contextlib.contextmanager
+    def swap(self):
+        """Context in which the model holds the averaged weights."""
+        self._swap()
+        try:
+            yield self._model
+        finally:
+            self._swap()
+
+    def state_dict(self):
+        return {
+            "calls": self._calls,
+            "count": self._count,
+            "average": dict(zip(self._names, self._average)),
+        }
+
+    def load_state_dict(self, state_dict):
+        self._calls = state_dict["calls"]
+        self._count = state_dict["count"]
+        with torch.no_grad():
+            for name, average in zip(self._names, self._average):
+                average.copy_(state_dict["average"][name])
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Count-weighted average of the averaged weights."""
+        averaged = [s for s in states if s["count"] > 0] or states[:1]
+        count = sum(s["count"] for s in averaged)
+        weights = [s["count"] / count if count > 0 else 1.0 for s in averaged]
+        average = {
+            name: sum(w * s["average"][name] for w, s in zip(weights, averaged))
+            for name in self._names
+        }
+        return {
+            "calls": max(s["calls"] for s in states),
+            "count": count,
+            "average": average,
+        }
+
+
+def _ema_chunk(
+    x: Union[np.ndarray, Tensor],
+    mean: Union[float, Tensor],
+    variance: Union[float, Tensor],
+    alpha: float,
+    arange: Callable,
+) -> Tuple[Any, Any, Any]:
+    """Applies `len(x)` steps of the EMA update in closed form."""
+    decay = 1 - alpha
+    n = len(x)
+    if decay == 0:
+        previous = x[-2] if n > 1 else mean
+        return x[-1], 0.0 * x[-1], x[-1] - previous
+
+    # mean[t] = decay^t * (mean[0] + alpha * sum_{i<=t} decay^-i * x[i])
+    powers = decay ** arange(1, n + 1)
+    means = powers * (mean + alpha * (x / powers).cumsum(0))
+    previous = means[:-1]
+    if isinstance(x, Tensor):
+        previous = torch.cat([mean.reshape(1), previous])
+    else:
+        previous = np.concatenate([[mean], previous])
+    delta = x - previous
+
+    # variance[t] = decay * (variance[t-1] + alpha * delta[t]^2)
+    reversed_powers = powers.flip(0) if isinstance(x, Tensor) else powers[::-1]
+    variance = powers[-1] * variance + alpha * (reversed_powers * delta**2).sum()
+    return means[-1], variance, delta[-1]
+
+
+def _clone(x: Any) -> Any:
+    return x.clone() if isinstance(x, Tensor) else x
+
+
+class _RingBuffer:
+    """
+    Preallocated float64 ring buffer.
+
+    If `maxlen` is given, the oldest values are overwritten when the buffer
+    is full; otherwise the capacity is doubled when needed. `view()` returns
+    the filled values without a copy in storage order, which is enough for
+    order-independent statistics; `ordered()` returns a copy from the oldest
+    to the newest value.
+    """
+
+    __slots__ = ("maxlen", "_data", "_start", "_size")
+
+    def __init__(self, maxlen: Optional[int] = None, capacity: int = 64):
+        self.maxlen = maxlen
+        capacity = maxlen if maxlen is not None else capacity
+        self._data = np.empty(capacity, dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return iter(self.ordered().tolist())
+
+    def __getitem__(self, index: int) -> float:
+        if not -self._size <= index < self._size:
+            raise IndexError("Ring buffer index out of range.")
+        index %= self._size
+        return float(self._data[(self._start + index) % len(self._data)])
+
+    def _grow(self, size: int):
+        capacity = len(self._data)
+        while capacity < size:
+            capacity *= 2
+        data = np.empty(capacity, dtype=np.float64)
+        data[: self._size] = self.ordered()
+        self._data = data
+        self._start = 0
+
+    def append(self, x: float):
+        capacity = len(self._data)
+        if self._size < capacity:
+            self._data[(self._start + self._size) % capacity] = x
+            self._size += 1
+        elif self.maxlen is None:
+            self._grow(self._size + 1)
+            self._data[self._size] = x
+            self._size += 1
+        else:
+            self._data[self._start] = x
+            self._start = (self._start + 1) % capacity
+
+    def extend(self, values: Sequence[float]):
+        if len(values) == 1:
+            self.append(values[0])
+            return
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if self.maxlen is None:
+            if self._size + len(values) > len(self._data):
+                self._grow(self._size + len(values))
+        elif len(values) >= self.maxlen:
+            self._data[:] = values[-self.maxlen :]
+            self._start = 0
+            self._size = self.maxlen
+            return
+
+        capacity = len(self._data)
+        end = (self._start + self._size) % capacity
+        head = min(len(values), capacity - end)
+        self._data[end : end + head] = values[:head]
+        self._data[: len(values) - head] = values[head:]
+
+        overflow = max(self._size + len(values) - capacity, 0)
+        self._start = (self._start + overflow) % capacity
+        self._size = min(self._size + len(values), capacity)
+
+    def view(self) -> np.ndarray:
+        return self._data[: self._size]
+
+    def ordered(self) -> np.ndarray:
+        if self._start == 0:
+            return self._data[: self._size].copy()
+        return np.roll(self._data, -self._start)[: self._size]
+
+
 class _ScalarStatistics(BufferBase):
     """
     Base class for scalar statistics.
 
-    The streaming scalars are stored in a queue
-    of certain length (`maxlen`).
-    If `maxlen` is not specified, then the queue
-    is a list of any length.
+    The streaming scalars are stored in a float64
+    ring buffer of certain length (`maxlen`).
+    If `maxlen` is not specified, then the buffer
+    grows to any length.
+
+    0-d tensors are detached and staged on their device. The staged values
+    are synced to Python floats in one transfer every `sync_every` updates or
+    when a statistic is read, so that updates do not block on the device.
+
+    Batches of scalars, e.g. 1-D arrays or tensors of per-sample values, are
+    ingested at once by `update_many`, which `to_buffer` uses automatically.
 
     Available statistics:
         - mean
@@ -140,82 +780,272 @@ class _ScalarStatistics(BufferBase):
         - min
     """
 
-    def __init__(self, maxlen: Optional[int] = None, **kwargs):
+    __slots__ = ("maxlen", "sync_every", "_count", "_staged", "_queue")
+
+    batched = True
+
+    def __init__(self, maxlen: Optional[int] = None, sync_every: int = 100, **kwargs):
         if maxlen is not None:
             assert maxlen > 0, f"max_len should be positive but got {maxlen}"
             maxlen = max(1, int(maxlen))
-        super().__init__(maxlen=maxlen, **kwargs)
+        sync_every = int(sync_every)
+        assert sync_every > 0, f"sync_every should be positive but got {sync_every}"
+        super().__init__(maxlen=maxlen, sync_every=sync_every, **kwargs)
 
     def reset(self):
         self._count = 0
-        if self.maxlen is None:
-            self._queue = []
-        else:
-            self._queue = collections.deque([], maxlen=self.maxlen)
+        self._staged = []
+        self._queue = _RingBuffer(self.maxlen)
 
-    def update(self, x: float):
-        self._queue.append(x)
+    def update(self, x: Union[float, Tensor]):
+        if isinstance(x, Tensor):
+            self._staged.append(x.detach())
+            if len(self._staged) >= self.sync_every:
+                self._sync()
+        else:
+            if self._staged:
+                self._sync()
+            self._extend((x,))
         self._count += 1
 
+    def update_many(self, values: Union[Sequence[float], np.ndarray, Tensor]):
+        """Updates the statistics with a batch of scalars."""
+        if isinstance(values, Tensor):
+            values = values.detach().reshape(-1)
+            self._staged.append(values)
+            if len(self._staged) >= self.sync_every:
+                self._sync()
+        else:
+            values = np.asarray(values, dtype=np.float64).reshape(-1)
+            if self._staged:
+                self._sync()
+            self._extend(values)
+        self._count += len(values)
+
+    def _extend(self, values: Sequence[float]):
+        self._queue.extend(values)
+
+    def _sync(self):
+        """Moves the staged tensors into the queue as Python floats."""
+        if not self._staged:
+            return
+        values = torch.cat([x.reshape(-1) for x in self._staged]).tolist()
+        self._staged = []
+        self._extend(values)
+
     def state_dict(self):
-        return {"queue": self._queue, "count": self._count}
+        self._sync()
+        return {"queue": self._queue.ordered(), "count": self._count}
 
     def load_state_dict(self, state_dict):
+        self._staged = []
         self._count = state_dict["count"]
-        self._queue = state_dict["queue"]
+        self._queue = _RingBuffer(self.maxlen)
+        self._queue.extend(state_dict["queue"])
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        queue = np.concatenate(
+            [np.asarray(s["queue"], dtype=np.float64) for s in states] or [[]]
+        )
+        if self.maxlen is not None:
+            queue = queue[-self.maxlen :]
+        return {"queue": queue, "count": sum(s["count"] for s in states)}
 
     @property
     def mean(self):
-        return np.mean(self._queue) if len(self._queue) > 0 else 0.0
+        self._sync()
+        return np.mean(self._queue.view()) if len(self._queue) > 0 else 0.0
 
     @property
     def median(self):
-        return np.median(self._queue) if len(self._queue) > 0 else 0.0
+        self._sync()
+        return np.median(self._queue.view()) if len(self._queue) > 0 else 0.0
 
     @property
     def std(self):
-        return np.std(self._queue) if len(self._queue) > 0 else 0.0
+        self._sync()
+        return np.std(self._queue.view()) if len(self._queue) > 0 else 0.0
 
     @property
     def max(self):
-        return np.max(self._queue) if len(self._queue) > 0 else 0.0
+        self._sync()
+        return np.max(self._queue.view()) if len(self._queue) > 0 else 0.0
 
     @property
     def min(self):
-        return np.min(self._queue) if len(self._queue) > 0 else 0.0
+        self._sync()
+        return np.min(self._queue.view()) if len(self._queue) > 0 else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Returns all statistics at once."""
+        self._sync()
+        if len(self._queue) == 0:
+            return {k: 0.0 for k in _SUMMARY_STATISTICS}
+        values = self._queue.view()
+        return {
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "std": float(values.std()),
+            "max": float(values.max()),
+            "min": float(values.min()),
+        }
 
 
 class ScalarSummaryStatistics(_ScalarStatistics):
     """
     Store the scalars and compute statistics.
 
-     The streaming scalars are stored in a list of
-     any length. This is supposed to use in evals
+     The streaming scalars are stored in a growable
+     float64 buffer of any length. This is supposed to use in evals
      where the length is eval datasets.
 
+    If `rank_error` is given, the scalars are not stored. The moments are
+    computed by Welford's algorithm and the quantiles by a KLL sketch of
+    normalized rank error about `rank_error`, such that the memory is
+    bounded regardless of the length of the stream. `max` and `min` are
+    exact in both modes.
+
     Available statistics:
         - mean
         - median
         - std
         - max
         - min
+        - quantile(q)
     """
 
-    def __init__(self, **kwargs):
-        super().__init__(maxlen=None, **kwargs)
+    __slots__ = ("rank_error", "_moments", "_sketch")
+
+    def __init__(self, rank_error: Optional[float] = None, **kwargs):
+        if rank_error is not None:
+            assert 0 < rank_error < 1, "Value `rank_error` should be in (0, 1)."
+        super().__init__(maxlen=None, rank_error=rank_error, **kwargs)
+
+    @property
+    def sketched(self) -> bool:
+        return self.rank_error is not None
+
+    def reset(self):
+        super().reset()
+        if self.sketched:
+            self._moments = Moments()
+            self._sketch = KLLSketch.from_rank_error(self.rank_error)
+
+    def _extend(self, values: Sequence[float]):
+        if not self.sketched:
+            super()._extend(values)
+            return
+        if len(values) == 1:
+            x = float(values[0])
+            self._moments.update(x)
+            self._sketch.update(x)
+            return
+        values = np.asarray(values, dtype=np.float64)
+        self._moments.update_many(values)
+        self._sketch.update_many(values.tolist())
 
     def __len__(self) -> int:
-        return len(self._queue)
+        return self._count
+
+    def state_dict(self):
+        if not self.sketched:
+            return super().state_dict()
+        self._sync()
+        return {
+            "count": self._count,
+            "moments": self._moments.state_dict(),
+            "sketch": self._sketch.state_dict(),
+        }
+
+    def load_state_dict(self, state_dict):
+        if not self.sketched:
+            super().load_state_dict(state_dict)
+            return
+        self._staged = []
+        self._count = state_dict["count"]
+        self._moments.load_state_dict(state_dict["moments"])
+        self._sketch.load_state_dict(state_dict["sketch"])
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not self.sketched:
+            return super().reduce(states)
+        moments = Moments()
+        sketch = KLLSketch(self._sketch.k)
+        for state in states:
+            other_moments, other_sketch = Moments(), KLLSketch(self._sketch.k)
+            other_moments.load_state_dict(state["moments"])
+            other_sketch.load_state_dict(state["sketch"])
+            moments.merge(other_moments)
+            sketch.merge(other_sketch)
+        return {
+            "count": sum(s["count"] for s in states),
+            "moments": moments.state_dict(),
+            "sketch": sketch.state_dict(),
+        }
+
+    def quantile(self, q: float) -> float:
+        """Returns the `q`-quantile, `q` in [0, 1], approximate if sketched."""
+        self._sync()
+        if self.sketched:
+            return self._sketch.quantile(q)
+        return np.quantile(self._queue.view(), q) if len(self._queue) > 0 else 0.0
+
+    @property
+    def mean(self):
+        if not self.sketched:
+            return super().mean
+        self._sync()
+        return self._moments.mean
+
+    @property
+    def median(self):
+        if not self.sketched:
+            return super().median
+        return self.quantile(0.5)
+
+    @property
+    def std(self):
+        if not self.sketched:
+            return super().std
+        self._sync()
+        return self._moments.variance**0.5
+
+    @property
+    def max(self):
+        if not self.sketched:
+            return super().max
+        self._sync()
+        return self._moments.max if self._moments.count > 0 else 0.0
+
+    @property
+    def min(self):
+        if not self.sketched:
+            return super().min
+        self._sync()
+        return self._moments.min if self._moments.count > 0 else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        if not self.sketched:
+            return super().summary()
+        return {k: getattr(self, k) for k in _SUMMARY_STATISTICS}
 
 
 class ScalarSmoother(_ScalarStatistics):
     """
     Rolling average of a stream of scalars.
 
-    The streaming scalars are stored in a deque
-    of certain length (`maxlen`). The statistics
+    The streaming scalars are stored in a float64
+    ring buffer of certain length (`maxlen`). The statistics
     are computed within the current deque.
 
+    The statistics are maintained incrementally, such that reading them does
+    not scan the window:
+        - mean and std: rolling compensated sums of the values shifted by a
+          reference, which are recomputed exactly every `window_size` updates
+          or when they lose precision
+        - max and min: monotonic deques
+        - median: sorted list of the values in the window
+
     Available statistics:
         - mean
         - median
@@ -224,7 +1054,935 @@ class ScalarSmoother(_ScalarStatistics):
         - min
     """
 
+    __slots__ = (
+        "_sorted",
+        "_lows",
+        "_highs",
+        "_index",
+        "_shift",
+        "_sum",
+        "_sumsq",
+        "_since_rebuild",
+    )
+
     def __init__(self, window_size: int, **kwargs):
         window_size = int(window_size)
         assert window_size > 0, f"window_size should be > 0 but get {window_size}"
         super().__init__(maxlen=window_size, **kwargs)
+
+    def reset(self):
+        super().reset()
+        self._rebuild()
+
+    def load_state_dict(self, state_dict):
+        super().load_state_dict(state_dict)
+        self._rebuild()
+
+    def _rebuild(self):
+        """Recomputes all incremental structures from the window."""
+        values = self._queue.ordered().tolist()
+        self._sorted = sorted(values)
+        self._lows = collections.deque()
+        self._highs = collections.deque()
+        self._index = 0
+        for x in values:
+            self._push_extremes(x)
+        self._rebuild_moments()
+
+    def _rebuild_moments(self):
+        values = self._queue.view().tolist()
+        self._shift = math.fsum(values) / len(values) if values else 0.0
+        self._sum = [math.fsum(x - self._shift for x in values), 0.0]
+        self._sumsq = [math.fsum((x - self._shift) ** 2 for x in values), 0.0]
+        self._since_rebuild = 0
+
+    def _push_extremes(self, x: float):
+        while self._lows and self._lows[-1][1] >= x:
+            self._lows.pop()
+        self._lows.append((self._index, x))
+        while self._highs and self._highs[-1][1] <= x:
+            self._highs.pop()
+        self._highs.append((self._index, x))
+        self._index += 1
+
+        # drop the extremes which are out of the window
+        first = self._index - min(self._index, self.maxlen)
+        while self._lows[0][0] < first:
+            self._lows.popleft()
+        while self._highs[0][0] < first:
+            self._highs.popleft()
+
+    def _extend(self, values: Sequence[float]):
+        if len(values) * 4 >= self.maxlen:
+            # rebuilding is cheaper than updating the structures per value
+            self._queue.extend(values)
+            self._rebuild()
+            return
+        for x in values:
+            x = float(x)
+            if len(self._queue) == self.maxlen:
+                evicted = self._queue[0]
+                del self._sorted[bisect.bisect_left(self._sorted, evicted)]
+                _kahan_add(self._sum, -(evicted - self._shift))
+                _kahan_add(self._sumsq, -((evicted - self._shift) ** 2))
+            self._queue.append(x)
+            bisect.insort(self._sorted, x)
+            _kahan_add(self._sum, x - self._shift)
+            _kahan_add(self._sumsq, (x - self._shift) ** 2)
+            self._push_extremes(x)
+
+            # the variance cancels catastrophically when the values drift far
+            # from the reference, in which case the reference is moved
+            self._since_rebuild += 1
+            n = len(self._queue)
+            squared_deviations = self._sumsq[0] - self._sum[0] ** 2 / n
+            if (
+                self._since_rebuild >= self.maxlen
+                or squared_deviations < _CANCELLATION * self._sumsq[0]
+            ):
+                self._rebuild_moments()
+
+    @property
+    def mean(self):
+        self._sync()
+        n = len(self._queue)
+        return self._shift + self._sum[0] / n if n > 0 else 0.0
+
+    @property
+    def median(self):
+        self._sync()
+        n = len(self._queue)
+        if n == 0:
+            return 0.0
+        if n % 2 == 1:
+            return self._sorted[n // 2]
+        return (self._sorted[n // 2 - 1] + self._sorted[n // 2]) / 2
+
+    @property
+    def std(self):
+        self._sync()
+        n = len(self._queue)
+        if n == 0:
+            return 0.0
+        offset = self._sum[0] / n
+        return max(self._sumsq[0] / n - offset**2, 0.0) ** 0.5
+
+    @property
+    def max(self):
+        self._sync()
+        return self._highs[0][1] if self._queue else 0.0
+
+    @property
+    def min(self):
+        self._sync()
+        return self._lows[0][1] if self._queue else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Returns all statistics at once."""
+        return {k: getattr(self, k) for k in _SUMMARY_STATISTICS}
+
+
+def _kahan_add(total: List[float], value: float):
+    """Adds `value` to the compensated sum `[sum, compensation]` in place."""
+    y = value - total[1]
+    t = total[0] + y
+    total[1] = (t - total[0]) - y
+    total[0] = t
+
+
+_SUMMARY_STATISTICS = ("mean", "median", "std", "max", "min")
+_CANCELLATION = 1e-6
+
+
+def _to_float_array(values: Sequence[Union[float, Tensor]]) -> np.ndarray:
+    # tensors are synced in one transfer
+    tensors = [i for i, v in enumerate(values) if isinstance(v, Tensor)]
+    if not tensors:
+        return np.asarray(values, dtype=np.float64)
+    out = np.empty(len(values), dtype=np.float64)
+    synced = torch.stack([values[i].detach().reshape(()) for i in tensors]).tolist()
+    out[tensors] = synced
+    others = [i for i in range(len(values)) if not isinstance(values[i], Tensor)]
+    out[others] = [values[i] for i in others]
+    return out
+
+
+class BufferBank(BufferBase):
+    """
+    Columnar bank of scalar buffers.
+
+    The statistics of many scalar metrics are stored in contiguous NumPy
+    arrays and all metrics yielded in an iteration are updated by a single
+    vectorized operation.
+
+    Modes:
+        - "ema": exponential moving averages, see `ExponentialMovingAverage`
+        - "window": rolling windows of `window_size`, see `ScalarSmoother`
+
+    `bank[name]` returns a view with the attribute API of the corresponding
+    buffer (`mean`, `variance`, `std` or `mean`, `median`, `std`, `max`,
+    `min`). `to_buffer` pushes the yielded names found in a bank registered in
+    the buffer registry.
+
+    Updates with tensor values are staged and synced in one transfer every
+    `sync_every` updates or when a statistic is read.
+    """
+
+    __slots__ = (
+        "names",
+        "mode",
+        "alpha",
+        "window_size",
+        "sync_every",
+        "_staged",
+        "_index",
+        "_count",
+        "_mean",
+        "_variance",
+        "_window",
+    )
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        mode: str = "ema",
+        alpha: float = 0.01,
+        window_size: int = 100,
+        sync_every: int = 100,
+        **kwargs: Any,
+    ):
+        if mode not in ("ema", "window"):
+            raise ValueError(f"mode can be `ema` or `window` but got `{mode}`.")
+        assert 0 <= alpha <= 1, "Value `alpha` should be in [0, 1]."
+        window_size = int(window_size)
+        assert window_size > 0, f"window_size should be > 0 but get {window_size}"
+        sync_every = int(sync_every)
+        assert sync_every > 0, f"sync_every should be positive but got {sync_every}"
+        names = [_py_name(n) for n in names]
+        assert len(set(names)) == len(names), "Names should be unique."
+        super().__init__(
+            names=names,
+            mode=mode,
+            alpha=alpha,
+            window_size=window_size,
+            sync_every=sync_every,
+            **kwargs,
+        )
+
+    def reset(self):
+        n = len(self.names)
+        self._staged = []
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._count = np.zeros(n, dtype=np.int64)
+        if self.mode == "ema":
+            self._mean = np.zeros(n, dtype=np.float64)
+            self._variance = np.zeros(n, dtype=np.float64)
+        else:
+            self._window = np.full((self.window_size, n), np.nan, dtype=np.float64)
+
+    def update(self, values: Union[Dict[str, Union[float, Tensor]], Sequence[float]]):
+        """
+        Updates the metrics.
+
+        Parameters
+        ----------
+        values : Union[Dict[str, Union[float, Tensor]], Sequence[float]]
+            Dict of new values of some metrics or the new values of all
+            metrics in the order of `names`
+        """
+        if isinstance(values, dict):
+            index = np.fromiter(
+                (self._index[_py_name(k)] for k in values), dtype=np.int64
+            )
+            values = list(values.values())
+        else:
+            index = np.arange(len(self.names))
+            values = list(values)
+            assert len(values) == len(index), "Values should match the names."
+
+        if any(isinstance(v, Tensor) for v in values):
+            values = [v.detach() if isinstance(v, Tensor) else v for v in values]
+            self._staged.append((index, values))
+            if len(self._staged) >= self.sync_every:
+                self._sync()
+            return
+        self._sync()
+        self._apply(index, np.asarray(values, dtype=np.float64))
+
+    def _sync(self):
+        """Applies the staged updates, their tensors are synced at once."""
+        if not self._staged:
+            return
+        staged, self._staged = self._staged, []
+        x = _to_float_array([v for _, values in staged for v in values])
+        start = 0
+        for index, values in staged:
+            self._apply(index, x[start : start + len(values)])
+            start += len(values)
+
+    def _apply(self, index: np.ndarray, x: np.ndarray):
+        if self.mode == "ema":
+            mean = self._mean[index]
+            first = self._count[index] == 0
+            mean[first] = x[first]
+            delta = x - mean
+            self._mean[index] = mean + self.alpha * delta
+            self._variance[index] = (1 - self.alpha) * (
+                self._variance[index] + self.alpha * delta**2
+            )
+        else:
+            self._window[self._count[index] % self.window_size, index] = x
+        self._count[index] += 1
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, name: str) -> "_BankView":
+        return _BankView(self, self._index[_py_name(name)])
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns the statistics of all metrics computed column-wise at once."""
+        self._sync()
+        if self.mode == "ema":
+            stats = {
+                "mean": self._mean,
+                "variance": self._variance,
+                "std": self._variance**0.5,
+            }
+        else:
+            filled = self._count > 0
+            stats = {k: np.zeros(len(self.names)) for k in _SUMMARY_STATISTICS}
+            if filled.any():
+                window = self._window[:, filled]
+                stats["mean"][filled] = np.nanmean(window, axis=0)
+                stats["median"][filled] = np.nanmedian(window, axis=0)
+                stats["std"][filled] = np.nanstd(window, axis=0)
+                stats["max"][filled] = np.nanmax(window, axis=0)
+                stats["min"][filled] = np.nanmin(window, axis=0)
+        return {
+            name: {k: float(v[i]) for k, v in stats.items()}
+            for i, name in enumerate(self.names)
+        }
+
+    def state_dict(self):
+        self._sync()
+        state = {"names": list(self.names), "count": self._count.copy()}
+        if self.mode == "ema":
+            state["mean"] = self._mean.copy()
+            state["variance"] = self._variance.copy()
+        else:
+            state["window"] = self._window.copy()
+        return state
+
+    def load_state_dict(self, state_dict):
+        assert list(state_dict["names"]) == list(self.names), "Names do not match."
+        self._staged = []
+        self._count = np.array(state_dict["count"], dtype=np.int64)
+        if self.mode == "ema":
+            self._mean = np.array(state_dict["mean"], dtype=np.float64)
+            self._variance = np.array(state_dict["variance"], dtype=np.float64)
+        else:
+            self._window = np.array(state_dict["window"], dtype=np.float64)
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        for state in states:
+            assert list(state["names"]) == list(self.names), "Names do not match."
+        counts = np.stack([np.asarray(s["count"], dtype=np.int64) for s in states])
+        count = counts.sum(axis=0)
+        out = {"names": list(self.names), "count": count}
+
+        if self.mode == "ema":
+            # count-weighted means and pooled variances, per metric
+            means = np.stack([s["mean"] for s in states])
+            variances = np.stack([s["variance"] for s in states])
+            weights = counts / np.maximum(count, 1)
+            mean = (weights * means).sum(axis=0)
+            out["mean"] = mean
+            out["variance"] = (weights * (variances + (means - mean) ** 2)).sum(axis=0)
+            return out
+
+        # the latest `window_size` values of each metric in stream order
+        size = self.window_size
+        window = np.full((size, len(self.names)), np.nan, dtype=np.float64)
+        for j in range(len(self.names)):
+            values = np.concatenate(
+                [_window_column(s["window"][:, j], s["count"][j]) for s in states]
+            )[-size:]
+            rows = (count[j] - len(values) + np.arange(len(values))) % size
+            window[rows, j] = values
+        out["window"] = window
+        return out
+
+
+def _window_column(column: np.ndarray, count: int) -> np.ndarray:
+    """Returns the values of a window column from the oldest to the newest."""
+    size = min(count, len(column))
+    return column[(count - size + np.arange(size)) % len(column)]
+
+
+class _BankView:
+    """View of one metric in a `BufferBank`."""
+
+    __slots__ = ("_bank", "_index")
+
+    def __init__(self, bank: BufferBank, index: int):
+        self._bank = bank
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        return self._bank.names[self._index]
+
+    @property
+    def count(self) -> int:
+        self._bank._sync()
+        return int(self._bank._count[self._index])
+
+    def _column(self) -> np.ndarray:
+        size = min(self.count, self._bank.window_size)
+        return self._bank._window[:size, self._index]
+
+    def _statistic(self, stat: str) -> Optional[float]:
+        bank = self._bank
+        if bank.mode == "ema":
+            if stat not in ("mean", "variance", "std"):
+                raise AttributeError(f"EMA bank has no statistic `{stat}`.")
+            if self.count == 0:
+                return None if stat == "mean" else 0.0
+            if stat == "mean":
+                return float(bank._mean[self._index])
+            variance = float(bank._variance[self._index])
+            return variance if stat == "variance" else variance**0.5
+
+        if stat not in _SUMMARY_STATISTICS:
+            raise AttributeError(f"Window bank has no statistic `{stat}`.")
+        column = self._column()
+        if len(column) == 0:
+            return 0.0
+        return float(getattr(np, stat)(column))
+
+    @property
+    def mean(self):
+        return self._statistic("mean")
+
+    @property
+    def variance(self):
+        return self._statistic("variance")
+
+    @property
+    def std(self):
+        return self._statistic("std")
+
+    @property
+    def median(self):
+        return self._statistic("median")
+
+    @property
+    def max(self):
+        return self._statistic("max")
+
+    @property
+    def min(self):
+        return self._statistic("min")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name})"
+
+
+class HistogramBuffer(BufferBase):
+    """
+    Histogram of a stream of values in fixed bins.
+
+    The values, e.g. whole tensors of activations, gradients or per-sample
+    losses, are binned by one vectorized `bincount`. The counts of tensors
+    stay on their device until read. The memory is constant and the
+    histograms of different workers are merged by adding the counts.
+
+    The `bins` bins split `[low, high]` evenly, or evenly in log space if
+    `scale` is "log". Values below `low` (including non-positive values on
+    the log scale), above `high` and NaNs are counted separately.
+
+    Available statistics (approximated from the bins):
+        - mean
+        - median
+        - quantile(q)
+
+    Parameters
+    ----------
+    low : float
+        Lower edge of the bins
+    high : float
+        Upper edge of the bins
+    bins : int, optional
+        Number of bins, by default 100
+    scale : str, optional
+        "linear" or "log", by default "linear"
+    every : int, optional
+        Number of `update` calls between two binned updates, by default 1
+    """
+
+    __slots__ = ("low", "high", "bins", "scale", "every", "_counts", "_calls")
+
+    batched = True
+    accumulation = "concat"
+
+    def __init__(
+        self,
+        low: float,
+        high: float,
+        bins: int = 100,
+        scale: str = "linear",
+        every: int = 1,
+        **kwargs: Any,
+    ):
+        if scale not in ("linear", "log"):
+            raise ValueError(f"scale can be `linear` or `log` but got `{scale}`.")
+        assert low < high, f"low should be < high but got {low} and {high}"
+        if scale == "log":
+            assert low > 0, f"low should be positive on the log scale but got {low}"
+        bins = int(bins)
+        assert bins > 0, f"bins should be positive but got {bins}"
+        every = int(every)
+        assert every > 0, f"every should be positive but got {every}"
+        super().__init__(
+            low=low, high=high, bins=bins, scale=scale, every=every, **kwargs
+        )
+
+    def reset(self):
+        # [underflow, bin 0, ..., bin (bins - 1), overflow, nan]
+        self._counts = np.zeros(self.bins + 3, dtype=np.int64)
+        self._calls = 0
+
+    @property
+    def edges(self) -> np.ndarray:
+        if self.scale == "log":
+            return np.geomspace(self.low, self.high, self.bins + 1)
+        return np.linspace(self.low, self.high, self.bins + 1)
+
+    def _range(self) -> Tuple[float, float]:
+        if self.scale == "log":
+            return math.log(self.low), math.log(self.high)
+        return self.low, self.high
+
+    def update(self, x: Union[float, Sequence[float], np.ndarray, Tensor]):
+        self._calls += 1
+        if self._calls % self.every != 0:
+            return
+
+        low, high = self._range()
+        width = (high - low) / self.bins
+        if isinstance(x, Tensor):
+            x = x.detach().reshape(-1).float()
+            if self.scale == "log":
+                x = torch.log(torch.clamp(x, min=0))
+            # the upper edge is included in the last bin
+            position = torch.floor((x - low) / width).clamp_(-1, self.bins)
+            position = torch.where(x == high, self.bins - 1, position)
+            position = torch.nan_to_num_(position, nan=self.bins + 1)
+            index = position.long() + 1
+            counts = torch.bincount(index, minlength=self.bins + 3)
+            if not isinstance(self._counts, Tensor):
+                self._counts = torch.as_tensor(self._counts, device=counts.device)
+            self._counts += counts.to(self._counts.device)
+            return
+
+        x = np.asarray(x, dtype=np.float64).reshape(-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.scale == "log":
+                x = np.log(np.maximum(x, 0))
+            position = np.clip(np.floor((x - low) / width), -1, self.bins)
+        position[x == high] = self.bins - 1
+        position = np.nan_to_num(position, nan=self.bins + 1)
+        index = position.astype(np.int64) + 1
+        counts = np.bincount(index, minlength=self.bins + 3)
+        if isinstance(self._counts, Tensor):
+            counts = torch.from_numpy(counts).to(self._counts.device)
+        self._counts += counts
+
+    def update_many(self, values: Union[Sequence[float], np.ndarray, Tensor]):
+        self.update(values)
+
+    def _host_counts(self) -> np.ndarray:
+        if isinstance(self._counts, Tensor):
+            return self._counts.cpu().numpy()
+        return self._counts
+
+    def histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the bin edges and the counts of the bins."""
+        return self.edges, self._host_counts()[1:-2].copy()
+
+    @property
+    def count(self) -> int:
+        """Number of binned values, excluding NaNs."""
+        return int(self._host_counts()[:-1].sum())
+
+    @property
+    def underflow(self) -> int:
+        return int(self._host_counts()[0])
+
+    @property
+    def overflow(self) -> int:
+        return int(self._host_counts()[-2])
+
+    @property
+    def nan(self) -> int:
+        return int(self._host_counts()[-1])
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the `q`-quantile, `q` in [0, 1], interpolated in its bin.
+
+        Quantiles in the underflow or overflow are clipped to `low` or `high`.
+        """
+        assert 0 <= q <= 1, f"Quantile should be in [0, 1] but got {q}"
+        counts = self._host_counts()[:-1]
+        total = counts.sum()
+        if total == 0:
+            return 0.0
+        cumulative = np.cumsum(counts)
+        # the first non-empty bin holds the 0-quantile
+        target = max(q * total, np.nextafter(0, 1))
+        index = int(np.searchsorted(cumulative, target))
+        if index == 0:
+            return float(self.low)
+        if index > self.bins:
+            return float(self.high)
+
+        # linear interpolation in the (log) bin
+        low, high = self._range()
+        width = (high - low) / self.bins
+        fraction = (target - cumulative[index] + counts[index]) / counts[index]
+        value = low + (index - 1 + min(max(fraction, 0.0), 1.0)) * width
+        return float(math.exp(value) if self.scale == "log" else value)
+
+    @property
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    @property
+    def mean(self) -> float:
+        """Mean of the bin centers weighted by the counts of the bins."""
+        counts = self._host_counts()[1:-2]
+        if counts.sum() == 0:
+            return 0.0
+        edges = self.edges
+        centers = (edges[:-1] + edges[1:]) / 2
+        return float((centers * counts).sum() / counts.sum())
+
+    def state_dict(self):
+        return {"counts": self._host_counts().copy(), "calls": self._calls}
+
+    def load_state_dict(self, state_dict):
+        self._counts = np.array(state_dict["counts"], dtype=np.int64)
+        self._calls = state_dict["calls"]
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "counts": np.sum([s["counts"] for s in states], axis=0),
+            "calls": max(s["calls"] for s in states),
+        }
+
+
+class ThroughputMeter(BufferBase):
+    """
+    Throughput of the engine loop, e.g. samples/sec or tokens/sec.
+
+    Each update is one step (a batch) of `x` units at the time of the update.
+    If `auto`, the engine starts the meter at the beginning of every epoch
+    and updates it after every batch with the batch size, inferred from the
+    leading dimension of the batch (1 if unknown). Otherwise the units are
+    pushed explicitly, e.g. `yield "tokens_per_sec", num_tokens`.
+
+    Available statistics:
+        - instantaneous: units/sec of the latest step
+        - windowed: units/sec within the last `window` seconds
+        - cumulative: units/sec since the meter was started
+        - steps_per_sec: steps/sec within the last `window` seconds
+        - eta: seconds until `total` steps are done, if started with `total`
+
+    Parameters
+    ----------
+    window : float, optional
+        Seconds of the windowed throughput, by default 60.0
+    auto : bool, optional
+        Whether the engine updates the meter with batch sizes, by default True
+    clock : Callable[[], float], optional
+        Monotonic clock in seconds, by default `time.perf_counter`
+    """
+
+    __slots__ = (
+        "window",
+        "auto",
+        "clock",
+        "_events",
+        "_window_units",
+        "_start",
+        "_last",
+        "_last_units",
+        "_units",
+        "_steps",
+        "_elapsed",
+        "_total",
+    )
+
+    # the units of the micro-batches of an optimizer step are added
+    accumulation = "sum"
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        auto: bool = True,
+        clock: Callable[[], float] = time.perf_counter,
+        **kwargs: Any,
+    ):
+        assert window > 0, f"window should be positive but got {window}"
+        super().__init__(window=window, auto=auto, clock=clock, **kwargs)
+
+    def reset(self):
+        self._events = collections.deque()  # (time, units)
+        self._window_units = 0.0
+        self._start = None
+        self._last = None
+        self._last_units = 0.0
+        self._units = 0.0
+        self._steps = 0
+        self._elapsed = 0.0
+        self._total = None
+
+    def start(self, total: Optional[int] = None):
+        """Starts timing, `total` is the number of steps expected for the ETA."""
+        now = self.clock()
+        if self._start is not None and self._last is not None:
+            self._elapsed += self._last - self._start
+        self._start = now
+        self._last = now
+        self._events.clear()
+        self._events.append((now, 0.0))
+        self._window_units = 0.0
+        self._total = total
+        self._steps = 0
+
+    def update(self, x: Union[int, float] = 1):
+        if self._start is None:
+            # the first step is not timed if the meter is not started
+            self.start()
+            return
+
+        now = self.clock()
+        x = float(x)
+        self._last_units = x / max(now - self._last, 1e-12)
+        self._last = now
+        self._units += x
+        self._steps += 1
+        self._events.append((now, x))
+        self._window_units += x
+
+        # the first event is the reference time, its units are not counted
+        events = self._events
+        while len(events) > 2 and now - events[1][0] >= self.window:
+            events.popleft()
+            self._window_units -= events[0][1]
+
+    @property
+    def instantaneous(self) -> float:
+        return self._last_units
+
+    @property
+    def windowed(self) -> float:
+        if len(self._events) < 2:
+            return 0.0
+        duration = self._events[-1][0] - self._events[0][0]
+        return self._window_units / duration if duration > 0 else 0.0
+
+    @property
+    def steps_per_sec(self) -> float:
+        if len(self._events) < 2:
+            return 0.0
+        duration = self._events[-1][0] - self._events[0][0]
+        return (len(self._events) - 1) / duration if duration > 0 else 0.0
+
+    @property
+    def cumulative(self) -> float:
+        elapsed = self._elapsed
+        if self._start is not None:
+            elapsed += self._last - self._start
+        return self._units / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        rate = self.steps_per_sec
+        if self._total is None or rate == 0:
+            return None
+        return max(self._total - self._steps, 0) / rate
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Returns all statistics at once."""
+        return {
+            k: getattr(self, k)
+            for k in ("instantaneous", "windowed", "cumulative", "steps_per_sec", "eta")
+        }
+
+    def state_dict(self):
+        elapsed = self._elapsed
+        if self._start is not None:
+            elapsed += self._last - self._start
+        return {"units": self._units, "elapsed": elapsed}
+
+    def load_state_dict(self, state_dict):
+        self.reset()
+        self._units = state_dict["units"]
+        self._elapsed = state_dict["elapsed"]
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # the ranks run in parallel, so their units add up in the same time
+        return {
+            "units": sum(s["units"] for s in states),
+            "elapsed": max(s["elapsed"] for s in states),
+        }
+
+
+class TimeWindowSmoother(BufferBase):
+    """
+    Rolling statistics of a stream of scalars within the last `seconds`.
+
+    Unlike `ScalarSmoother`, the values are evicted by their timestamps. 0-d
+    tensors are staged and synced in one transfer every `sync_every` updates
+    or when a statistic is read.
+
+    Available statistics:
+        - mean
+        - median
+        - std
+        - max
+        - min
+    """
+
+    __slots__ = (
+        "seconds",
+        "sync_every",
+        "clock",
+        "_times",
+        "_values",
+        "_staged",
+        "_count",
+    )
+
+    def __init__(
+        self,
+        seconds: float,
+        sync_every: int = 100,
+        clock: Callable[[], float] = time.perf_counter,
+        **kwargs: Any,
+    ):
+        assert seconds > 0, f"seconds should be positive but got {seconds}"
+        sync_every = int(sync_every)
+        assert sync_every > 0, f"sync_every should be positive but got {sync_every}"
+        super().__init__(seconds=seconds, sync_every=sync_every, clock=clock, **kwargs)
+
+    def reset(self):
+        self._times = collections.deque()
+        # the staged tensors are newer than the values
+        self._values = collections.deque()
+        self._staged = []
+        self._count = 0
+
+    def update(self, x: Union[float, Tensor]):
+        now = self.clock()
+        self._times.append(now)
+        if isinstance(x, Tensor):
+            self._staged.append(x.detach())
+            if len(self._staged) >= self.sync_every:
+                self._sync()
+        else:
+            if self._staged:
+                self._sync()
+            self._values.append(float(x))
+        self._count += 1
+        self._evict(now)
+
+    def _sync(self):
+        if not self._staged:
+            return
+        self._values.extend(torch.stack(self._staged).tolist())
+        self._staged = []
+
+    def _evict(self, now: float):
+        while self._times and now - self._times[0] > self.seconds:
+            self._times.popleft()
+            if self._values:
+                self._values.popleft()
+            else:
+                self._staged.pop(0)
+
+    def _window(self) -> np.ndarray:
+        self._sync()
+        self._evict(self.clock())
+        return np.fromiter(self._values, dtype=np.float64, count=len(self._values))
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    @property
+    def mean(self):
+        values = self._window()
+        return float(values.mean()) if len(values) > 0 else 0.0
+
+    @property
+    def median(self):
+        values = self._window()
+        return float(np.median(values)) if len(values) > 0 else 0.0
+
+    @property
+    def std(self):
+        values = self._window()
+        return float(values.std()) if len(values) > 0 else 0.0
+
+    @property
+    def max(self):
+        values = self._window()
+        return float(values.max()) if len(values) > 0 else 0.0
+
+    @property
+    def min(self):
+        values = self._window()
+        return float(values.min()) if len(values) > 0 else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Returns all statistics at once."""
+        values = self._window()
+        if len(values) == 0:
+            return {k: 0.0 for k in _SUMMARY_STATISTICS}
+        return {
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "std": float(values.std()),
+            "max": float(values.max()),
+            "min": float(values.min()),
+        }
+
+    def state_dict(self):
+        # the timestamps are stored as ages, which are valid across processes
+        values = self._window()
+        now = self.clock()
+        ages = now - np.fromiter(self._times, dtype=np.float64, count=len(values))
+        return {"ages": ages, "values": values, "count": self._count}
+
+    def load_state_dict(self, state_dict):
+        self.reset()
+        now = self.clock()
+        self._times.extend((now - np.asarray(state_dict["ages"])).tolist())
+        self._values.extend(np.asarray(state_dict["values"]).tolist())
+        self._count = state_dict["count"]
+
+    def reduce(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ages = np.concatenate([np.asarray(s["ages"], np.float64) for s in states])
+        values = np.concatenate([np.asarray(s["values"], np.float64) for s in states])
+        order = np.argsort(-ages, kind="stable")
+        return {
+            "ages": ages[order],
+            "values": values[order],
+            "count": sum(s["count"] for s in states),
+        }
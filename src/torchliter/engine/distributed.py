@@ -0,0 +1,257 @@
+import contextlib
+import copy
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, IterableDataset, RandomSampler
+from torch.utils.data.distributed import DistributedSampler
+
+from .auto import AutoEngine
+from .buffers import BufferBase, ModelEMA
+from .events import EventCategory, EventHandler
+
+__all__ = ["DistributedAutoEngine"]
+
+
+class DistributedAutoEngine(AutoEngine):
+    """
+    Data parallel `AutoEngine` over `torch.distributed`.
+
+    The process group must be initialized before the engine is built, e.g.
+    `torch.distributed.init_process_group("gloo", ...)`. When the stubs are
+    executed the first time:
+
+    - the registered models with trainable parameters are wrapped in
+      `DistributedDataParallel`
+    - the registered dataloaders are rebuilt with a `DistributedSampler`
+
+    With gradient accumulation, the micro-batches before an accumulation
+    boundary run under `no_sync` of the wrapped models, such that the
+    gradients are all-reduced once per optimizer step.
+
+    The epoch of the samplers is set automatically in `per_epoch`. At every
+    epoch boundary, the buffer statistics are all-reduced across ranks before
+    the `PostEpochHandler`s run, and the local statistics are restored after
+    them unless the handlers reset the buffers. `PostEpochHandler`s run on
+    rank 0 only unless they are built with `rank_zero_only=False`; handlers of
+    other categories run on all ranks unless built with `rank_zero_only=True`.
+
+    The state dict contains the unwrapped models, such that checkpoints can be
+    loaded by non-distributed engines.
+    """
+
+    def __init__(self, *events, **kwargs):
+        if not (dist.is_available() and dist.is_initialized()):
+            raise RuntimeError(
+                "`torch.distributed` process group must be initialized"
+                " before building a `DistributedAutoEngine`."
+            )
+        self._distributed_ready = False
+        super().__init__(*events, **kwargs)
+
+    @property
+    def rank(self) -> int:
+        return dist.get_rank()
+
+    @property
+    def world_size(self) -> int:
+        return dist.get_world_size()
+
+    @property
+    def is_rank_zero(self) -> bool:
+        return self.rank == 0
+
+    def setup_distributed(self) -> None:
+        """Wraps the models in DDP and shards the dataloaders, only once."""
+        if self._distributed_ready:
+            return
+        for name, model in list(self.model_registry.items()):
+            if isinstance(model, (DistributedDataParallel, torch.jit.ScriptModule)):
+                continue
+            params = [p for p in model.parameters() if p.requires_grad]
+            if not params:
+                continue
+            device = params[0].device
+            device_ids = [device.index] if device.type == "cuda" else None
+            delattr(self, name)
+            setattr(self, name, DistributedDataParallel(model, device_ids=device_ids))
+
+        for name, dataloader in list(self.dataloader_registry.items()):
+            sharded = _shard_dataloader(dataloader, self.world_size, self.rank)
+            if sharded is not dataloader:
+                delattr(self, name)
+                setattr(self, name, sharded)
+
+        self._distributed_ready = True
+
+    def execute(self, **kwargs: Any) -> None:
+        self.setup_distributed()
+        super().execute(**kwargs)
+
+    def per_epoch(self, **kwargs):
+        dataloader = getattr(self, self.current_stub.dataloader, None)
+        sampler = getattr(dataloader, "sampler", None)
+        if isinstance(sampler, DistributedSampler):
+            sampler.set_epoch(self.epoch)
+        super().per_epoch(**kwargs)
+
+    def per_batch(self, batch: Any, **kwargs: Any) -> Any:
+        if not self.is_train_stub or self.is_accumulation_boundary:
+            return super().per_batch(batch, **kwargs)
+        # DDP decides in the forward pass whether the backward pass syncs
+        with contextlib.ExitStack() as stack:
+            for model in self.model_registry.values():
+                if isinstance(model, DistributedDataParallel):
+                    stack.enter_context(model.no_sync())
+            return super().per_batch(batch, **kwargs)
+
+    def when_epoch_finishes(self):
+        local_states = self.reduce_buffers()
+        try:
+            super().when_epoch_finishes()
+        finally:
+            self.restore_buffers(local_states)
+
+    def _plan_handlers(self, category: EventCategory) -> List[EventHandler]:
+        handlers = super()._plan_handlers(category)
+        if self.is_rank_zero:
+            return handlers
+        return [h for h in handlers if not _is_rank_zero_only(h, category)]
+
+    def reduce_buffers(self) -> Dict[str, Tuple[Dict[str, Any], int]]:
+        """
+        All-reduces the states of the registered buffers across ranks.
+
+        Returns
+        -------
+        Dict[str, Tuple[Dict[str, Any], int]]
+            The local state and the reduced count of each reduced buffer, see
+            `restore_buffers`
+        """
+        # the averaged weights are synchronized by DDP already
+        names = sorted(
+            n for n, b in self.buffer_registry.items() if not isinstance(b, ModelEMA)
+        )
+        states = [self.buffer_registry[n].state_dict() for n in names]
+        gathered = [None] * self.world_size
+        dist.all_gather_object(gathered, states)
+        local_states = {}
+        for i, name in enumerate(names):
+            rank_states = [states_of_rank[i] for states_of_rank in gathered]
+            buffer = self.buffer_registry[name]
+            reduced = _reduce_states(buffer, rank_states)
+            if reduced is not None:
+                # the local state may alias the buffer
+                local_states[name] = (copy.deepcopy(states[i]), _count(reduced))
+                buffer.load_state_dict(reduced)
+        return local_states
+
+    def restore_buffers(
+        self, local_states: Dict[str, Tuple[Dict[str, Any], int]]
+    ) -> None:
+        """
+        Loads the local states returned by `reduce_buffers` back, such that the
+        next reduction does not count the values of the other ranks twice.
+
+        Buffers whose count changed since the reduction, e.g. reset by a
+        handler, are left as they are.
+
+        Parameters
+        ----------
+        local_states : Dict[str, Tuple[Dict[str, Any], int]]
+            The local states returned by `reduce_buffers`
+        """
+        for name, (state, reduced_count) in local_states.items():
+            buffer = self.buffer_registry.get(name)
+            if buffer is not None and _count(buffer.state_dict()) == reduced_count:
+                buffer.load_state_dict(state)
+
+    def save(self, path: str) -> None:
+        """Saves the engine state dict on rank 0 and waits for all ranks."""
+        if self.is_rank_zero:
+            torch.save(self.state_dict(), path)
+        dist.barrier()
+
+    def state_dict(self) -> Dict[str, Dict[str, Any]]:
+        out = super().state_dict()
+        for name, model in self.model_registry.items():
+            if isinstance(model, DistributedDataParallel):
+                out["model"][name] = model.module.state_dict()
+        return out
+
+    def load_state_dict(self, state_dict: Dict[str, Dict[str, Any]]) -> None:
+        models = state_dict.get("model", {})
+        others = {k: v for k, v in state_dict.items() if k != "model"}
+        for name, state in models.items():
+            model = self.model_registry[name]
+            if isinstance(model, DistributedDataParallel):
+                model = model.module
+            model.load_state_dict(state)
+        super().load_state_dict(others)
+
+
+def _is_rank_zero_only(handler: EventHandler, category: EventCategory) -> bool:
+    if handler.rank_zero_only is None:
+        return category == EventCategory.EPOCH_FINISHES
+    return handler.rank_zero_only
+
+
+def _shard_dataloader(
+    dataloader: DataLoader, num_replicas: int, rank: int
+) -> DataLoader:
+    if isinstance(dataloader.sampler, DistributedSampler):
+        return dataloader
+    if isinstance(dataloader.dataset, IterableDataset):
+        warnings.warn("IterableDataset is not sharded by `DistributedAutoEngine`.")
+        return dataloader
+    if dataloader.batch_size is None:
+        warnings.warn("Dataloader with a custom batch_sampler is not sharded.")
+        return dataloader
+
+    sampler = DistributedSampler(
+        dataloader.dataset,
+        num_replicas=num_replicas,
+        rank=rank,
+        shuffle=isinstance(dataloader.sampler, RandomSampler),
+        drop_last=dataloader.drop_last,
+    )
+    kwargs = dict(
+        batch_size=dataloader.batch_size,
+        sampler=sampler,
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        pin_memory=dataloader.pin_memory,
+        drop_last=dataloader.drop_last,
+        timeout=dataloader.timeout,
+        worker_init_fn=dataloader.worker_init_fn,
+    )
+    if dataloader.num_workers > 0:
+        for option in ("prefetch_factor", "persistent_workers"):
+            if hasattr(dataloader, option):
+                kwargs[option] = getattr(dataloader, option)
+    return DataLoader(dataloader.dataset, **kwargs)
+
+
+def _count(state: Dict[str, Any]) -> int:
+    # a `BufferBank` counts per metric and a `HistogramBuffer` per bin
+    if "count" in state:
+        return int(np.sum(state["count"]))
+    if "counts" in state:
+        return int(np.sum(state["counts"]))
+    return len(state.get("values", ()))
+
+
+def _reduce_states(
+    buffer: BufferBase, states: List[Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    if all(_count(state) == 0 for state in states):
+        return None
+    try:
+        return buffer.reduce(states)
+    except NotImplementedError:
+        warnings.warn(f"Buffer type {type(buffer)} is not reduced across ranks.")
+        return None
@@ -1,17 +1,42 @@
+import itertools
+import math
+import warnings
 from enum import Enum
 from functools import partial
-from typing import Callable, Dict, List, Optional, Tuple, Type
+from operator import attrgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+import numpy as np
+import torch
 
 from .. import REPR_INDENT
+from ..writer import CheckpointWriter
 from .base import EngineBase
+from .executor import HandlerExecutor
+from .profiler import EngineProfiler, HandlerAlert, HandlerWatchdog
 
 __all__ = [
+    "LEVELS",
     "EventCategory",
+    "Schedule",
     "EventHandler",
     "PreEpochHandler",
     "PostEpochHandler",
     "PreIterationHandler",
     "PostIterationHandler",
+    "AggregatedIterationHandler",
+    "HandlerHandle",
     "Engine",
 ]
 
@@ -24,19 +49,111 @@ class EventCategory(Enum):
     AFTER_ITERATION = "after_iteration"
 
 
+# schedule level -> engine attribute
+LEVELS = {
+    "epoch": "epoch",
+    "iteration": "iteration",
+    "global_iteration": "global_iteration",
+    "seconds": "elapsed_seconds",
+    "samples": "samples_seen",
+}
+
+# levels triggered when the value is a multiple of `every`, the values of the
+# other levels only increase and trigger when they cross a multiple of `every`
+_PERIODIC_LEVELS = ("epoch", "iteration")
+
+
+class Schedule(NamedTuple):
+    """
+    Schedule of a default trigger.
+
+    Parameters
+    ----------
+    level: str
+        one of `LEVELS`: 'epoch', 'iteration', 'global_iteration' (train
+        iterations across epochs), 'seconds' (wall-clock) or 'samples'
+        (train samples)
+    every: int
+        a float is allowed for 'seconds'
+    train_stub: bool
+    eval_stub: bool
+    lambda_stub: bool
+    """
+
+    level: str
+    every: int = 1
+    train_stub: bool = True
+    eval_stub: bool = True
+    lambda_stub: bool = False
+
+    def accepts(self, stub_kind: str) -> bool:
+        """Whether or not the schedule triggers at the stub kind."""
+        if stub_kind == "train":
+            return self.train_stub
+        if stub_kind == "eval":
+            return self.eval_stub
+        if stub_kind == "lambda":
+            return self.lambda_stub
+        return True
+
+
 class EventHandler:
-    """Base Class for Event Handlers."""
+    """
+    Base Class for Event Handlers.
+
+    If the handler uses a default trigger, its `schedule` is set such that
+    `Engine` can compile the trigger instead of calling it.
+
+    `rank_zero_only` controls whether a distributed engine runs the handler
+    on rank 0 only. If None, the engine decides based on the category.
+
+    If `async_` is True, the trigger is checked in the engine loop but the
+    action runs on the thread pool of the engine, see `HandlerExecutor`. The
+    action receives an `EngineSnapshot` instead of the engine, with the
+    summaries of the buffers in `snapshot_buffers` (none by default, all if
+    None). The summaries are computed on the engine thread, so only cheap
+    buffers should be listed. At most `max_pending` snapshots are queued per
+    handler; when the queue is full, `backpressure` is either 'block' (wait)
+    or 'drop' (skip the action).
+
+    Handlers of a category run by decreasing `priority`, then in attach
+    order. A handler with `once=True` is detached after it fires.
+    """
 
     category: EventCategory
+    schedule: Optional[Schedule]
 
     def __init__(
         self,
         action_function: Optional[Callable[[EngineBase], None]] = None,
         trigger_function: Optional[Callable[[EngineBase], bool]] = None,
+        schedule: Optional[Schedule] = None,
+        rank_zero_only: Optional[bool] = None,
+        async_: bool = False,
+        max_pending: int = 64,
+        backpressure: str = "block",
+        snapshot_buffers: Optional[Sequence[str]] = (),
+        priority: int = 0,
+        once: bool = False,
         **kwargs,
     ):
+        if backpressure not in ("block", "drop"):
+            raise ValueError(
+                f"backpressure can be `block` or `drop` but got `{backpressure}`."
+            )
+        max_pending = int(max_pending)
+        if max_pending < 1:
+            raise ValueError(f"max_pending should be positive but got {max_pending}.")
         self.action_function = action_function
         self.trigger_function = trigger_function
+        self.schedule = schedule
+        self.rank_zero_only = rank_zero_only
+        self.async_ = async_
+        self.max_pending = max_pending
+        self.backpressure = backpressure
+        self.snapshot_buffers = snapshot_buffers
+        self.priority = int(priority)
+        self.once = once
 
     def trigger(self, engine: EngineBase) -> bool:
         if self.trigger_function is None:
@@ -61,10 +178,10 @@ class EventHandler:
         lines.append(self.__class__.__name__)
         lines.append(" " * REPR_INDENT + "trigger function:")
         if self.trigger_function:
-            lines.append(" " * REPR_INDENT * 2 + self.trigger_function.__name__)
+            lines.append(" " * REPR_INDENT * 2 + _function_name(self.trigger_function))
         lines.append(" " * REPR_INDENT + "action function:")
         if self.action_function:
-            lines.append(" " * REPR_INDENT * 2 + self.action_function.__name__)
+            lines.append(" " * REPR_INDENT * 2 + _function_name(self.action_function))
 
         return "\n".join(lines)
 
@@ -104,7 +221,7 @@ class EventHandler:
         engine : EngineBase
             positional arg for engine
         level : str
-            either 'epoch' or 'iteration'
+            one of `LEVELS`, e.g. 'epoch' or 'iteration'
         every : int, optional
             every 'level', by default 1
         train_stub : bool, optional
@@ -119,15 +236,8 @@ class EventHandler:
         bool
             whether or not trigger the event
         """
-        if level == "epoch":
-            every_flag = int(engine.epoch) % int(every) == 0
-        elif level == "iteration":
-            every_flag = int(engine.iteration) % int(every) == 0
-        else:
-            raise ValueError(f"level can be `epoch` or `iteration` but got `{level}`.")
-
-        if not every_flag:
-            return False
+        if level not in LEVELS:
+            raise ValueError(f"level can be one of {list(LEVELS)} but got `{level}`.")
 
         if not train_stub and engine.is_train_stub:
             return False
@@ -138,7 +248,11 @@ class EventHandler:
         if not lambda_stub and engine.is_lambda_stub:
             return False
 
-        return True
+        value = getattr(engine, LEVELS[level])
+        if level in _PERIODIC_LEVELS:
+            return int(value) % int(every) == 0
+
+        return _crosses(engine, self, LEVELS[level], value, every)
 
     def _default_epoch_trigger(
         self,
@@ -223,6 +337,40 @@ class EventHandler:
         )
 
 
+def _function_name(function: Callable) -> str:
+    # callable objects, e.g. writers, do not have a `__name__`
+    return getattr(function, "__name__", type(function).__name__)
+
+
+def _check_every(every: float, level: str) -> float:
+    if level not in LEVELS:
+        raise ValueError(f"level can be one of {list(LEVELS)} but got `{level}`.")
+    if level == "seconds":
+        every = float(every)
+        if every <= 0:
+            raise ValueError(f"every should be positive but got {every}.")
+        return every
+    every = int(every)
+    if every < 1:
+        raise ValueError(f"every should be a positive integer but got {every}.")
+    return every
+
+
+def _crosses(
+    engine: EngineBase, handler: EventHandler, attribute: str, value: float, every
+) -> bool:
+    # the multiple of `every` crossed last is kept by the engine, such that
+    # `reset_engine` and `load_state_dict` start the schedules over
+    crossed = value // every
+    last = engine._crossings.get(handler)
+    if last is None:
+        last = engine._level_origins.get(attribute, 0) // every
+    if crossed > last:
+        engine._crossings[handler] = crossed
+        return True
+    return False
+
+
 class PreEpochHandler(EventHandler):
     """Hanldes events when a new epoch starts."""
 
@@ -236,17 +384,22 @@ class PreEpochHandler(EventHandler):
         train_stub: bool = True,
         eval_stub: bool = True,
         lambda_stub: bool = False,
+        level: str = "epoch",
+        **kwargs,
     ):
+        schedule = None
         if trigger_function is None:
+            every = _check_every(every, level)
 
             def default_trigger(engine: EngineBase):
-                return self._default_epoch_trigger(
-                    engine, every, train_stub, eval_stub, lambda_stub
+                return self._default_trigger(
+                    engine, level, every, train_stub, eval_stub, lambda_stub
                 )
 
             trigger_function = default_trigger
+            schedule = Schedule(level, every, train_stub, eval_stub, lambda_stub)
 
-        super().__init__(action_function, trigger_function)
+        super().__init__(action_function, trigger_function, schedule, **kwargs)
 
 
 class PostEpochHandler(EventHandler):
@@ -262,17 +415,22 @@ class PostEpochHandler(EventHandler):
         train_stub: bool = True,
         eval_stub: bool = True,
         lambda_stub: bool = False,
+        level: str = "epoch",
+        **kwargs,
     ):
+        schedule = None
         if trigger_function is None:
+            every = _check_every(every, level)
 
             def default_trigger(engine: EngineBase):
-                return self._default_epoch_trigger(
-                    engine, every, train_stub, eval_stub, lambda_stub
+                return self._default_trigger(
+                    engine, level, every, train_stub, eval_stub, lambda_stub
                 )
 
             trigger_function = default_trigger
+            schedule = Schedule(level, every, train_stub, eval_stub, lambda_stub)
 
-        super().__init__(action_function, trigger_function)
+        super().__init__(action_function, trigger_function, schedule, **kwargs)
 
 
 class PreIterationHandler(EventHandler):
@@ -288,17 +446,22 @@ class PreIterationHandler(EventHandler):
         train_stub: bool = True,
         eval_stub: bool = True,
         lambda_stub: bool = False,
+        level: str = "iteration",
+        **kwargs,
     ):
+        schedule = None
         if trigger_function is None:
+            every = _check_every(every, level)
 
             def default_trigger(engine: EngineBase):
-                return self._default_iteration_trigger(
-                    engine, every, train_stub, eval_stub, lambda_stub
+                return self._default_trigger(
+                    engine, level, every, train_stub, eval_stub, lambda_stub
                 )
 
             trigger_function = default_trigger
+            schedule = Schedule(level, every, train_stub, eval_stub, lambda_stub)
 
-        super().__init__(action_function, trigger_function)
+        super().__init__(action_function, trigger_function, schedule, **kwargs)
 
 
 class PostIterationHandler(EventHandler):
@@ -314,41 +477,358 @@ class PostIterationHandler(EventHandler):
         train_stub: bool = True,
         eval_stub: bool = True,
         lambda_stub: bool = False,
+        level: str = "iteration",
+        **kwargs,
     ):
+        schedule = None
         if trigger_function is None:
+            every = _check_every(every, level)
 
             def default_trigger(engine: EngineBase):
-                return self._default_iteration_trigger(
-                    engine, every, train_stub, eval_stub, lambda_stub
+                return self._default_trigger(
+                    engine, level, every, train_stub, eval_stub, lambda_stub
                 )
 
             trigger_function = default_trigger
+            schedule = Schedule(level, every, train_stub, eval_stub, lambda_stub)
+
+        super().__init__(action_function, trigger_function, schedule, **kwargs)
 
-        super().__init__(action_function, trigger_function)
+
+class AggregatedIterationHandler(PostIterationHandler):
+    """
+    Delivers the values of many iterations to the action at once.
+
+    When triggered, the handler stages the `fields` of the engine in columns.
+    Every `size` rows, and when the epoch finishes or the engine stops, the
+    action is called once with the columns as arrays:
+
+        action_function(engine, block: Dict[str, np.ndarray])
+
+    A field is an attribute path of the engine, e.g. 'global_iteration' or
+    'loss.mean' for the `mean` of the buffer `loss`. Tensors are staged on
+    their device and copied to numpy when the block is delivered.
+
+    Parameters
+    ----------
+    action_function : Callable[[EngineBase, Dict[str, np.ndarray]], None]
+        Receives the engine and the block
+    fields : Sequence[str]
+        Attribute paths of the engine to stage
+    size : int, optional
+        Number of rows of a block, by default 100
+
+    The other arguments are those of `PostIterationHandler`.
+    """
+
+    def __init__(
+        self,
+        action_function: Callable[[EngineBase, Dict[str, np.ndarray]], None],
+        fields: Sequence[str],
+        size: int = 100,
+        trigger_function: Optional[Callable[[EngineBase], bool]] = None,
+        every: int = 1,
+        train_stub: bool = True,
+        eval_stub: bool = True,
+        lambda_stub: bool = False,
+        level: str = "iteration",
+        **kwargs,
+    ):
+        if kwargs.get("async_", False):
+            raise ValueError("AggregatedIterationHandler cannot be asynchronous.")
+        size = int(size)
+        if size < 1:
+            raise ValueError(f"size should be a positive integer but got {size}.")
+        self.fields = tuple(fields)
+        self.size = size
+        self._getters = [attrgetter(field) for field in self.fields]
+        self._columns: List[List[Any]] = [[] for _ in self.fields]
+        super().__init__(
+            action_function,
+            trigger_function,
+            every,
+            train_stub,
+            eval_stub,
+            lambda_stub,
+            level,
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        """Number of staged rows."""
+        return len(self._columns[0]) if self._columns else 0
+
+    def action(self, engine: EngineBase):
+        for getter, column in zip(self._getters, self._columns):
+            value = getter(engine)
+            if isinstance(value, torch.Tensor):
+                # buffers can update their tensors in place
+                value = value.detach().clone()
+            column.append(value)
+        if len(self) >= self.size:
+            self.flush(engine)
+
+    def flush(self, engine: EngineBase) -> None:
+        """Delivers the staged rows, if any, to the action."""
+        if len(self) == 0:
+            return
+        columns, self._columns = self._columns, [[] for _ in self.fields]
+        block = {f: _to_array(c) for f, c in zip(self.fields, columns)}
+        self.action_function(engine, block)
+
+
+def _to_array(values: List[Any]) -> np.ndarray:
+    if isinstance(values[0], torch.Tensor):
+        return torch.stack(values).cpu().numpy()
+    return np.asarray(values)
+
+
+def _stub_kind(engine: EngineBase) -> str:
+    if engine.is_train_stub:
+        return "train"
+    if engine.is_eval_stub:
+        return "eval"
+    if engine.is_lambda_stub:
+        return "lambda"
+    return "other"
+
+
+def _handler_call(
+    handler: EventHandler,
+    executor: Optional[HandlerExecutor],
+    detach: Callable[[EventHandler], None],
+) -> Callable[[EngineBase], None]:
+    if not (handler.async_ or handler.once or handler.schedule is not None):
+        return handler.__call__
+
+    fire = handler.action
+    if handler.async_:
+        fire = partial(executor.submit, handler)
+    if handler.once:
+        action = fire
+
+        def fire(engine: EngineBase):
+            detach(handler)
+            action(engine)
+
+    # schedules are checked by the plan, custom triggers are called here
+    if handler.schedule is not None:
+        return fire
+    trigger = handler.trigger
+
+    def call(engine: EngineBase):
+        if trigger(engine):
+            fire(engine)
+
+    return call
+
+
+class _DispatchPlan:
+    """
+    Compiled dispatch of the handlers of one `EventCategory`.
+
+    The handlers are bucketed by stub kind. Handlers with a `schedule` are
+    checked with precomputed `every`s and the next due value of each level
+    used by the bucket is cached, such that nothing is evaluated until the
+    bucket is due, e.g. a wall-clock schedule costs one comparison per
+    dispatch. Handlers with custom triggers are always called.
+
+    The actions of asynchronous handlers are submitted to `executor`, and
+    one-shot handlers are removed by `detach` when they fire.
+    """
+
+    def __init__(
+        self,
+        handlers: List[EventHandler],
+        profiler: Optional[EngineProfiler] = None,
+        executor: Optional[HandlerExecutor] = None,
+        detach: Optional[Callable[[EventHandler], None]] = None,
+    ):
+        calls = {}
+        for h in handlers:
+            call = _handler_call(h, executor, detach)
+            if profiler is not None:
+                call = profiler.wrap_handler(h, call)
+            calls[h] = call
+
+        # only the levels in use are read from the engine
+        used = {h.schedule.level for h in handlers if h.schedule is not None}
+        self.levels = tuple(level for level in LEVELS if level in used)
+        getter = attrgetter(*(LEVELS[level] for level in self.levels or ("epoch",)))
+        self.values = getter if len(self.levels) > 1 else lambda e: (getter(e),)
+        self.attributes = tuple(LEVELS[level] for level in self.levels)
+
+        self.buckets = {}
+        self.has_custom = {}
+        for kind in ("train", "eval", "lambda", "other"):
+            bucket = []
+            for h in handlers:
+                if h.schedule is None:
+                    bucket.append((calls[h], None, None, None))
+                elif h.schedule.accepts(kind):
+                    level = self.levels.index(h.schedule.level)
+                    # non-periodic schedules are triggered by crossings
+                    crossing = None if h.schedule.level in _PERIODIC_LEVELS else h
+                    bucket.append((calls[h], level, h.schedule.every, crossing))
+            self.buckets[kind] = tuple(bucket)
+            self.has_custom[kind] = any(entry[2] is None for entry in bucket)
+        n = max(1, len(self.levels))
+        self.last = {kind: (math.inf,) * n for kind in self.buckets}
+        self.next_due = {kind: (-math.inf,) * n for kind in self.buckets}
+        # whether a handler of the level was due at the last value
+        self.hit = {kind: (True,) * n for kind in self.buckets}
+
+    def __call__(self, engine: EngineBase) -> None:
+        kind = _stub_kind(engine)
+        bucket = self.buckets[kind]
+        if not bucket:
+            return
+
+        # a level is skipped if its value advanced but is not due yet, or did
+        # not change since a dispatch at which none of its handlers was due,
+        # e.g. `iteration` does not advance in evaluate stubs
+        values = self.values(engine)
+        if not self.has_custom[kind]:
+            for last, value, due, hit in zip(
+                self.last[kind], values, self.next_due[kind], self.hit[kind]
+            ):
+                if not (last < value < due or (value == last and not hit)):
+                    break
+            else:
+                return
+
+        next_due = [math.inf] * len(values)
+        hit = [False] * len(values)
+        for call, level, every, crossing in bucket:
+            if every is None:
+                call(engine)
+                continue
+            value = values[level]
+            if crossing is None:
+                remainder = value % every
+                if remainder == 0:
+                    hit[level] = True
+                    call(engine)
+                due = value - remainder + every
+            else:
+                attribute = self.attributes[level]
+                if _crosses(engine, crossing, attribute, value, every):
+                    hit[level] = True
+                    call(engine)
+                due = (value // every + 1) * every
+            if due < next_due[level]:
+                next_due[level] = due
+
+        self.last[kind] = values
+        self.next_due[kind] = tuple(next_due)
+        self.hit[kind] = tuple(hit)
+
+
+class HandlerHandle:
+    """
+    Handle of an event handler attached to an `Engine`.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine
+    handler : EventHandler
+        The attached handler
+    priority : int
+        Handlers with higher priority run first
+    index : int
+        Attach order, which breaks ties of priority
+    """
+
+    def __init__(
+        self, engine: "Engine", handler: EventHandler, priority: int, index: int
+    ):
+        self.engine = engine
+        self.handler = handler
+        self.priority = priority
+        self.index = index
+        self.enabled = True
+
+    @property
+    def attached(self) -> bool:
+        registry = self.engine._event_handlers[self.handler.category]
+        return registry.get(self.handler) is self
+
+    def enable(self) -> None:
+        self._set_enabled(True)
+
+    def disable(self) -> None:
+        """Disables the handler, which is skipped until enabled again."""
+        self._set_enabled(False)
+
+    def _set_enabled(self, enabled: bool) -> None:
+        if self.enabled != enabled:
+            self.enabled = enabled
+            self.engine._dispatch_plans.pop(self.handler.category, None)
+
+    def detach(self) -> None:
+        """Detaches the handler from the engine."""
+        self.engine.detach_event(self.handler)
+
+    def _key(self) -> Tuple[int, int]:
+        return -self.priority, self.index
+
+    def __repr__(self):
+        lines = []
+        lines.append(self.__class__.__name__)
+        lines.append(" " * REPR_INDENT + f"priority: {self.priority}")
+        lines.append(" " * REPR_INDENT + f"enabled: {self.enabled}")
+        for line in repr(self.handler).split("\n"):
+            lines.append(" " * REPR_INDENT + line)
+        return "\n".join(lines)
 
 
 class Engine(EngineBase):
     """
     Engine with Event Handler plugin.
 
+    The handlers of each category are compiled into a dispatch plan when
+    first dispatched after `attach_event`.
+
+    The actions of asynchronous handlers run on a `HandlerExecutor` of
+    `async_workers` threads, created on first use. They are flushed when
+    `execute` returns, see `flush_events`. The rows staged by
+    `AggregatedIterationHandler`s are delivered when an epoch finishes and
+    when `execute` returns or is interrupted, e.g. by a `BreakIteration`
+    shutdown or a `KeyboardInterrupt`.
+
+    Handlers are attached with a priority and dispatched by decreasing
+    priority, then in attach order. `attach_event` returns a `HandlerHandle`
+    to enable, disable or detach the handler. Detaching is O(1), the dispatch
+    plan of the category is recompiled when it is next dispatched.
+
     Attributes
     ----------
-    _event_handlers : Dict[EventCategory, List[EventHandler]]
+    _event_handlers : Dict[EventCategory, Dict[EventHandler, HandlerHandle]]
         The registry of event handlers.
     """
 
-    _event_handlers: Dict[EventCategory, List[EventHandler]]
+    _event_handlers: Dict[EventCategory, Dict[EventHandler, HandlerHandle]]
+    _dispatch_plans: Dict[EventCategory, _DispatchPlan]
+
+    # number of threads running asynchronous handlers
+    async_workers: int = 4
 
     def __init__(self):
         super().__init__()
         self._event_handlers = {
-            EventCategory.EPOCH_STARTS: [],
-            EventCategory.EPOCH_FINISHES: [],
-            EventCategory.BEFORE_ITERATION: [],
-            EventCategory.AFTER_ITERATION: [],
+            EventCategory.EPOCH_STARTS: {},
+            EventCategory.EPOCH_FINISHES: {},
+            EventCategory.BEFORE_ITERATION: {},
+            EventCategory.AFTER_ITERATION: {},
         }
+        self._dispatch_plans = {}
+        self._executor = None
+        self._attach_count = itertools.count()
 
-    def attach_event(self, handler: EventHandler):
+    def attach_event(
+        self, handler: EventHandler, priority: Optional[int] = None
+    ) -> HandlerHandle:
         """
         Attach an event handler.
 
@@ -356,11 +836,47 @@ class Engine(EngineBase):
         ----------
         handler : EventHandler
             An event handler to be attached.
+        priority : Optional[int]
+            Handlers with higher priority run first (the default is None).
+            If not provided, `handler.priority` is used.
+
+        Returns
+        -------
+        HandlerHandle
+            Handle to enable, disable or detach the handler.
         """
-        if isinstance(handler, EventHandler) and handler.category:
-            self._event_handlers[handler.category].append(handler)
-        else:
+        if not (isinstance(handler, EventHandler) and handler.category):
             raise TypeError("Category of handler must be specified.")
+        registry = self._event_handlers[handler.category]
+        if handler in registry:
+            raise ValueError(f"Handler is already attached: {handler}")
+        if priority is None:
+            priority = handler.priority
+        handle = HandlerHandle(self, handler, priority, next(self._attach_count))
+        registry[handler] = handle
+        self._dispatch_plans.pop(handler.category, None)
+        return handle
+
+    def detach_event(self, handler: Union[EventHandler, HandlerHandle]) -> None:
+        """
+        Detach an event handler.
+
+        Parameters
+        ----------
+        handler : Union[EventHandler, HandlerHandle]
+            The handler or its handle.
+
+        Raises
+        ------
+        KeyError
+            The handler is not attached.
+        """
+        if isinstance(handler, HandlerHandle):
+            handler = handler.handler
+        del self._event_handlers[handler.category][handler]
+        self._dispatch_plans.pop(handler.category, None)
+        if isinstance(handler, AggregatedIterationHandler):
+            handler.flush(self)
 
     def list_events(self, event_category: Optional[str] = None) -> Tuple[EventHandler]:
         """
@@ -375,26 +891,184 @@ class Engine(EngineBase):
         Returns
         -------
         Tuple[EventHandler]
-            Tuple of handlers.
+            Tuple of handlers in dispatch order.
         """
-        return (
-            self._event_handlers[EventCategory(event_category)]
-            if event_category
-            else self._event_handlers
+        if event_category:
+            return self._ordered_handlers(EventCategory(event_category))
+        return {c: self._ordered_handlers(c) for c in self._event_handlers}
+
+    def _ordered_handlers(self, category: EventCategory) -> Tuple[EventHandler]:
+        handles = sorted(
+            self._event_handlers[category].values(), key=HandlerHandle._key
         )
+        return tuple(h.handler for h in handles)
+
+    def enable_profiling(self, window: int = 1000) -> EngineProfiler:
+        """Enables the timing of the engine loop and of each event handler."""
+        profiler = super().enable_profiling(window)
+        self._dispatch_plans.clear()
+        return profiler
+
+    def disable_profiling(self) -> None:
+        """Disables the timing of the engine loop and of the event handlers."""
+        super().disable_profiling()
+        self._dispatch_plans.clear()
+
+    def enable_watchdog(
+        self,
+        budget: Optional[float] = None,
+        share: Optional[float] = None,
+        callback: Optional[Callable[[HandlerAlert], None]] = None,
+        check_every: int = 100,
+        window: int = 1000,
+    ) -> HandlerWatchdog:
+        """
+        Checks the timings of the event handlers, see `HandlerWatchdog`.
+
+        Profiling is enabled with `window` if it is not, and the watchdog is
+        removed when profiling is disabled.
+
+        Parameters
+        ----------
+        budget : Optional[float], optional
+            Seconds a call of a handler may take, by default None
+        share : Optional[float], optional
+            Share of the engine time a handler may take, by default None
+        callback : Optional[Callable[[HandlerAlert], None]], optional
+            Called with each alert, by default a warning is emitted once per
+            handler and reason
+        check_every : int, optional
+            Number of calls of a handler between checks of its share, by
+            default 100
+        window : int, optional
+            Number of recent timings kept per handler, by default 1000
+
+        Returns
+        -------
+        HandlerWatchdog
+            The watchdog
+        """
+        if self._profiler is None:
+            self.enable_profiling(window)
+        watchdog = HandlerWatchdog(budget, share, callback, check_every)
+        self._profiler.watchdog = watchdog
+        return watchdog
+
+    def disable_watchdog(self) -> None:
+        """Stops checking the timings of the event handlers."""
+        if self._profiler is not None:
+            self._profiler.watchdog = None
+
+    def top_handlers(self, k: int = 10, by: str = "total") -> List[Dict[str, Any]]:
+        """
+        The `k` most expensive event handlers, see `EngineProfiler.top_handlers`.
+        """
+        if self._profiler is None:
+            raise RuntimeError("Profiling is not enabled, see `enable_profiling`.")
+        return self._profiler.top_handlers(k, by)
+
+    def _plan_handlers(self, category: EventCategory) -> List[EventHandler]:
+        """Returns the handlers compiled into the dispatch plan of `category`."""
+        registry = self._event_handlers[category]
+        return [h for h in self._ordered_handlers(category) if registry[h].enabled]
+
+    def dispatch(self, category: EventCategory) -> None:
+        """
+        Dispatch the handlers of an event category.
+
+        Parameters
+        ----------
+        category : EventCategory
+            Event category
+        """
+        plan = self._dispatch_plans.get(category)
+        if plan is None:
+            handlers = self._plan_handlers(category)
+            executor = None
+            if any(h.async_ for h in handlers):
+                executor = self.async_executor
+            plan = _DispatchPlan(handlers, self._profiler, executor, self.detach_event)
+            self._dispatch_plans[category] = plan
+        plan(self)
+
+    @property
+    def async_executor(self) -> HandlerExecutor:
+        """The executor of asynchronous handlers."""
+        if self._executor is None:
+            self._executor = HandlerExecutor(self.async_workers)
+        return self._executor
+
+    def flush_aggregated_events(self) -> None:
+        """Delivers the staged rows of the `AggregatedIterationHandler`s."""
+        for handler in self._event_handlers[EventCategory.AFTER_ITERATION]:
+            if isinstance(handler, AggregatedIterationHandler):
+                handler.flush(self)
+
+    def flush_events(self, timeout: Optional[float] = None) -> bool:
+        """
+        Delivers the staged rows of aggregated handlers, and waits until the
+        actions of asynchronous handlers and the checkpoints of the attached
+        `CheckpointWriter`s are done.
+
+        Parameters
+        ----------
+        timeout : Optional[float], optional
+            Timeout in seconds, by default None
+
+        Returns
+        -------
+        bool
+            False if the timeout expires before the actions are done
+        """
+        self.flush_aggregated_events()
+        done = True
+        if self._executor is not None:
+            done = self._executor.flush(timeout)
+        for handlers in self._event_handlers.values():
+            for handler in handlers:
+                writer = getattr(handler, "action_function", None)
+                if isinstance(writer, CheckpointWriter):
+                    writer.wait()
+        return done
+
+    def execute(self, **kwargs) -> None:
+        try:
+            super().execute(**kwargs)
+        except BaseException:
+            # errors of the handlers must not mask the exception, e.g. the
+            # KeyboardInterrupt that pauses the engine
+            self._close_events(raise_errors=False)
+            raise
+        self._close_events()
+
+    def _close_events(self, raise_errors: bool = True) -> None:
+        """Flushes the events and stops the threads of asynchronous handlers."""
+        try:
+            self.flush_events()
+        except Exception as e:
+            if raise_errors:
+                raise
+            warnings.warn(f"Event handler raised {e!r} while the engine stopped.")
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+    def reset_engine(self) -> None:
+        super().reset_engine()
+        # `EngineBase.__init__` resets the engine before the executor exists
+        executor = getattr(self, "_executor", None)
+        if executor is not None:
+            executor.shutdown()
 
     def when_epoch_starts(self):
-        for h in self._event_handlers[EventCategory.EPOCH_STARTS]:
-            h(self)
+        self.dispatch(EventCategory.EPOCH_STARTS)
 
     def when_epoch_finishes(self):
-        for h in self._event_handlers[EventCategory.EPOCH_FINISHES]:
-            h(self)
+        self.flush_aggregated_events()
+        self.dispatch(EventCategory.EPOCH_FINISHES)
 
     def before_iteration(self):
-        for h in self._event_handlers[EventCategory.BEFORE_ITERATION]:
-            h(self)
+        self.dispatch(EventCategory.BEFORE_ITERATION)
 
     def after_iteration(self):
-        for h in self._event_handlers[EventCategory.AFTER_ITERATION]:
-            h(self)
+        self.dispatch(EventCategory.AFTER_ITERATION)
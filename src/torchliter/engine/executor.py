@@ -0,0 +1,210 @@
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional
+
+import torch
+
+from .base import EngineBase
+from .buffers import _SUMMARY_STATISTICS, BufferBase
+
+__all__ = ["EngineSnapshot", "HandlerExecutor"]
+
+
+class EngineSnapshot(NamedTuple):
+    """
+    Immutable snapshot of the engine state passed to asynchronous handlers.
+
+    Parameters
+    ----------
+    epoch: int
+    iteration: int
+    absolute_iterations: Optional[int]
+        None before the length of an epoch is known
+    stub: Optional[str]
+        action of the current stub
+    buffers: Mapping[str, Mapping[str, Any]]
+        summary statistics of the selected buffers, on cpu
+    """
+
+    epoch: int
+    iteration: int
+    absolute_iterations: Optional[int]
+    stub: Optional[str]
+    buffers: Mapping[str, Mapping[str, Any]]
+
+    @classmethod
+    def take(
+        cls, engine: EngineBase, buffers: Optional[Iterable[str]] = None
+    ) -> "EngineSnapshot":
+        """
+        Takes a snapshot of `engine`.
+
+        Parameters
+        ----------
+        engine : EngineBase
+            The engine
+        buffers : Optional[Iterable[str]], optional
+            Names of the buffers to summarize, by default all of them
+
+        Returns
+        -------
+        EngineSnapshot
+            The snapshot
+        """
+        registry = engine.buffer_registry
+        names = registry if buffers is None else buffers
+        summaries = {}
+        for name in names:
+            summary = _summarize(registry[name])
+            if summary:
+                summaries[name] = MappingProxyType(summary)
+        absolute = None
+        if engine.epoch_length is not None:
+            absolute = engine.absolute_iterations
+        return cls(
+            epoch=engine.epoch,
+            iteration=engine.iteration,
+            absolute_iterations=absolute,
+            stub=getattr(engine.current_stub, "action", None),
+            buffers=MappingProxyType(summaries),
+        )
+
+
+def _detach(value: Any) -> Any:
+    if isinstance(value, torch.Tensor):
+        if value.numel() == 1:
+            return value.item()
+        return value.detach().cpu().clone()
+    if isinstance(value, dict):
+        return MappingProxyType({k: _detach(v) for k, v in value.items()})
+    return value
+
+
+def _summarize(buffer: BufferBase) -> Dict[str, Any]:
+    summary = getattr(buffer, "summary", None)
+    if callable(summary):
+        return {k: _detach(v) for k, v in summary().items()}
+    out = {}
+    for stat in _SUMMARY_STATISTICS:
+        try:
+            out[stat] = _detach(getattr(buffer, stat))
+        except (AttributeError, NotImplementedError):
+            continue
+    return out
+
+
+class HandlerExecutor:
+    """
+    Runs the actions of asynchronous event handlers on a thread pool.
+
+    Each handler has its own queue of snapshots, which is drained by at most
+    one worker at a time, such that the actions of a handler run in the order
+    they are submitted. Actions of different handlers run concurrently.
+
+    A queue holds at most `handler.max_pending` snapshots, including the one
+    in progress. When it is full, `handler.backpressure` decides:
+
+    - block: the engine waits until the queue has room
+    - drop: the new snapshot is dropped and counted in `dropped`
+
+    Exceptions raised by the actions are re-raised by `flush`.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Number of threads, by default 4
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = int(max_workers)
+        self.dropped: Dict[Any, int] = collections.Counter()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._condition = threading.Condition()
+        self._queues: Dict[Any, collections.deque] = {}
+        self._running = set()
+        self._errors: List[BaseException] = []
+
+    def submit(self, handler: Any, engine: EngineBase) -> None:
+        """Submits the action of `handler` on a snapshot of `engine`."""
+        with self._condition:
+            queue = self._queues.setdefault(handler, collections.deque())
+            if len(queue) >= handler.max_pending:
+                if handler.backpressure == "drop":
+                    self.dropped[handler] += 1
+                    return
+                self._condition.wait_for(lambda: len(queue) < handler.max_pending)
+
+        # only the engine thread appends, the queue cannot fill up meanwhile
+        snapshot = EngineSnapshot.take(engine, handler.snapshot_buffers)
+        with self._condition:
+            queue.append(snapshot)
+            if handler in self._running:
+                return
+            self._running.add(handler)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="torchliter-handler"
+            )
+        self._pool.submit(self._drain, handler)
+
+    def _drain(self, handler: Any) -> None:
+        queue = self._queues[handler]
+        while True:
+            with self._condition:
+                if not queue:
+                    self._running.discard(handler)
+                    self._condition.notify_all()
+                    return
+                snapshot = queue[0]
+            try:
+                handler.action(snapshot)
+            except BaseException as e:
+                with self._condition:
+                    self._errors.append(e)
+            with self._condition:
+                queue.popleft()
+                self._condition.notify_all()
+
+    def pending(self) -> int:
+        """Number of snapshots not processed yet."""
+        with self._condition:
+            return sum(len(q) for q in self._queues.values())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the queued actions are done.
+
+        Parameters
+        ----------
+        timeout : Optional[float], optional
+            Timeout in seconds, by default None
+
+        Returns
+        -------
+        bool
+            False if the timeout expires before the actions are done
+
+        Raises
+        ------
+        Exception
+            The first exception raised by an action since the last flush
+        """
+        with self._condition:
+            done = self._condition.wait_for(lambda: not self._running, timeout)
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+        return done
+
+    def shutdown(self) -> None:
+        """
+        Waits until the queued actions are done and stops the threads.
+
+        Exceptions raised by the actions are kept for the next `flush`. The
+        threads are started again by the next `submit`.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
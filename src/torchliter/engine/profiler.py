@@ -0,0 +1,320 @@
+import time
+import warnings
+from functools import wraps
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from .buffers import ScalarSmoother
+
+__all__ = ["EngineProfiler", "HandlerAlert", "HandlerWatchdog"]
+
+
+class EngineProfiler:
+    """
+    Wall-clock timings of the engine loop.
+
+    Each phase is recorded in a `ScalarSmoother` of size `window`, which acts
+    as a ring buffer of the most recent timings, plus a cumulative total.
+
+    Phases:
+        - data_fetch: waiting on the next batch
+        - before_iteration
+        - per_batch
+        - after_iteration
+        - epoch_starts
+        - epoch_finishes
+
+    The event handlers dispatched by `Engine` are recorded per handler, and
+    checked by `watchdog` if one is set, see `HandlerWatchdog`.
+
+    Parameters
+    ----------
+    window : int, optional
+        Number of recent timings kept per phase, by default 1000
+    """
+
+    PHASES = (
+        "data_fetch",
+        "before_iteration",
+        "per_batch",
+        "after_iteration",
+        "epoch_starts",
+        "epoch_finishes",
+    )
+
+    # engine method -> phase
+    HOOKS = {
+        "before_iteration": "before_iteration",
+        "per_batch": "per_batch",
+        "after_iteration": "after_iteration",
+        "when_epoch_starts": "epoch_starts",
+        "when_epoch_finishes": "epoch_finishes",
+    }
+
+    def __init__(self, window: int = 1000):
+        self.window = int(window)
+        self.buffers = {phase: ScalarSmoother(self.window) for phase in self.PHASES}
+        self.totals = {phase: 0.0 for phase in self.PHASES}
+        self.counts = {phase: 0 for phase in self.PHASES}
+        self.handlers = {}
+        self.shadowed = {}
+        self.watchdog: Optional[HandlerWatchdog] = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.buffers[phase].update(seconds)
+        self.totals[phase] += seconds
+        self.counts[phase] += 1
+
+    def wrap(self, method: Callable, phase: str) -> Callable:
+        """Returns `method` timed as `phase`."""
+        record = self.record
+        clock = time.perf_counter
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(phase, clock() - start)
+
+        return timed
+
+    def iterate(self, batches: Iterable) -> Iterator[Any]:
+        """Yields from `batches` and records the waiting time as `data_fetch`."""
+        record = self.record
+        clock = time.perf_counter
+        iterator = iter(batches)
+        try:
+            while True:
+                start = clock()
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    return
+                record("data_fetch", clock() - start)
+                yield batch
+        finally:
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+
+    def wrap_handler(self, handler: Any, call: Callable) -> Callable:
+        """Returns `call` of an event handler timed per handler."""
+        if handler not in self.handlers:
+            self.handlers[handler] = _HandlerRecord(self, handler)
+        record = self.handlers[handler].record
+        clock = time.perf_counter
+
+        def timed(engine):
+            start = clock()
+            try:
+                return call(engine)
+            finally:
+                record(clock() - start)
+
+        return timed
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Summary of the recorded timings in seconds.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Dict[str, float]]]
+            `phases` and `handlers` each maps a name to its `mean`, `max`
+            (within the window), `total`, `count` and `share` of the total
+            time of the phases.
+        """
+        loop_total = self.loop_total()
+
+        phases = {}
+        for phase in self.PHASES:
+            phases[phase] = _stats(
+                self.buffers[phase], self.totals[phase], self.counts[phase], loop_total
+            )
+
+        handlers = {}
+        for name, record in self._named_handlers():
+            handlers[name] = _stats(
+                record.buffer, record.total, record.count, loop_total
+            )
+
+        return {"phases": phases, "handlers": handlers}
+
+    def loop_total(self) -> float:
+        """Total seconds of the phases, including the epoch phases."""
+        # handlers of all categories run within a phase, their share is of
+        # the time of all the phases
+        return max(sum(self.totals.values()), 1e-12)
+
+    def _named_handlers(self) -> Iterator[Tuple[str, "_HandlerRecord"]]:
+        names = set()
+        for record in self.handlers.values():
+            name = record.name
+            if name in names:
+                name = f"{name}#{sum(n.startswith(name) for n in names) + 1}"
+            names.add(name)
+            yield name, record
+
+    def top_handlers(self, k: int = 10, by: str = "total") -> List[Dict[str, Any]]:
+        """
+        The `k` most expensive event handlers.
+
+        Parameters
+        ----------
+        k : int, optional
+            Number of handlers, by default 10
+        by : str, optional
+            Sort key, one of `total`, `mean`, `max` or `share`, by default
+            `total`
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The timings of `summary` with the `name`, `trigger` and `action`
+            function names of each handler, most expensive first.
+        """
+        if by not in ("total", "mean", "max", "share"):
+            raise ValueError(f"Cannot sort handlers by `{by}`.")
+        loop_total = self.loop_total()
+        rows = []
+        for name, record in self._named_handlers():
+            row = {"name": name, "trigger": record.trigger, "action": record.action}
+            row.update(_stats(record.buffer, record.total, record.count, loop_total))
+            rows.append(row)
+        rows.sort(key=lambda row: row[by], reverse=True)
+        return rows[:k]
+
+
+class HandlerAlert(NamedTuple):
+    """
+    Alert of a `HandlerWatchdog`.
+
+    Parameters
+    ----------
+    name: str
+        name of the handler in `EngineProfiler.summary`
+    reason: str
+        'budget' if a call took longer than the budget, 'share' if the
+        handler took more than its share of the engine time
+    value: float
+        seconds of the call or share of the engine time
+    limit: float
+        the budget or the share
+    """
+
+    name: str
+    reason: str
+    value: float
+    limit: float
+
+
+class HandlerWatchdog:
+    """
+    Checks the timings of event handlers against a budget.
+
+    Every call of a handler is checked against `budget`. Every
+    `check_every` calls, the share of the engine time taken by the
+    handler so far is checked against `share`.
+
+    Parameters
+    ----------
+    budget : Optional[float], optional
+        Seconds a call of a handler may take, by default None
+    share : Optional[float], optional
+        Share of the engine time a handler may take, by default None
+    callback : Optional[Callable[[HandlerAlert], None]], optional
+        Called with each alert, by default a warning is emitted once per
+        handler and reason
+    check_every : int, optional
+        Number of calls of a handler between checks of its share, by
+        default 100
+    """
+
+    def __init__(
+        self,
+        budget: Optional[float] = None,
+        share: Optional[float] = None,
+        callback: Optional[Callable[[HandlerAlert], None]] = None,
+        check_every: int = 100,
+    ):
+        if budget is not None:
+            assert budget > 0, f"budget should be positive but got {budget}"
+        if share is not None:
+            assert 0 < share <= 1, f"share should be in (0, 1] but got {share}"
+        check_every = int(check_every)
+        assert check_every > 0, f"check_every should be positive but got {check_every}"
+        self.budget = budget
+        self.share = share
+        self.callback = callback
+        self.check_every = check_every
+        self._warned = set()
+
+    def check(self, profiler: EngineProfiler, record: "_HandlerRecord", seconds: float):
+        if self.budget is not None and seconds > self.budget:
+            self._alert(HandlerAlert(record.name, "budget", seconds, self.budget))
+        if self.share is not None and record.count % self.check_every == 0:
+            share = record.total / profiler.loop_total()
+            if share > self.share:
+                self._alert(HandlerAlert(record.name, "share", share, self.share))
+
+    def _alert(self, alert: HandlerAlert) -> None:
+        if self.callback is not None:
+            self.callback(alert)
+            return
+        if (alert.name, alert.reason) in self._warned:
+            return
+        self._warned.add((alert.name, alert.reason))
+        if alert.reason == "budget":
+            message = f"took {alert.value:.6f}s, the budget is {alert.limit}s"
+        else:
+            message = f"took {alert.value:.1%} of the engine time"
+        warnings.warn(f"Event handler `{alert.name}` {message}.")
+
+
+class _HandlerRecord:
+    def __init__(self, profiler: EngineProfiler, handler: Any):
+        category = getattr(getattr(handler, "category", None), "value", "handler")
+        # the function names shown by `EventHandler.__repr__`
+        action = getattr(handler, "action_function", None)
+        trigger = getattr(handler, "trigger_function", None)
+        if action is None:
+            self.action = type(handler).__name__
+        else:
+            self.action = getattr(action, "__name__", type(action).__name__)
+        self.trigger = getattr(trigger, "__name__", None)
+        self.name = f"{category}/{self.action}"
+        self.buffer = ScalarSmoother(profiler.window)
+        self.total = 0.0
+        self.count = 0
+        self._profiler = profiler
+
+    def record(self, seconds: float) -> None:
+        self.buffer.update(seconds)
+        self.total += seconds
+        self.count += 1
+        watchdog = self._profiler.watchdog
+        if watchdog is not None:
+            watchdog.check(self._profiler, self, seconds)
+
+
+def _stats(
+    buffer: ScalarSmoother, total: float, count: int, loop_total: float
+) -> Dict[str, float]:
+    return {
+        "mean": float(buffer.mean),
+        "max": float(buffer.max),
+        "total": total,
+        "count": count,
+        "share": total / loop_total,
+    }
@@ -0,0 +1,209 @@
+import bisect
+import math
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+__all__ = ["Moments", "KLLSketch"]
+
+
+class Moments:
+    """
+    Streaming count, mean, variance, max and min by Welford's algorithm.
+
+    The moments of disjoint streams can be merged exactly, see `merge`.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = -math.inf
+        self.min = math.inf
+
+    def update(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x > self.max:
+            self.max = x
+        if x < self.min:
+            self.min = x
+
+    def update_many(self, values: np.ndarray):
+        """Updates the moments with a batch of values."""
+        if len(values) == 0:
+            return
+        batch = Moments()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.max = float(values.max())
+        batch.min = float(values.min())
+        self.merge(batch)
+
+    def merge(self, other: "Moments"):
+        """Merges the moments of another stream in place."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.max = max(self.max, other.max)
+        self.min = min(self.min, other.min)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count > 0 else 0.0
+
+    def state_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "max": self.max,
+            "min": self.min,
+        }
+
+    def load_state_dict(self, state_dict: Dict[str, float]):
+        for k, v in state_dict.items():
+            setattr(self, k, v)
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch.
+
+    The sketch keeps a hierarchy of compactors, where an item at level `h`
+    stands for `2 ** h` items of the stream. When a level is full, it is
+    sorted and every other item is promoted to the next level. The memory is
+    O(k) and the rank error is about `3.3 / k` with high probability,
+    independent of the length of the stream.
+
+    Parameters
+    ----------
+    k : int, optional
+        Capacity of the top compactor, by default 200
+    seed : Optional[int], optional
+        Seed of the random compaction offsets, by default 0
+    """
+
+    _DECAY = 2 / 3
+
+    def __init__(self, k: int = 200, seed: Optional[int] = 0):
+        k = int(k)
+        assert k >= 8, f"k should be >= 8 but got {k}"
+        self.k = k
+        self.count = 0
+        self._rng = random.Random(seed)
+        self._compactors: List[List[float]] = [[]]
+        self._size = 0
+        self._max_size = self._total_capacity()
+        self._sorted: Optional[Tuple[List[float], List[int]]] = None
+
+    @classmethod
+    def from_rank_error(cls, rank_error: float, **kwargs: Any) -> "KLLSketch":
+        """Builds a sketch of normalized rank error about `rank_error`."""
+        assert 0 < rank_error < 1, "Value `rank_error` should be in (0, 1)."
+        return cls(k=max(8, math.ceil(3.3 / rank_error)), **kwargs)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._compactors) - level - 1
+        return max(2, math.ceil(self.k * self._DECAY**depth))
+
+    def update(self, x: float):
+        self._compactors[0].append(x)
+        self._size += 1
+        self.count += 1
+        self._sorted = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values: List[float]):
+        self._compactors[0].extend(values)
+        self._size += len(values)
+        self.count += len(values)
+        self._sorted = None
+        while self._size >= self._max_size:
+            self._compress()
+
+    def _total_capacity(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self._compactors)))
+
+    def _add_level(self):
+        self._compactors.append([])
+        self._max_size = self._total_capacity()
+
+    def _compress(self):
+        for level in range(len(self._compactors)):
+            items = self._compactors[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self._compactors):
+                self._add_level()
+
+            # the odd item, if any, stays on its level
+            items.sort()
+            kept = [items.pop()] if len(items) % 2 == 1 else []
+            offset = self._rng.randint(0, 1)
+            self._compactors[level + 1].extend(items[offset::2])
+            self._compactors[level] = kept
+
+            self._size = sum(len(c) for c in self._compactors)
+            if self._size < self._max_size:
+                break
+
+    def merge(self, other: "KLLSketch"):
+        """Merges the sketch of another stream in place."""
+        while len(self._compactors) < len(other._compactors):
+            self._add_level()
+        for level, items in enumerate(other._compactors):
+            self._compactors[level].extend(items)
+        self.count += other.count
+        self._size = sum(len(c) for c in self._compactors)
+        self._sorted = None
+        while self._size >= self._max_size:
+            self._compress()
+
+    def _cumulative(self) -> Tuple[List[float], List[int]]:
+        if self._sorted is None:
+            weighted = sorted(
+                (x, 2**level)
+                for level, items in enumerate(self._compactors)
+                for x in items
+            )
+            values, cumulative, total = [], [], 0
+            for x, weight in weighted:
+                total += weight
+                values.append(x)
+                cumulative.append(total)
+            self._sorted = (values, cumulative)
+        return self._sorted
+
+    def quantile(self, q: float) -> float:
+        """Returns the approximate `q`-quantile, `q` in [0, 1]."""
+        assert 0 <= q <= 1, f"Quantile should be in [0, 1] but got {q}"
+        values, cumulative = self._cumulative()
+        if not values:
+            return 0.0
+        index = bisect.bisect_left(cumulative, q * cumulative[-1])
+        return values[min(index, len(values) - 1)]
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            "k": self.k,
+            "count": self.count,
+            "compactors": [list(c) for c in self._compactors],
+        }
+
+    def load_state_dict(self, state_dict: Dict[str, Any]):
+        self.k = state_dict["k"]
+        self.count = state_dict["count"]
+        self._compactors = [list(c) for c in state_dict["compactors"]]
+        self._size = sum(len(c) for c in self._compactors)
+        self._max_size = self._total_capacity()
+        self._sorted = None
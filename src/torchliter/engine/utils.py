@@ -1,10 +1,38 @@
 import inspect
+import itertools
+import queue
+import threading
+import warnings
 from functools import wraps
-from typing import Any, Callable, Generator, List, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, IterableDataset, Sampler
 
 from ..utils import _convert_str_to_py_object_name as _py_name
+from .buffers import BufferBank
 
-__all__ = ["to_buffer", "_find_output_names"]
+__all__ = [
+    "to_buffer",
+    "_find_output_names",
+    "BatchPrefetcher",
+    "SkipSampler",
+    "get_sampler_rng_state",
+    "set_sampler_rng_state",
+    "skip_batches",
+    "infer_batch_size",
+]
 
 
 def to_buffer(buffer_registry_name="buffer_registry") -> Callable:
@@ -22,6 +50,20 @@ def to_buffer(buffer_registry_name="buffer_registry") -> Callable:
         yield 'var2', var2
     ```
     where `var1` and `var2` are buffer names in `some-buffer-registry`.
+    The values can be 0-d tensors, e.g. `loss.detach()` instead of
+    `loss.item()`, the buffers defer the device sync. 1-D arrays and tensors,
+    e.g. per-sample losses, are pushed as batches to `update_many` of the
+    buffers that are `batched`.
+
+    Names that are not in the registry are pushed to the `BufferBank`s in the
+    registry that contain them, with one update per bank per call.
+
+    If the owner is accumulating gradients over micro-batches
+    (`accumulation_steps > 1`), the values are staged and the buffers are
+    updated once per optimizer step as set by the `accumulation` of each
+    buffer: with the mean (default) or the sum of the staged values, with
+    every staged value (e.g. containers), or with one batch of the flattened
+    staged values (e.g. histograms). Batches of values are never averaged.
 
 
     Parameters
@@ -42,16 +84,101 @@ def to_buffer(buffer_registry_name="buffer_registry") -> Callable:
         @wraps(func)
         def wrapper(self, *args, **kwargs):
             buffer_dict = getattr(self, buffer_registry_name)
-            for key, val in func(self, *args, **kwargs):
-                key = _py_name(key)
-                if key in buffer_dict:
-                    buffer_dict[key](val)  # pushing update by `__call__`
+            banks = _bank_lookup(self, buffer_dict)
+            outputs = ((_py_name(k), v) for k, v in func(self, *args, **kwargs))
+            if getattr(self, "accumulation_steps", 1) > 1:
+                _stage_accumulation(self, buffer_dict, banks, outputs)
+                return
+            _push_to_buffers(buffer_dict, banks, outputs)
 
         return wrapper
 
     return decorator
 
 
+def _is_batch(val: Any) -> bool:
+    return isinstance(val, (np.ndarray, torch.Tensor)) and val.ndim == 1
+
+
+def _bank_lookup(owner: Any, buffer_dict: Dict[str, Any]) -> Dict[str, BufferBank]:
+    """Maps the metric names to the `BufferBank`s of the registry."""
+    # cached on engines until a component is registered or deregistered
+    version = getattr(owner, "_registry_version", None)
+    cached = getattr(owner, "_bank_lookup_cache", None)
+    if version is not None and cached is not None:
+        cached_dict, cached_version, lookup = cached
+        if cached_dict is buffer_dict and cached_version == version:
+            return lookup
+
+    lookup = {}
+    for buffer in buffer_dict.values():
+        if isinstance(buffer, BufferBank):
+            for name in buffer.names:
+                lookup.setdefault(name, buffer)
+    if version is not None:
+        owner._bank_lookup_cache = (buffer_dict, version, lookup)
+    return lookup
+
+
+def _push_to_buffers(
+    buffer_dict: Dict[str, Any],
+    banks: Dict[str, BufferBank],
+    outputs: Iterable[Tuple[str, Any]],
+) -> None:
+    # the values of `BufferBank`s are collected and updated at once
+    banked = {}
+    for key, val in outputs:
+        if key in buffer_dict:
+            buffer = buffer_dict[key]
+            if getattr(buffer, "batched", False) and _is_batch(val):
+                buffer.update_many(val)
+            else:
+                buffer(val)  # pushing update by `__call__`
+            continue
+        bank = banks.get(key)
+        if bank is not None:
+            banked.setdefault(bank, {})[key] = val
+    for bank, values in banked.items():
+        bank(values)
+
+
+def _stage_accumulation(
+    engine: Any,
+    buffer_dict: Dict[str, Any],
+    banks: Dict[str, BufferBank],
+    outputs: Iterable[Tuple[str, Any]],
+) -> None:
+    # stage the micro-batch outputs and flush them at the accumulation boundary
+    staging = engine._accumulation_staging
+    for key, val in outputs:
+        if key in buffer_dict or key in banks:
+            staging.setdefault(key, []).append(val)
+
+    if not engine.is_accumulation_boundary:
+        return
+
+    flushed = []
+    for key, values in staging.items():
+        policy = getattr(buffer_dict.get(key), "accumulation", "mean")
+        if policy == "concat":
+            flushed.append((key, _concat(values)))
+        elif policy == "each" or any(_is_batch(val) for val in values):
+            flushed.extend((key, val) for val in values)
+        elif policy == "sum":
+            flushed.append((key, sum(values[1:], values[0])))
+        else:
+            flushed.append((key, sum(values[1:], values[0]) / len(values)))
+    staging.clear()
+    _push_to_buffers(buffer_dict, banks, flushed)
+
+
+def _concat(values: List[Any]) -> Any:
+    # micro-batches may differ in shape, e.g. the last batch of an epoch
+    if all(isinstance(val, torch.Tensor) for val in values):
+        return torch.cat([val.reshape(-1) for val in values])
+    return np.concatenate([np.asarray(val).reshape(-1) for val in values])
+
+
 def _find_output_names(func: Generator[Tuple[str, Any], None, None]) -> List[str]:
     """
     Returns the variable names yielded from the generator.
@@ -81,3 +208,210 @@ def _find_output_names(func: Generator[Tuple[str, Any], None, None]) -> List[str
             names.append(line.rsplit(",", 1)[0].strip()[1:-1])
             # use rsplit because var names can be e.g. "a,b,c"
     return names
+
+
+class BatchPrefetcher:
+    """
+    Iterates a dataloader on a background thread.
+
+    Batches are pulled into a bounded queue of size `depth` so that the
+    collation of the next batches overlaps with the current step. If
+    `transfer` is given, it is applied to every batch on the producer thread
+    as well, e.g. host-side preprocessing or `to(device, non_blocking=True)`.
+
+    Exceptions raised by the dataloader or by `transfer` are re-raised on the
+    consumer side. The producer is shut down by `close`, which is also called
+    when the iteration is exhausted or abandoned.
+
+    Parameters
+    ----------
+    iterable : Iterable
+        Usually a `torch.utils.data.DataLoader`
+    depth : int, optional
+        Maximum number of batches waiting in the queue, by default 2
+    transfer : Optional[Callable[[Any], Any]], optional
+        Transform applied to each batch on the producer thread, by default None
+    """
+
+    _BATCH = 0
+    _DONE = 1
+    _ERROR = 2
+
+    def __init__(
+        self,
+        iterable: Iterable,
+        depth: int = 2,
+        transfer: Optional[Callable[[Any], Any]] = None,
+    ):
+        depth = int(depth)
+        assert depth > 0, f"depth should be positive but got {depth}"
+        self.iterable = iterable
+        self.depth = depth
+        self.transfer = transfer
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _put(self, item: Tuple[int, Any]) -> bool:
+        # wake up regularly so that `close` never waits on a full queue
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            for batch in self.iterable:
+                if self._stop.is_set():
+                    return
+                if self.transfer is not None:
+                    batch = self.transfer(batch)
+                if not self._put((self._BATCH, batch)):
+                    return
+        except BaseException as e:
+            self._put((self._ERROR, e))
+            return
+        self._put((self._DONE, None))
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._thread is not None:
+            raise RuntimeError("`BatchPrefetcher` can only be iterated once.")
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                kind, item = self._queue.get()
+                if kind == self._DONE:
+                    return
+                if kind == self._ERROR:
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stops the producer thread and drops the queued batches."""
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __len__(self) -> int:
+        return len(self.iterable)
+
+
+class SkipSampler(Sampler):
+    """
+    Sampler that skips the first `skip` items of another sampler.
+
+    Only the indices are skipped, the corresponding samples are never loaded.
+    The wrapped sampler is iterated lazily, such that its random state is
+    drawn at the same time as the wrapped sampler would.
+    """
+
+    def __init__(self, sampler: Iterable, skip: int):
+        self.sampler = sampler
+        self.skip = max(0, int(skip))
+
+    def __iter__(self) -> Iterator[Any]:
+        iterator = iter(self.sampler)
+        for _ in itertools.islice(iterator, self.skip):
+            pass
+        yield from iterator
+
+    def __len__(self) -> int:
+        return max(0, len(self.sampler) - self.skip)
+
+
+def get_sampler_rng_state(dataloader: DataLoader) -> torch.Tensor:
+    """Returns the state of the random generator used by the dataloader sampler."""
+    generator = getattr(dataloader, "generator", None)
+    if generator is not None:
+        return generator.get_state()
+    return torch.get_rng_state()
+
+
+def set_sampler_rng_state(dataloader: DataLoader, state: torch.Tensor) -> None:
+    """Restores the random generator used by the dataloader sampler."""
+    generator = getattr(dataloader, "generator", None)
+    if generator is not None:
+        generator.set_state(state)
+    else:
+        torch.set_rng_state(state)
+
+
+def skip_batches(dataloader: DataLoader, num_batches: int) -> Iterable:
+    """
+    Returns a dataloader that skips the first `num_batches` batches.
+
+    For map-style datasets, the dataloader is rebuilt around a `SkipSampler`
+    of its batch sampler, such that the skipped batches are neither loaded nor
+    collated. Iterable datasets can only be fast-forwarded by consuming the
+    skipped batches.
+
+    Parameters
+    ----------
+    dataloader : DataLoader
+        Dataloader
+    num_batches : int
+        Number of batches to skip
+
+    Returns
+    -------
+    Iterable
+        Batches after the skipped ones
+    """
+    if num_batches <= 0:
+        return dataloader
+
+    if isinstance(dataloader.dataset, IterableDataset):
+        warnings.warn(
+            "Batches of an IterableDataset are loaded to be skipped when resuming."
+        )
+        return itertools.islice(dataloader, num_batches, None)
+
+    kwargs = dict(
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        pin_memory=dataloader.pin_memory,
+        timeout=dataloader.timeout,
+        worker_init_fn=dataloader.worker_init_fn,
+    )
+    if getattr(dataloader, "generator", None) is not None:
+        kwargs["generator"] = dataloader.generator
+    if dataloader.num_workers > 0:
+        for option in ("prefetch_factor", "persistent_workers"):
+            if hasattr(dataloader, option):
+                kwargs[option] = getattr(dataloader, option)
+
+    if dataloader.batch_sampler is not None:
+        kwargs["batch_sampler"] = SkipSampler(dataloader.batch_sampler, num_batches)
+    else:
+        kwargs["sampler"] = SkipSampler(dataloader.sampler, num_batches)
+        kwargs["batch_size"] = None
+    return DataLoader(dataloader.dataset, **kwargs)
+
+
+def infer_batch_size(batch: Any) -> Optional[int]:
+    """
+    Returns the batch size from the leading dimension of the first tensor
+    or array found in `batch`, which can be nested in tuples, lists and
+    dicts. Returns None if no tensor or array is found.
+    """
+    if isinstance(batch, (torch.Tensor, np.ndarray)):
+        return int(batch.shape[0]) if batch.ndim > 0 else 1
+    if isinstance(batch, dict):
+        batch = list(batch.values())
+    if isinstance(batch, (tuple, list)):
+        for item in batch:
+            size = infer_batch_size(item)
+            if size is not None:
+                return size
+    return None
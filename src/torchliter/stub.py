@@ -1,13 +1,22 @@
+import pickle
+import warnings
 from typing import *
 
 from . import REPR_INDENT
-from .utils import _convert_str_to_py_object_name
+from .utils import _attributes, _convert_str_to_py_object_name
 
-__all__ = ["StubBase", "Train", "Evaluate", "Lambda"]
+__all__ = ["StubBase", "Train", "Evaluate", "Lambda", "Repeat", "build_stub"]
 
 
 class StubBase:
-    """Base class for Stubs."""
+    """
+    Base class for Stubs.
+
+    The common attributes are stored in `__slots__`. Other kwargs are stored
+    in the instance `__dict__`, which is only allocated when it is used.
+    """
+
+    __slots__ = ("action", "epoch", "iteration", "__dict__")
 
     def __init__(self, *args, **kwargs):
         assert len(args) == 0, "There should not be any args only kwargs allowed."
@@ -18,13 +27,13 @@ class StubBase:
         # make copies of stubs with same kwargs
         copy = int(copy)
         assert copy > 0
-        kwargs = self.__dict__
+        kwargs = _attributes(self)
         copies = []
         for _ in range(copy):
             copies.append(self.__class__(**kwargs))
         return copies
 
-    def __call__(self, copy: int = 1) -> Optional[List["StubBase"]]:
+    def __call__(self, copy: int = 1, lazy: bool = False) -> Optional[List["StubBase"]]:
         """
         Call method.
 
@@ -32,6 +41,9 @@ class StubBase:
         ----------
         copy : int
             The number of copies of `Stub` (the default is 1).
+        lazy : bool
+            If True, the copies are represented by one `Repeat` stub which
+            makes them when they are executed (the default is False).
 
         Returns
         -------
@@ -41,14 +53,49 @@ class StubBase:
         """
 
         if copy > 0:
+            if lazy:
+                return [Repeat(self, copy)]
             return self.replicate(copy)
         else:
             return None
 
+    @classmethod
+    def from_kwargs(cls, kwargs: Dict[str, Any]) -> "StubBase":
+        """
+        Builds a stub from the kwargs of `StubBase.state_dict`.
+
+        The attributes are restored after the stub is constructed, such that
+        the progress (e.g. `iteration`) of a paused stub is kept.
+        """
+        stub = cls(**kwargs)
+        for k, v in kwargs.items():
+            setattr(stub, k, v)
+        return stub
+
+    def state_dict(self) -> Dict[str, Any]:
+        """
+        Returns the stub type and all its attributes, including the progress
+        of a paused stub.
+
+        Attributes that cannot be pickled, e.g. a lambda `transfer`, are
+        dropped with a warning, such that the state dict can be saved.
+        """
+        kwargs = {}
+        for k, v in _attributes(self).items():
+            # nested stubs are saved by their own state dicts, see `Repeat`
+            if isinstance(v, StubBase) or _picklable(v):
+                kwargs[k] = v
+            else:
+                warnings.warn(
+                    f"Attribute `{k}` of {self.__class__.__name__} stub cannot be"
+                    " pickled and is not saved in its state dict."
+                )
+        return {"type": self.__class__.__name__, "kwargs": kwargs}
+
     def __repr__(self):
         out = []
         out.append(self.__class__.__name__)
-        for k, v in self.__dict__.items():
+        for k, v in _attributes(self).items():
             if k.startswith("_"):
                 continue
             out.append(" " * REPR_INDENT + f"{k}: {v}")
@@ -59,6 +106,8 @@ class StubBase:
 class Train(StubBase):
     """Train stub."""
 
+    __slots__ = ("dataloader",)
+
     def __init__(self, dataloader: str, **kwargs):
 
         assert isinstance(
@@ -70,6 +119,7 @@ class Train(StubBase):
         kwargs["epoch"] = 1
         kwargs["iteration"] = 0
         # additional options can be `optimizer`, `scheduler`
+        # `prefetch` and `transfer` configure the batch pipeline
 
         super().__init__(**kwargs)
 
@@ -77,6 +127,8 @@ class Train(StubBase):
 class Evaluate(StubBase):
     """Evaluation stub."""
 
+    __slots__ = ("dataloader",)
+
     def __init__(self, dataloader: str, **kwargs):
 
         assert isinstance(
@@ -87,6 +139,7 @@ class Evaluate(StubBase):
         kwargs["epoch"] = 1
         kwargs["iteration"] = 0
         # additional options can be metrics and eval specs
+        # `prefetch` and `transfer` configure the batch pipeline
 
         super().__init__(**kwargs)
 
@@ -107,3 +160,104 @@ class Lambda(StubBase):
         # e.g. save checkpoint, send emails, etc.
 
         super().__init__(**kwargs)
+
+
+class Repeat(StubBase):
+    """
+    Lazy range of `times` copies of a stub.
+
+    The engine makes the copies one at a time when they are executed, such
+    that e.g. 1000 identical epochs are queued as one object.
+
+    Parameters
+    ----------
+    stub : StubBase
+        The stub to copy
+    times : int
+        The number of copies
+    """
+
+    __slots__ = ("stub", "times")
+
+    def __init__(self, stub: StubBase, times: int, **kwargs):
+        assert isinstance(
+            stub, StubBase
+        ), f"Stub should be a StubBase but get type {type(stub)}"
+        assert not isinstance(stub, Repeat), "Repeat stubs cannot be nested."
+        times = int(times)
+        assert times >= 0, f"times should be >= 0 but get {times}"
+        kwargs["stub"] = stub
+        kwargs["times"] = times
+        super().__init__(**kwargs)
+
+    def pop(self) -> StubBase:
+        """Returns the next copy of the stub."""
+        assert self.times > 0, "No copy left in Repeat stub."
+        self.times -= 1
+        return self.stub.replicate(1)[0]
+
+    def expand(self) -> List[StubBase]:
+        """Returns the remaining copies of the stub."""
+        return self.stub.replicate(self.times) if self.times > 0 else []
+
+    def __len__(self) -> int:
+        return self.times
+
+    @classmethod
+    def from_kwargs(cls, kwargs: Dict[str, Any]) -> "Repeat":
+        kwargs = dict(kwargs)
+        return cls(build_stub(kwargs.pop("stub")), **kwargs)
+
+    def state_dict(self) -> Dict[str, Any]:
+        out = super().state_dict()
+        out["kwargs"]["stub"] = self.stub.state_dict()
+        return out
+
+    def __repr__(self):
+        out = []
+        out.append(self.__class__.__name__)
+        out.append(" " * REPR_INDENT + f"times: {self.times}")
+        for line in repr(self.stub).split("\n"):
+            out.append(" " * REPR_INDENT + line)
+        return "\n".join(out)
+
+
+def _picklable(value: Any) -> bool:
+    if isinstance(value, (int, float, str, bool, type(None))):
+        return True
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return False
+    return True
+
+
+def _find_stub_class(name: str) -> Type[StubBase]:
+    candidates = [StubBase]
+    while candidates:
+        cls = candidates.pop()
+        if cls.__name__ == name:
+            return cls
+        candidates.extend(cls.__subclasses__())
+    raise ValueError(f"Stub type `{name}` is not found.")
+
+
+def build_stub(state_dict: Dict[str, Any]) -> StubBase:
+    """
+    Builds a stub from `StubBase.state_dict`.
+
+    The attributes are restored after the stub is constructed, such that the
+    progress (e.g. `iteration`) of a paused stub is kept.
+
+    Parameters
+    ----------
+    state_dict : Dict[str, Any]
+        State dict of a stub
+
+    Returns
+    -------
+    StubBase
+        The stub
+    """
+    cls = _find_stub_class(state_dict["type"])
+    return cls.from_kwargs(dict(state_dict["kwargs"]))
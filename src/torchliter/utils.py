@@ -1,6 +1,7 @@
 import copy
+import functools
 import importlib
-from typing import Dict
+from typing import Any, Dict, Tuple
 
 __all__ = [
     "get_object_from_module",
@@ -125,3 +126,29 @@ def _convert_str_to_py_object_name(name: str) -> str:
         else:
             line.append("_")
     return "".join(line)
+
+
+@functools.lru_cache(maxsize=None)
+def _slot_names(cls: type) -> Tuple[str, ...]:
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        names.extend(n for n in slots if n not in ("__dict__", "__weakref__"))
+    return tuple(names)
+
+
+def _attributes(obj: Any) -> Dict[str, Any]:
+    """
+    Returns the attributes of `obj` set in its `__slots__` and its `__dict__`.
+    """
+    out = {}
+    for name in _slot_names(type(obj)):
+        try:
+            out[name] = getattr(obj, name)
+        except AttributeError:
+            # the slot is not set
+            continue
+    out.update(getattr(obj, "__dict__", {}))
+    return out
@@ -1,9 +1,19 @@
+import collections
+import copy
 import csv
+import glob
 import os
+import queue
+import tempfile
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+import torch
 
 from . import REPR_INDENT
 
-__all__ = ["CSVWriter"]
+__all__ = ["CSVWriter", "CheckpointWriter"]
 
 
 class CSVWriter:
@@ -63,3 +73,220 @@ class CSVWriter:
         out.append(" " * REPR_INDENT + f"filepath: {self.path}")
         out.append(" " * REPR_INDENT + f"columns: {self.columns}")
         return "\n".join(out)
+
+
+class CheckpointWriter:
+    """
+    Asynchronous checkpoint writer with rotation.
+
+    `save` takes a CPU snapshot of the engine state dict on the calling thread
+    and returns. The snapshot is serialized by `torch.save` on a background
+    thread into a temporary file, which is fsynced and atomically renamed to
+    `<prefix>-<tag>.pt`. At most `max_pending` snapshots are in flight, `save`
+    blocks until a previous one is written otherwise.
+
+    Rotation keeps the `keep_last` most recent checkpoints and, if
+    `keep_every` is set, every checkpoint whose epoch is a multiple of
+    `keep_every` in addition. The writer is callable, e.g.
+    `PostEpochHandler(CheckpointWriter("checkpoints"))`, and the pending
+    checkpoints are written when the engine finishes, or at interpreter exit
+    if the writer is not closed. Temporary files left by an interrupted
+    writer with the same prefix are removed when the writer is built.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the checkpoints
+    prefix : str, optional
+        File name prefix, by default "checkpoint"
+    keep_last : Optional[int], optional
+        Number of recent checkpoints to keep, None keeps all, by default 3
+    keep_every : Optional[int], optional
+        Keep checkpoints of every `keep_every` epochs, by default None
+    max_pending : int, optional
+        Maximum number of snapshots in flight, by default 1
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "checkpoint",
+        keep_last: Optional[int] = 3,
+        keep_every: Optional[int] = None,
+        max_pending: int = 1,
+    ):
+        assert keep_last is None or keep_last > 0, "keep_last should be positive."
+        assert keep_every is None or keep_every > 0, "keep_every should be positive."
+        assert max_pending > 0, "max_pending should be positive."
+        os.makedirs(directory, exist_ok=True)
+        for stale in glob.glob(os.path.join(directory, f".tmp-{prefix}-*.pt")):
+            os.remove(stale)
+        self.directory = directory
+        self.prefix = prefix
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self.max_pending = max_pending
+
+        self.saved: List[str] = []
+        self.kept: List[str] = []
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+        # daemon threads are killed at exit, the pending checkpoints are
+        # written first
+        self._finalizer = weakref.finalize(
+            self, _stop_worker, self._queue, self._thread
+        )
+
+    def save(self, engine: Any, tag: Optional[str] = None) -> Optional[str]:
+        """
+        Snapshots and writes the state of an engine in the background.
+
+        Parameters
+        ----------
+        engine : Any
+            An engine or its state dict. Engines with `is_rank_zero` False,
+            e.g. non-zero ranks of `DistributedAutoEngine`, are skipped.
+        tag : Optional[str], optional
+            Checkpoint tag, by default `epoch<epoch>-iter<iteration>`
+
+        Returns
+        -------
+        Optional[str]
+            Path of the checkpoint being written, None if skipped
+        """
+        self._raise_error()
+        if not getattr(engine, "is_rank_zero", True):
+            return None
+        state_dict = engine if isinstance(engine, dict) else engine.state_dict()
+        epoch = int(state_dict.get("engine", {}).get("epoch", 0))
+        iteration = int(state_dict.get("engine", {}).get("iteration", 0))
+        if tag is None:
+            tag = f"epoch{epoch:04d}-iter{iteration:06d}"
+        path = os.path.join(self.directory, f"{self.prefix}-{tag}.pt")
+
+        self._slots.acquire()  # backpressure
+        try:
+            snapshot = snapshot_to_cpu(state_dict)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._queue.put((path, epoch, snapshot))
+        return path
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, epoch, snapshot = item
+                try:
+                    atomic_save(snapshot, path)
+                    self._rotate(path, epoch)
+                except BaseException as e:
+                    self._error = e
+                finally:
+                    self._slots.release()
+            finally:
+                self._queue.task_done()
+
+    def _rotate(self, path: str, epoch: int) -> None:
+        if path in self.saved:
+            self.saved.remove(path)
+        if path in self.kept:
+            self.kept.remove(path)
+        if self.keep_every is not None and epoch % self.keep_every == 0:
+            self.kept.append(path)
+        else:
+            self.saved.append(path)
+        if self.keep_last is None:
+            return
+        while len(self.saved) > self.keep_last:
+            expired = self.saved.pop(0)
+            if os.path.exists(expired):
+                os.remove(expired)
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint failed.") from error
+
+    def wait(self) -> None:
+        """Blocks until the pending checkpoints are written."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Writes the pending checkpoints and stops the background thread."""
+        self._finalizer()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __call__(self, engine: Any) -> Optional[str]:
+        return self.save(engine)
+
+    def __repr__(self):
+        out = []
+        out.append(self.__class__.__name__)
+        out.append(" " * REPR_INDENT + f"directory: {self.directory}")
+        out.append(" " * REPR_INDENT + f"keep_last: {self.keep_last}")
+        out.append(" " * REPR_INDENT + f"keep_every: {self.keep_every}")
+        return "\n".join(out)
+
+
+def _stop_worker(jobs: queue.Queue, thread: threading.Thread) -> None:
+    if thread.is_alive():
+        jobs.put(None)
+        thread.join()
+
+
+def snapshot_to_cpu(obj: Any) -> Any:
+    """
+    Returns a copy of a (nested) state dict with tensors copied to CPU.
+
+    The copy does not alias the live state, such that it can be serialized
+    while training continues.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return obj.__class__((k, snapshot_to_cpu(v)) for k, v in obj.items())
+    if isinstance(obj, collections.deque):
+        return collections.deque((snapshot_to_cpu(v) for v in obj), maxlen=obj.maxlen)
+    if isinstance(obj, (list, tuple)) and not hasattr(obj, "_fields"):
+        return obj.__class__(snapshot_to_cpu(v) for v in obj)
+    if isinstance(obj, (int, float, str, bool, bytes, type(None))):
+        return obj
+    return copy.deepcopy(obj)
+
+
+def atomic_save(obj: Dict[str, Any], path: str) -> None:
+    """Saves `obj` with `torch.save` to a fsynced temporary file renamed to
+    `path`, such that `path` is either absent, the previous or the new file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    name = os.path.splitext(os.path.basename(path))[0]
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".tmp-{name}-", suffix=".pt")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
@@ -1,5 +1,11 @@
 import inspect
+import os
 import pickle
+import random
+
+import numpy as np
+import pytest
+import torch
 
 import torchliter
 
@@ -44,6 +50,28 @@ def test_scaler_buffer():
     assert new_scaler.mean == 2.0
 
 
+def test_scalar_smoother_streaming_statistics():
+    scaler = torchliter.engine.buffers.ScalarSmoother(50)
+    values = []
+    for idx in range(500):
+        # a level shift tests the precision of the rolling sums
+        x = random.gauss(1e6 if idx < 250 else 0.0, 1.0)
+        values.append(x)
+        scaler(torch.tensor(x, dtype=torch.float64) if idx % 7 == 0 else x)
+
+        window = np.array(values[-50:])
+        summary = scaler.summary()
+        assert summary["mean"] == pytest.approx(window.mean())
+        assert summary["std"] == pytest.approx(window.std(), rel=1e-6)
+        assert summary["median"] == np.median(window)
+        assert summary["max"] == window.max()
+        assert summary["min"] == window.min()
+
+    other = torchliter.engine.buffers.ScalarSmoother(50)
+    other.load_state_dict(scaler.state_dict())
+    assert other.summary() == pytest.approx(scaler.summary())
+
+
 def test_scalar_summary_statistics():
     b = torchliter.engine.buffers.ScalarSummaryStatistics()
     b(1.0)
@@ -83,6 +111,40 @@ def test_exponential_moving_average_buffer():
     assert new_scaler.mean == scaler.mean
 
 
+def test_deferred_tensor_sync():
+    scaler = torchliter.engine.buffers.ScalarSmoother(3, sync_every=2)
+    scaler(torch.tensor(0.0))
+    assert len(scaler._staged) == 1
+    scaler(torch.tensor(1.0, requires_grad=True) * 1)
+    assert len(scaler._staged) == 0
+    assert list(scaler._queue) == [0.0, 1.0]
+    scaler(torch.tensor(2.0))
+    assert len(scaler._staged) == 1
+    assert scaler.mean == 1.0
+    assert len(scaler._staged) == 0
+    scaler(torch.tensor(3.0))
+    scaler(4.0)
+    assert list(scaler._queue) == [2.0, 3.0, 4.0]
+    assert scaler.state_dict()["count"] == 5
+
+    b = torchliter.engine.buffers.ScalarSummaryStatistics()
+    for i in range(5):
+        b(torch.tensor(float(i)))
+    assert len(b) == 5
+    assert b.median == 2.0
+
+    ema = torchliter.engine.buffers.ExponentialMovingAverage(0.5)
+    ema(torch.tensor(1.0, requires_grad=True) * 1)
+    ema(torch.tensor(3.0))
+    assert isinstance(ema.mean, float)
+    assert ema.mean == 2.0
+    assert not ema.state_dict()["mean"].requires_grad
+
+    ema = torchliter.engine.buffers.ExponentialMovingAverage(0.5)
+    ema(torch.ones(3))
+    assert isinstance(ema.mean, torch.Tensor)
+
+
 class SimpleClass:
     def __init__(self):
         self.buffer = {
@@ -110,3 +172,434 @@ def test_decorator():
 
     for idx in range(3):
         assert sc.buffer[f"arg{idx}"].mean == idx
+
+
+def test_buffer_bank():
+    bank = torchliter.engine.buffers.BufferBank(["loss", "acc"], alpha=0.5)
+    assert "loss" in bank and len(bank) == 2
+    assert bank["loss"].mean is None
+    bank({"loss": 1.0, "acc": torch.tensor(0.5)})
+    bank([3.0, 1.0])
+    assert bank["loss"].mean == 2.0
+    assert bank["acc"].mean == 0.75
+    assert bank["loss"].count == 2
+    bank({"acc": 1.0})
+    assert bank["loss"].count == 2 and bank["acc"].count == 3
+
+    state = bank.state_dict()
+    restored = torchliter.engine.buffers.BufferBank(["loss", "acc"], alpha=0.5)
+    restored.load_state_dict(state)
+    assert restored.summary() == bank.summary()
+    pickle.loads(pickle.dumps(bank))
+
+    bank = torchliter.engine.buffers.BufferBank(["x"], mode="window", window_size=3)
+    for val in range(5):
+        bank({"x": val})
+    assert bank["x"].max == 4.0 and bank["x"].min == 2.0
+    assert bank["x"].median == 3.0
+    bank.reset()
+    assert bank["x"].count == 0
+
+    class BankClass:
+        def __init__(self):
+            self.buffer = {"bank": torchliter.engine.buffers.BufferBank(["a", "b"])}
+
+        @torchliter.engine.utils.to_buffer("buffer")
+        def generator(self):
+            yield "a", 1.0
+            yield "b", 2.0
+            yield "c", 3.0
+
+    bc = BankClass()
+    bc.generator()
+    assert bc.buffer["bank"]["a"].mean == 1.0
+    assert bc.buffer["bank"]["b"].mean == 2.0
+
+    # tensors are staged and synced at once when read
+    bank = torchliter.engine.buffers.BufferBank(["x", "y"], alpha=0.5, sync_every=3)
+    bank({"x": torch.tensor(1.0)})
+    bank({"x": torch.tensor(3.0), "y": 1.0})
+    assert len(bank._staged) == 2
+    assert bank["x"].mean == 2.0 and bank["y"].mean == 1.0
+    assert not bank._staged
+    for _ in range(3):
+        bank([torch.tensor(2.0), torch.tensor(1.0)])
+    assert not bank._staged and bank["x"].count == 5
+
+    # the banks of an engine are looked up until the registry changes
+    class BankEngine(torchliter.engine.EngineBase):
+        @torchliter.engine.utils.to_buffer()
+        def generator(self):
+            yield "a", torch.tensor(1.0)
+
+    engine = BankEngine()
+    engine.first = torchliter.engine.buffers.BufferBank(["b"])
+    engine.generator()
+    engine.second = torchliter.engine.buffers.BufferBank(["a"])
+    engine.generator()
+    assert engine.second["a"].mean == 1.0
+
+
+def test_sketched_summary_statistics():
+    b = torchliter.engine.buffers.ScalarSummaryStatistics(rank_error=0.01)
+    values = [random.random() for _ in range(100000)]
+    for x in values:
+        b(x)
+    b(torch.tensor(0.5))
+    values.append(0.5)
+
+    assert len(b) == len(values)
+    assert b.mean == pytest.approx(np.mean(values))
+    assert b.std == pytest.approx(np.std(values))
+    assert b.max == max(values) and b.min == min(values)
+    assert abs(b.median - 0.5) < 0.02
+    assert abs(b.quantile(0.9) - 0.9) < 0.02
+
+    state = b.state_dict()
+    assert len(pickle.dumps(state)) < 100000
+
+    other = torchliter.engine.buffers.ScalarSummaryStatistics(rank_error=0.01)
+    other.load_state_dict(state)
+    assert other.summary() == b.summary()
+
+
+def test_ring_buffer_backing_store():
+    ring = torchliter.engine.buffers._RingBuffer(4)
+    ring.extend([0.0, 1.0, 2.0])
+    ring.append(3.0)
+    ring.extend([4.0, 5.0])
+    assert list(ring) == [2.0, 3.0, 4.0, 5.0]
+    assert ring[0] == 2.0 and ring[-1] == 5.0
+    assert sorted(ring.view().tolist()) == [2.0, 3.0, 4.0, 5.0]
+    ring.extend(range(10))
+    assert list(ring) == [6.0, 7.0, 8.0, 9.0]
+
+    ring = torchliter.engine.buffers._RingBuffer(None, capacity=2)
+    ring.extend(range(5))
+    ring.append(5)
+    assert list(ring) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+    b = torchliter.engine.buffers.ScalarSummaryStatistics()
+    for i in range(100):
+        b(float(i))
+    state = b.state_dict()
+    assert isinstance(state["queue"], np.ndarray)
+    assert state["queue"].dtype == np.float64 and len(state["queue"]) == 100
+    b(100.0)
+    assert len(state["queue"]) == 100, "state should not alias the buffer"
+    assert b.quantile(0.5) == 50.0
+
+
+def test_in_place_tensor_ema():
+    ema = torchliter.engine.buffers.ExponentialMovingAverage(0.5)
+    x = torch.ones(3)
+    ema(x)
+    mean = ema._mean
+    assert mean is not x
+    ema(torch.full((3,), 3.0))
+    assert ema._mean is mean, "tensor statistics should be updated in place"
+    assert torch.equal(ema.mean, torch.full((3,), 2.0))
+    assert torch.equal(ema.variance, torch.full((3,), 1.0))
+    assert torch.equal(x, torch.ones(3))
+
+    state = ema.state_dict()
+    ema(torch.zeros(3))
+    assert torch.equal(state["mean"], torch.full((3,), 2.0))
+
+
+def test_model_ema():
+    model = torch.nn.Sequential(torch.nn.Linear(2, 2), torch.nn.BatchNorm1d(2))
+    ema = torchliter.engine.buffers.ModelEMA(model, decay=0.5, every=2)
+    weight = model[0].weight
+    initial = weight.detach().clone()
+
+    with torch.no_grad():
+        weight.add_(2.0)
+    ema.update()
+    assert ema._count == 0
+    ema.update()
+    with torch.no_grad():
+        weight.add_(2.0)
+    ema.update()
+    ema.update()
+    assert ema._count == 2
+
+    with ema.swap() as swapped:
+        assert swapped is model
+        assert model[0].weight is weight
+        assert torch.allclose(weight, initial + 3.0)
+    assert torch.allclose(weight, initial + 4.0)
+
+    state = ema.state_dict()
+    other = torchliter.engine.buffers.ModelEMA(model)
+    other.load_state_dict(state)
+    with other.swap():
+        assert torch.allclose(weight, initial + 3.0)
+
+    swa = torchliter.engine.buffers.ModelEMA(model, average="swa")
+    for _ in range(3):
+        with torch.no_grad():
+            weight.add_(1.0)
+        swa()
+    with swa.swap():
+        assert torch.allclose(weight, initial + 6.0)
+
+
+def test_update_many():
+    values = np.random.randn(1000) + 5.0
+
+    for batch in (values, torch.tensor(values)):
+        ema = torchliter.engine.buffers.ExponentialMovingAverage(0.01, batched=True)
+        reference = torchliter.engine.buffers.ExponentialMovingAverage(0.01)
+        reference(1.0)
+        ema(1.0)
+        for x in values:
+            reference(float(x))
+        ema.update_many(batch[:600])
+        ema.update_many(batch[600:])
+        assert ema._count == reference._count
+        assert float(ema.mean) == pytest.approx(reference.mean)
+        assert float(ema.variance) == pytest.approx(reference.variance)
+
+    ema = torchliter.engine.buffers.ExponentialMovingAverage(1.0)
+    ema.update_many([1.0, 2.0, 4.0])
+    assert ema.mean == 4.0 and ema.variance == 0.0
+
+    for build in (
+        lambda: torchliter.engine.buffers.ScalarSmoother(100),
+        torchliter.engine.buffers.ScalarSummaryStatistics,
+        lambda: torchliter.engine.buffers.ScalarSummaryStatistics(rank_error=0.01),
+    ):
+        b = build()
+        b.update_many(torch.tensor(values[:10]))
+        b.update_many(values[10:500])
+        b.update_many(values[500:])
+        assert b._count == len(values)
+        window = values[-(b.maxlen or len(values)) :]
+        assert b.mean == pytest.approx(window.mean())
+        assert b.max == window.max()
+
+    container = torchliter.engine.buffers.SequenceContainer()
+    container.update_many(torch.arange(3))
+    container.update(torch.arange(3, 5))
+    assert all(isinstance(v, torch.Tensor) for v in container.values)
+    assert torch.equal(torch.stack(container.values), torch.arange(5))
+
+    class BatchClass:
+        def __init__(self):
+            self.buffer = {
+                "loss": torchliter.engine.buffers.ScalarSummaryStatistics(),
+                "vector": torchliter.engine.buffers.ExponentialMovingAverage(),
+            }
+
+        @torchliter.engine.utils.to_buffer("buffer")
+        def generator(self):
+            yield "loss", torch.arange(4.0)
+            yield "vector", torch.arange(4.0)
+
+    bc = BatchClass()
+    bc.generator()
+    assert len(bc.buffer["loss"]) == 4
+    assert bc.buffer["vector"].mean.shape == (4,)
+
+
+def test_array_container(tmp_path):
+    container = torchliter.engine.buffers.ArrayContainer(
+        capacity=2, max_memory=256, spill_dir=str(tmp_path)
+    )
+    assert len(container.values) == 0
+
+    embeddings = np.random.rand(20, 4).astype(np.float32)
+    container(torch.from_numpy(embeddings[:3]))
+    assert not container.spilled
+    for i in range(3, 20, 5):
+        container(embeddings[i : i + 5])
+    assert container.spilled
+    assert len(os.listdir(tmp_path)) == 1
+
+    values = container.values
+    assert values.dtype == np.float32 and values.shape == (20, 4)
+    assert np.array_equal(values, embeddings)
+    assert np.shares_memory(container.as_tensor().numpy(), values)
+
+    with pytest.raises(ValueError):
+        container(np.zeros((1, 3)))
+
+    other = torchliter.engine.buffers.ArrayContainer()
+    other.load_state_dict(pickle.loads(pickle.dumps(container.state_dict())))
+    assert np.array_equal(other.values, embeddings)
+
+    del values
+    container.reset()
+    assert len(container) == 0 and len(os.listdir(tmp_path)) == 0
+
+    # wide rows are spilled at the first allocation
+    container = torchliter.engine.buffers.ArrayContainer(
+        max_memory=1 << 20, spill_dir=str(tmp_path)
+    )
+    container(np.ones((2, 1024), dtype=np.float32))
+    assert container.spilled and np.array_equal(container.values, np.ones((2, 1024)))
+    container.reset()
+
+    class PredictionClass:
+        def __init__(self):
+            self.buffer = {"labels": torchliter.engine.buffers.ArrayContainer()}
+
+        @torchliter.engine.utils.to_buffer("buffer")
+        def generator(self, batch):
+            yield "labels", batch
+
+    pc = PredictionClass()
+    pc.generator(torch.arange(3))
+    pc.generator(torch.arange(3, 5))
+    assert pc.buffer["labels"].values.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_buffer_merge_and_reduce():
+    buffers = torchliter.engine.buffers
+    values = np.random.randn(300)
+    shards = np.split(values, 3)
+
+    def sharded(build, push=lambda b, x: b.update_many(x)):
+        parts = []
+        for shard in shards:
+            b = build()
+            push(b, shard)
+            parts.append(b)
+        return parts
+
+    parts = sharded(buffers.ScalarSummaryStatistics)
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    assert merged.summary() == pytest.approx(
+        {
+            "mean": values.mean(),
+            "median": np.median(values),
+            "std": values.std(),
+            "max": values.max(),
+            "min": values.min(),
+        }
+    )
+
+    parts = sharded(lambda: buffers.ScalarSummaryStatistics(rank_error=0.01))
+    reduced = buffers.ScalarSummaryStatistics(rank_error=0.01)
+    reduced.load_state_dict(reduced.reduce([p.state_dict() for p in parts]))
+    assert len(reduced) == 300
+    assert reduced.mean == pytest.approx(values.mean())
+    assert reduced.std == pytest.approx(values.std())
+    assert reduced.max == values.max()
+
+    parts = sharded(lambda: buffers.ScalarSmoother(50))
+    assert parts[0].merge(parts[1]).mean == pytest.approx(shards[1][-50:].mean())
+
+    parts = sharded(buffers.SequenceContainer)
+    assert parts[0].merge(parts[1]).values == values[:200].tolist()
+
+    parts = sharded(buffers.ArrayContainer)
+    assert np.array_equal(parts[0].merge(parts[1]).values, values[:200])
+
+    # pooled moments of the moving averages
+    parts = sharded(
+        lambda: buffers.ExponentialMovingAverage(1.0), lambda b, x: b(float(x[0]))
+    )
+    state = parts[0].reduce([p.state_dict() for p in parts])
+    firsts = np.array([shard[0] for shard in shards])
+    assert state["count"] == 3
+    assert state["mean"] == pytest.approx(firsts.mean())
+    assert state["variance"] == pytest.approx(firsts.var())
+
+    banks = []
+    for shard in shards:
+        bank = buffers.BufferBank(["x"], mode="window", window_size=150)
+        for x in shard:
+            bank([x])
+        banks.append(bank)
+    bank = banks[0].merge(banks[1]).merge(banks[2])
+    assert bank["x"].count == 300
+    assert bank["x"].mean == pytest.approx(values[-150:].mean())
+
+
+def test_histogram_buffer():
+    hist = torchliter.engine.buffers.HistogramBuffer(0.0, 1.0, bins=100)
+    values = np.random.rand(10000)
+    hist(torch.tensor(values[:5000]).reshape(50, 100))
+    hist.update_many(values[5000:])
+    hist([-1.0, 2.0, float("nan"), 1.0])
+    assert isinstance(hist._counts, torch.Tensor)
+
+    edges, counts = hist.histogram()
+    assert len(edges) == 101 and counts.sum() == 10001
+    assert hist.underflow == 1 and hist.overflow == 1 and hist.nan == 1
+    assert hist.count == 10003
+    assert abs(hist.median - np.median(values)) < 0.01
+    assert abs(hist.quantile(0.9) - np.quantile(values, 0.9)) < 0.01
+    assert abs(hist.mean - values.mean()) < 0.01
+    assert hist.quantile(0.0) == 0.0 and hist.quantile(1.0) == 1.0
+
+    other = torchliter.engine.buffers.HistogramBuffer(0.0, 1.0, bins=100)
+    other.load_state_dict(pickle.loads(pickle.dumps(hist.state_dict())))
+    other.merge(hist)
+    assert other.count == 2 * hist.count
+
+    log_hist = torchliter.engine.buffers.HistogramBuffer(
+        1e-6, 1.0, bins=6, scale="log", every=2
+    )
+    log_hist(np.array([1e-5, 1e-3, 0.0]))
+    assert log_hist.count == 0
+    log_hist(np.array([1e-5, 1e-3, 0.0]))
+    _, counts = log_hist.histogram()
+    assert counts.tolist() == [1, 0, 0, 1, 0, 0]
+    assert log_hist.underflow == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_throughput_meter():
+    clock = FakeClock()
+    meter = torchliter.engine.buffers.ThroughputMeter(window=2.0, clock=clock)
+    meter.start(total=10)
+    for _ in range(4):
+        clock.now += 0.5
+        meter(32)
+    assert meter.instantaneous == 64.0
+    assert meter.windowed == 64.0
+    assert meter.cumulative == 64.0
+    assert meter.steps_per_sec == 2.0
+    assert meter.eta == 3.0
+
+    # a slow step, the window keeps the last 2 seconds
+    clock.now += 2.0
+    meter(32)
+    assert meter.instantaneous == 16.0
+    assert meter.windowed == 16.0
+    assert meter.cumulative == 40.0
+
+    other = torchliter.engine.buffers.ThroughputMeter(clock=clock)
+    other.load_state_dict(meter.reduce([meter.state_dict(), meter.state_dict()]))
+    assert other.cumulative == 80.0
+
+
+def test_time_window_smoother():
+    clock = FakeClock()
+    smoother = torchliter.engine.buffers.TimeWindowSmoother(
+        1.0, sync_every=2, clock=clock
+    )
+    for x in range(4):
+        smoother(torch.tensor(float(x)) if x % 2 else x)
+        clock.now += 0.4
+    assert len(smoother) == 3
+    assert smoother.mean == 2.5
+    clock.now += 0.5
+    assert smoother.summary()["max"] == 3.0 and smoother.min == 3.0
+
+    state = smoother.state_dict()
+    other = torchliter.engine.buffers.TimeWindowSmoother(1.0, clock=clock)
+    other.load_state_dict(smoother.reduce([state]))
+    assert other.mean == 3.0
+    clock.now += 0.5
+    assert other.mean == 0.0
@@ -0,0 +1,165 @@
+import os
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.nn.functional as F
+
+import torchliter
+
+
+def train_step(_, batch, **kwargs):
+    x, y = batch
+    loss = F.mse_loss(_.model(x), y)
+    _.optimizer.zero_grad()
+    loss.backward()
+    _.optimizer.step()
+
+    yield "loss", loss.detach()
+    yield "samples", [len(x)]
+
+
+def _worker(rank, world_size, init_file, out_dir):
+    dist.init_process_group(
+        "gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size
+    )
+    try:
+        torch.manual_seed(0)
+        model = nn.Linear(2, 1)
+        data = [(torch.randn(2), torch.randn(1)) for _ in range(16)]
+
+        @torchliter.engine.events.PostEpochHandler.config()
+        def mark_epoch(engine):
+            with open(os.path.join(out_dir, f"epoch_{engine.rank}"), "w") as f:
+                f.write(str(engine.epoch))
+
+        reduced = []
+
+        @torchliter.engine.events.PostEpochHandler.config(rank_zero_only=False)
+        def record(engine):
+            reduced.append((sum(engine.samples.values), len(engine.loss)))
+
+        EngineClass = torchliter.engine.DistributedAutoEngine.build(
+            "DDPEngine", train_step
+        )
+        engine = EngineClass(
+            mark_epoch,
+            record,
+            model=model,
+            optimizer=torch.optim.SGD(model.parameters(), lr=0.1),
+            loader=torch.utils.data.DataLoader(data, batch_size=2, shuffle=True),
+            loss=torchliter.buffers.ScalarSummaryStatistics(),
+            samples=torchliter.buffers.SequenceContainer(),
+        )
+        engine(torchliter.stub.Train("loader")(2))
+
+        assert isinstance(engine.model, nn.parallel.DistributedDataParallel)
+        assert isinstance(
+            engine.loader.sampler, torch.utils.data.distributed.DistributedSampler
+        )
+        assert engine.iteration == 4
+
+        torch.save(
+            {
+                "reduced": reduced,
+                "samples": sum(engine.samples.values),
+                "loss_count": len(engine.loss),
+                "weight": engine.state_dict()["model"]["model"]["weight"],
+            },
+            os.path.join(out_dir, f"result_{rank}.pt"),
+        )
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.skipif(not dist.is_available(), reason="torch.distributed unavailable")
+def test_distributed_auto_engine(tmp_path):
+    world_size = 2
+    mp.spawn(
+        _worker,
+        args=(world_size, str(tmp_path / "init"), str(tmp_path)),
+        nprocs=world_size,
+        join=True,
+    )
+
+    results = [torch.load(tmp_path / f"result_{r}.pt") for r in range(world_size)]
+    for result in results:
+        # buffers are reduced across ranks for the handlers, without counting
+        # the values of the previous epochs twice
+        assert result["reduced"] == [(16, 8), (32, 16)]
+        # the local values are restored afterwards
+        assert result["loss_count"] == 8
+    assert sum(result["samples"] for result in results) == 32
+    assert torch.equal(results[0]["weight"], results[1]["weight"])
+
+    # post epoch handlers run on rank 0 only
+    assert (tmp_path / "epoch_0").read_text() == "2"
+    assert not (tmp_path / "epoch_1").exists()
+
+
+def accumulation_step(_, batch, **kwargs):
+    x, y = batch
+    _.backward(F.mse_loss(_.model(x), y))
+    # gradients are all-reduced at the accumulation boundaries only
+    grad = _.model.module.weight.grad.clone()
+    _.grads.append((_.is_accumulation_boundary, grad))
+    _.optimizer_step()
+    yield "loss", 0.0
+
+
+def _accumulation_worker(rank, world_size, init_file, out_dir):
+    dist.init_process_group(
+        "gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size
+    )
+    try:
+        torch.manual_seed(0)
+        model = nn.Linear(2, 1)
+        data = [(torch.randn(2), torch.randn(1)) for _ in range(16)]
+        EngineClass = torchliter.engine.DistributedAutoEngine.build(
+            "DDPEngine", accumulation_step
+        )
+        engine = EngineClass(
+            model=model,
+            optimizer=torch.optim.SGD(model.parameters(), lr=0.1),
+            loader=torch.utils.data.DataLoader(data, batch_size=2),
+            loss=torchliter.buffers.ScalarSummaryStatistics(),
+        )
+        engine.grads = []
+        engine(torchliter.stub.Train("loader", accumulate=2)(1))
+        assert engine.iteration == 2
+
+        torch.save(
+            {
+                "grads": engine.grads,
+                "weight": engine.state_dict()["model"]["model"]["weight"],
+            },
+            os.path.join(out_dir, f"accumulation_{rank}.pt"),
+        )
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.skipif(not dist.is_available(), reason="torch.distributed unavailable")
+def test_distributed_gradient_accumulation(tmp_path):
+    world_size = 2
+    mp.spawn(
+        _accumulation_worker,
+        args=(world_size, str(tmp_path / "init"), str(tmp_path)),
+        nprocs=world_size,
+        join=True,
+    )
+
+    results = [torch.load(tmp_path / f"accumulation_{r}.pt") for r in range(world_size)]
+    grads = [result["grads"] for result in results]
+    assert [boundary for boundary, _ in grads[0]] == [False, True] * 2
+    for (boundary, a), (_, b) in zip(*grads):
+        # local gradients before the boundaries, reduced ones at the boundaries
+        assert torch.equal(a, b) == boundary
+    assert torch.equal(results[0]["weight"], results[1]["weight"])
+
+
+def test_distributed_auto_engine_requires_process_group():
+    with pytest.raises(RuntimeError):
+        torchliter.engine.DistributedAutoEngine()
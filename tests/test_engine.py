@@ -1,5 +1,6 @@
 import inspect
 
+import pytest
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -60,6 +61,53 @@ def test_engine_base():
     trainer.load_state_dict(state_dict)
 
 
+class PrefetchEngine(torchliter.engine.EngineBase):
+    def __init__(self):
+        super().__init__()
+        self.dataloader = torch.utils.data.DataLoader(
+            torch.arange(100).float(), batch_size=10
+        )
+        self.seen = []
+
+    def double(self, batch):
+        return 2 * batch
+
+    def per_batch(self, batch):
+        if batch[0] == 20:
+            raise torchliter.exception.ContinueIteration
+        if batch[0] == 120:
+            raise torchliter.exception.BreakIteration
+        self.seen.append(int(batch[0]))
+
+
+def test_throughput_meter_is_fed_by_engine():
+    engine = SimpleEngine()
+    engine.throughput = torchliter.engine.buffers.ThroughputMeter()
+    engine(torchliter.stub.Train("dataloader")(1))
+    # the first batch is timed from the start of the epoch
+    assert engine.throughput._units == len(engine.dataloader.dataset)
+    assert engine.throughput.cumulative > 0
+    assert engine.throughput.eta == 0.0
+
+    assert torchliter.engine.utils.infer_batch_size({"x": [torch.ones(3, 2)]}) == 3
+    assert torchliter.engine.utils.infer_batch_size([1, 2]) is None
+
+
+def test_engine_prefetch():
+    engine = PrefetchEngine()
+    engine(torchliter.stub.Train("dataloader", prefetch=2, transfer="double")(1))
+    assert engine.seen == [0, 40, 60, 80, 100]
+    assert engine.iteration == 5
+
+    engine = PrefetchEngine()
+    engine.prefetch = 4
+    engine(
+        torchliter.stub.Evaluate("dataloader")(1)
+        + torchliter.stub.Lambda("double", dataloader="dataloader")(1)
+    )
+    assert engine.seen == [0, 10, 30, 40, 50, 60, 70, 80, 90] * 2
+
+
 def test_cart():
     cart = torchliter.engine.auto.Cart(
         model=torch.nn.Linear(1, 1),
@@ -213,3 +261,258 @@ def test_auto_engine():
 
     assert test_engine.train_kwarg.mean == 0.618
     assert test_engine.eval_kwarg.mean == 0.618
+
+
+def test_gradient_accumulation():
+    cart = torchliter.engine.auto.Cart()
+    cart.model = nn.Linear(1, 2)
+    cart.train_loader = torch.utils.data.DataLoader(
+        [(torch.randn(1), i % 2) for i in range(20)], batch_size=2
+    )
+    cart.optimizer = torch.optim.SGD(cart.model.parameters(), lr=0.1)
+    cart.micro = torchliter.engine.buffers.ScalarSummaryStatistics()
+    cart.steps = torchliter.engine.buffers.SequenceContainer()
+    cart.tokens = torchliter.engine.buffers.ThroughputMeter(auto=False)
+    cart.hist = torchliter.engine.buffers.HistogramBuffer(-1.0, 1.0)
+
+    def train_step(_, batch, **kwargs):
+        image, target = batch
+        loss = F.cross_entropy(_.model(image), target)
+        _.backward(loss)
+        stepped = _.optimizer_step()
+
+        yield "micro", float(_.micro_iteration)
+        yield "steps", [stepped]
+        yield "tokens", 3
+        # micro-batches of different shapes
+        yield "hist", torch.zeros(_.micro_iteration + 1, 2)
+
+    calls = []
+
+    @torchliter.engine.events.PostIterationHandler.config(every=1)
+    def count_steps(engine):
+        calls.append(engine.iteration)
+
+    TestEngineClass = torchliter.engine.AutoEngine.build("TestEngine", train_step)
+    test_engine = TestEngineClass(count_steps, **cart.kwargs)
+    test_engine(torchliter.stub.Train("train_loader", accumulate=4)(1))
+
+    assert test_engine.epoch_length == 3
+    assert calls == [1, 2, 3]
+    assert len(test_engine.micro) == 3
+    assert test_engine.micro.max == 1.5
+    assert test_engine.micro.min == 0.5
+    assert test_engine.steps.values == [False, False, False, True] * 2 + [False, True]
+    # the units of the micro-batches are added, the first step starts the meter
+    assert test_engine.tokens._units == 4 * 3 + 2 * 3
+    # every value is binned
+    assert test_engine.hist.count == 2 * (10 + 10 + 3)
+
+
+def test_gradient_accumulation_skipped_batch():
+    class SkippingEngine(torchliter.engine.EngineBase):
+        def __init__(self):
+            super().__init__()
+            self.dataloader = torch.utils.data.DataLoader(
+                torch.arange(10), batch_size=1
+            )
+            self.groups = [[]]
+
+        def per_batch(self, batch):
+            if batch.item() == 4:
+                raise torchliter.exception.ContinueIteration
+            self.groups[-1].append(batch.item())
+
+        def after_iteration(self):
+            self.groups.append([])
+
+    engine = SkippingEngine()
+    engine(torchliter.stub.Train("dataloader", accumulate=3)(1))
+
+    assert engine.epoch_length == 4
+    assert engine.iteration == 4
+    assert engine.groups == [[0, 1, 2], [3, 5], [6, 7, 8], [9], []]
+
+
+def test_engine_profiling():
+    engine = torchliter.engine.Engine()
+    engine.dataloader = torch.utils.data.DataLoader(torch.randn(20, 1), batch_size=5)
+    engine.per_batch = lambda batch: None
+
+    @engine.attach_event
+    @torchliter.engine.events.PostIterationHandler.config(every=2)
+    def log(_):
+        pass
+
+    engine.enable_profiling(window=10)
+    # the timings are not part of the state of the engine
+    assert "profile_per_batch" not in engine.buffer_registry
+
+    engine(torchliter.stub.Train("dataloader")(2))
+
+    summary = engine.profile_summary()
+    assert summary["phases"]["per_batch"]["count"] == 8
+    assert summary["phases"]["data_fetch"]["count"] == 8
+    assert summary["phases"]["epoch_finishes"]["count"] == 2
+    assert summary["handlers"]["after_iteration/log"]["count"] == 4
+    assert engine.profile_after_iteration.state_dict()["count"] == 8
+
+    plain = torchliter.engine.Engine()
+    plain.load_state_dict(engine.state_dict())
+
+    engine.disable_profiling()
+    assert not hasattr(engine, "profile_per_batch")
+    assert engine.per_batch.__name__ == "<lambda>"
+
+
+def test_engine_handler_watchdog():
+    import time
+
+    engine = torchliter.engine.Engine()
+    engine.dataloader = torch.utils.data.DataLoader(torch.randn(20, 1), batch_size=5)
+    engine.per_batch = lambda batch: None
+
+    def slow(_):
+        time.sleep(0.002)
+
+    def fast(_):
+        pass
+
+    engine.attach_event(torchliter.engine.events.PostIterationHandler(slow))
+    engine.attach_event(torchliter.engine.events.PostEpochHandler(fast))
+
+    alerts = []
+    engine.enable_watchdog(budget=0.001, share=0.5, callback=alerts.append)
+    engine(torchliter.stub.Train("dataloader")(1))
+
+    assert {(a.name, a.reason) for a in alerts} == {
+        ("after_iteration/slow", "budget"),
+    }
+    assert len(alerts) == 4
+
+    engine.enable_watchdog(share=0.5, check_every=1)
+    with pytest.warns(UserWarning, match="after_iteration/slow"):
+        engine(torchliter.stub.Train("dataloader")(1))
+
+    report = engine.top_handlers(k=1)
+    assert len(report) == 1
+    assert report[0]["name"] == "after_iteration/slow"
+    assert report[0]["action"] == "slow"
+    assert report[0]["trigger"] == "default_trigger"
+    assert report[0]["count"] == 8
+    assert report[0]["share"] > 0.5
+
+    # callable objects are named by their type, the epoch phases are part of
+    # the engine time
+    class SlowEpoch:
+        def __call__(self, engine):
+            time.sleep(0.01)
+
+    engine = torchliter.engine.Engine()
+    engine.dataloader = torch.utils.data.DataLoader(torch.randn(20, 1), batch_size=5)
+    engine.per_batch = lambda batch: None
+    engine.attach_event(torchliter.engine.events.PostEpochHandler(SlowEpoch()))
+    engine.enable_profiling()
+    engine(torchliter.stub.Train("dataloader")(2))
+
+    report = engine.top_handlers(k=1)
+    assert report[0]["name"] == "epoch_finishes/SlowEpoch"
+    assert report[0]["action"] == "SlowEpoch"
+    assert 0.5 < report[0]["share"] <= 1.0
+
+
+class CountingDataset(torch.utils.data.Dataset):
+    def __init__(self):
+        self.loaded = 0
+
+    def __len__(self):
+        return 20
+
+    def __getitem__(self, index):
+        self.loaded += 1
+        return index
+
+
+class ResumableEngine(torchliter.engine.EngineBase):
+    def __init__(self, interrupt_at=None):
+        super().__init__()
+        self.dataset = CountingDataset()
+        self.dataloader = torch.utils.data.DataLoader(
+            self.dataset, batch_size=2, shuffle=True
+        )
+        self.interrupt_at = interrupt_at
+        self.seen = []
+
+    def per_batch(self, batch):
+        if len(self.seen) == self.interrupt_at:
+            raise KeyboardInterrupt
+        self.seen.append(batch.tolist())
+
+
+def test_engine_mid_epoch_resume():
+    torch.manual_seed(0)
+    reference = ResumableEngine()
+    reference(torchliter.stub.Train("dataloader")(1))
+
+    torch.manual_seed(0)
+    interrupted = ResumableEngine(interrupt_at=4)
+    interrupted(torchliter.stub.Train("dataloader")(1))
+    assert interrupted.iteration == 4
+    state_dict = interrupted.state_dict()
+    assert len(state_dict["engine"]["stubs"]) == 1
+
+    torch.manual_seed(1)
+    resumed = ResumableEngine()
+    resumed.load_state_dict(state_dict)
+    resumed()
+
+    assert interrupted.seen + resumed.seen == reference.seen
+    assert resumed.iteration == 10
+    assert resumed.epoch == 1
+    # skipped batches are not loaded
+    assert resumed.dataset.loaded == 12
+    assert len(resumed.state_dict()["engine"]["stubs"]) == 0
+
+    # the restored stubs are discarded if the engine is given new stubs
+    other = ResumableEngine()
+    other.load_state_dict(state_dict)
+    assert len(other.state_dict()["engine"]["stubs"]) == 1
+    other([torchliter.stub.Evaluate("dataloader")])
+    assert len(other.seen) == 10
+    assert [type(s) for s in other.stubs_done] == [torchliter.stub.Evaluate]
+    assert len(other.state_dict()["engine"]["stubs"]) == 0
+
+
+def test_engine_save_stubs_with_callables(tmp_path):
+    engine = ResumableEngine(interrupt_at=4)
+    engine(torchliter.stub.Train("dataloader", transfer=lambda batch: batch)(2))
+    with pytest.warns(UserWarning, match="transfer"):
+        torch.save(engine.state_dict(), tmp_path / "engine.pt")
+
+    resumed = ResumableEngine()
+    resumed.load_state_dict(torch.load(tmp_path / "engine.pt", weights_only=False))
+    resumed()
+    assert resumed.epoch == 2
+
+
+def test_engine_lazy_repeat_stub():
+    trainer = SimpleEngine()
+    trainer(torchliter.stub.Train("dataloader")(3, lazy=True))
+
+    assert trainer.epoch == 3
+    assert trainer.total_iteration == 3000 // 10
+    assert len(trainer.stubs_done) == 3
+    assert all(isinstance(s, torchliter.stub.Train) for s in trainer.stubs_done)
+
+    # the remaining copies are checkpointed as one stub
+    engine = ResumableEngine(interrupt_at=4)
+    engine(torchliter.stub.Train("dataloader")(3, lazy=True))
+    stubs = engine.state_dict()["engine"]["stubs"]
+    assert [s["type"] for s in stubs] == ["Train", "Repeat"]
+    assert stubs[1]["kwargs"]["times"] == 2
+
+    resumed = ResumableEngine()
+    resumed.load_state_dict(engine.state_dict())
+    resumed()
+    assert resumed.epoch == 3
+    assert len(resumed.seen) == 10 - 4 + 2 * 10
@@ -1,3 +1,5 @@
+import pytest
+
 import torchliter.engine.utils as utils
 
 
@@ -15,3 +17,27 @@ def test_find_outputs():
         yield "var3,5", 3
 
     assert utils._find_output_names(_gen) == ["var1,2", "var2,3", "var3,5"]
+
+
+def test_batch_prefetcher():
+    prefetcher = utils.BatchPrefetcher(range(10), depth=3, transfer=lambda x: 2 * x)
+    assert len(prefetcher) == 10
+    assert list(prefetcher) == [2 * i for i in range(10)]
+
+    with pytest.raises(RuntimeError):
+        list(prefetcher)
+
+    def _broken():
+        yield 0
+        raise ValueError("broken")
+
+    prefetcher = utils.BatchPrefetcher(_broken(), depth=1)
+    with pytest.raises(ValueError):
+        list(prefetcher)
+
+    prefetcher = utils.BatchPrefetcher(range(1000), depth=2)
+    for x in prefetcher:
+        if x == 3:
+            break
+    prefetcher.close()
+    assert not prefetcher._thread.is_alive()
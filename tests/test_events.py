@@ -1,6 +1,16 @@
+import threading
+import time
 from dataclasses import dataclass
 
+import numpy as np
+import pytest
+import torch
+
+from torchliter.engine.buffers import ExponentialMovingAverage
 from torchliter.engine.events import *
+from torchliter.engine.executor import EngineSnapshot
+from torchliter.exception import BreakIteration
+from torchliter.stub import Evaluate, Train
 
 
 @dataclass
@@ -211,3 +221,370 @@ def test_engine():
     assert len(ng.list_events("before_iteration")) == 1 and isinstance(
         ng.list_events("before_iteration")[0], PreIterationHandler
     )
+
+
+def test_engine_dispatch_plan():
+
+    ng = Engine()
+    calls = []
+
+    @PostIterationHandler.config(every=3)
+    def every_third(engine):
+        calls.append(("every_third", engine.iteration))
+
+    @PostIterationHandler.config(every=2, train_stub=False)
+    def eval_only(engine):
+        calls.append(("eval_only", engine.iteration))
+
+    ng.attach_event(every_third)
+    ng.attach_event(eval_only)
+
+    assert every_third.schedule == Schedule("iteration", 3, True, True, False)
+
+    ng.current_stub = Train("loader")
+    for i in range(7):
+        ng.iteration = i
+        ng.after_iteration()
+
+    assert calls == [("every_third", 0), ("every_third", 3), ("every_third", 6)]
+
+    # attaching a handler recompiles the plan
+    @PostIterationHandler.config(trigger_function=lambda g: g.iteration == 1)
+    def custom(engine):
+        calls.append(("custom", engine.iteration))
+
+    ng.attach_event(custom)
+
+    assert custom.schedule is None
+
+    calls.clear()
+    ng.current_stub = Evaluate("loader")
+    for i in range(4):
+        ng.iteration = i
+        ng.after_iteration()
+
+    assert calls == [
+        ("every_third", 0),
+        ("eval_only", 0),
+        ("custom", 1),
+        ("eval_only", 2),
+        ("every_third", 3),
+    ]
+
+    # iteration resets at a new epoch
+    calls.clear()
+    ng.current_stub = Train("loader")
+    ng.epoch += 1
+    ng.iteration = 0
+    ng.after_iteration()
+    assert calls == [("every_third", 0)]
+
+
+def test_engine_dispatch_plan_repeated_values():
+
+    ng = Engine()
+    ng.train_loader = torch.utils.data.DataLoader(torch.randn(4, 1), batch_size=1)
+    ng.eval_loader = torch.utils.data.DataLoader(torch.randn(3, 1), batch_size=1)
+    ng.per_batch = lambda batch: None
+    iterations, epochs = [], []
+
+    @PostIterationHandler.config(every=2)
+    def every_other(engine):
+        iterations.append((engine.current_stub.dataloader, engine.iteration))
+
+    @PostEpochHandler.config()
+    def every_epoch(engine):
+        epochs.append((engine.current_stub.dataloader, engine.epoch))
+
+    ng.attach_event(every_other)
+    ng.attach_event(every_epoch)
+    ng(
+        [
+            Train("train_loader"),
+            Evaluate("eval_loader"),
+            Evaluate("eval_loader"),
+            Train("train_loader"),
+        ]
+    )
+
+    # `iteration` stays at 0 in evaluate stubs, the handler is due at every batch
+    assert iterations == [
+        ("train_loader", 2),
+        ("train_loader", 4),
+    ] + [
+        ("eval_loader", 0)
+    ] * 6 + [("train_loader", 2), ("train_loader", 4)]
+    # `epoch` does not advance in evaluate stubs either
+    assert epochs == [
+        ("train_loader", 1),
+        ("eval_loader", 1),
+        ("eval_loader", 1),
+        ("train_loader", 2),
+    ]
+
+    # values that repeat without being due are skipped
+    calls = []
+    ng = Engine()
+    ng.attach_event(PostIterationHandler(lambda g: calls.append(g.iteration), every=2))
+    ng.current_stub = Evaluate("loader")
+    for i in (1, 1, 2, 2, 3):
+        ng.iteration = i
+        ng.after_iteration()
+    assert calls == [2, 2]
+
+
+def test_async_handlers():
+
+    ng = Engine()
+    ng.ema = ExponentialMovingAverage(0.5)
+    ng.dataloader = torch.utils.data.DataLoader(torch.arange(10.0), batch_size=1)
+    ng.per_batch = lambda batch: ng.ema.update(batch.item())
+    seen = []
+    threads = set()
+
+    @PostIterationHandler.config(async_=True, max_pending=2, snapshot_buffers=["ema"])
+    def log(snapshot):
+        time.sleep(0.001)
+        threads.add(threading.get_ident())
+        seen.append((snapshot.iteration, snapshot.buffers["ema"]["mean"]))
+
+    ng.attach_event(log)
+    ng(Train("dataloader")(1))
+
+    # flushed at exit, in order, off the engine thread
+    assert [i for i, _ in seen] == list(range(1, 11))
+    assert seen[0][1] == 0.0 and seen[-1][1] == ng.ema.mean
+    assert threading.get_ident() not in threads
+
+    with pytest.raises(TypeError):
+        snapshot = EngineSnapshot.take(ng)
+        snapshot.buffers["ema"]["mean"] = 1.0
+
+    # dropped when the queue is full
+    release = threading.Event()
+
+    @PostIterationHandler.config(async_=True, max_pending=1, backpressure="drop")
+    def slow(snapshot):
+        release.wait()
+
+    ng.attach_event(slow)
+    ng.current_stub = Train("dataloader")
+    for i in range(5):
+        ng.iteration = i
+        ng.after_iteration()
+    release.set()
+    assert ng.flush_events()
+    assert ng.async_executor.dropped[slow] == 4
+
+    # no buffer is summarized by default
+    snapshots = []
+    ng.attach_event(PreEpochHandler(snapshots.append, async_=True))
+    ng.when_epoch_starts()
+    assert ng.flush_events()
+    assert len(snapshots) == 1 and len(snapshots[0].buffers) == 0
+
+    # errors are raised at flush
+    @PreEpochHandler.config(async_=True)
+    def fail(snapshot):
+        raise RuntimeError("fail")
+
+    ng.attach_event(fail)
+    ng.when_epoch_starts()
+    with pytest.raises(RuntimeError):
+        ng.flush_events()
+
+    with pytest.raises(ValueError):
+        PostIterationHandler(lambda _: None, backpressure="wait")
+
+    # errors of the handlers do not mask an interrupt, the threads are stopped
+    def interrupt(batch):
+        if batch.item() == 3:
+            raise KeyboardInterrupt
+
+    ng = Engine()
+    ng.dataloader = torch.utils.data.DataLoader(torch.arange(10.0), batch_size=1)
+    ng.per_batch = interrupt
+
+    @PostIterationHandler.config(async_=True)
+    def fail_often(snapshot):
+        raise RuntimeError("fail")
+
+    ng.attach_event(fail_often)
+    with pytest.warns(UserWarning, match="fail"):
+        ng(Train("dataloader")(1))
+    assert ng.iteration == 3 and len(ng.stubs_in_queue) == 1
+    assert ng.async_executor._pool is None
+
+    # otherwise they are raised when the engine finishes
+    ng.per_batch = lambda batch: None
+    with pytest.raises(RuntimeError):
+        ng()
+    assert ng.async_executor._pool is None
+
+    # and when the engine is reset
+    ng.current_stub = Train("dataloader")
+    ng.after_iteration()
+    assert ng.async_executor._pool is not None
+    ng.reset_engine()
+    assert ng.async_executor._pool is None
+    with pytest.raises(RuntimeError):
+        ng.flush_events()
+
+
+def test_handler_priorities_and_detach():
+
+    ng = Engine()
+    ng.current_stub = Train("loader")
+    calls = []
+
+    def record(name):
+        return lambda engine: calls.append((name, engine.iteration))
+
+    low = ng.attach_event(PostIterationHandler(record("low"), priority=-1))
+    first = ng.attach_event(PostIterationHandler(record("first")))
+    high = ng.attach_event(PostIterationHandler(record("high")), priority=10)
+    second = ng.attach_event(PostIterationHandler(record("second")))
+    warmup = ng.attach_event(
+        PostIterationHandler(
+            record("warmup"), trigger_function=lambda g: g.iteration >= 1, once=True
+        )
+    )
+
+    assert isinstance(high, HandlerHandle)
+    assert ng.list_events("after_iteration")[0] is high.handler
+
+    ng.after_iteration()
+    assert [name for name, _ in calls] == ["high", "first", "second", "low"]
+
+    # one-shot handlers leave the registry after firing
+    calls.clear()
+    ng.iteration = 1
+    ng.after_iteration()
+    assert ("warmup", 1) in calls
+    assert not warmup.attached
+    assert len(ng.list_events("after_iteration")) == 4
+
+    calls.clear()
+    ng.iteration = 2
+    first.disable()
+    second.detach()
+    ng.after_iteration()
+    assert [name for name, _ in calls] == ["high", "low"]
+    assert len(ng.list_events("after_iteration")) == 3
+
+    calls.clear()
+    first.enable()
+    ng.after_iteration()
+    assert [name for name, _ in calls] == ["high", "first", "low"]
+
+    with pytest.raises(ValueError):
+        ng.attach_event(low.handler)
+
+
+def test_global_wall_clock_and_sample_triggers():
+
+    ng = Engine()
+    ng.train_loader = torch.utils.data.DataLoader(torch.randn(30, 1), batch_size=4)
+    ng.eval_loader = torch.utils.data.DataLoader(torch.randn(8, 1), batch_size=4)
+    ng.per_batch = lambda batch: None
+    calls = []
+
+    @PostIterationHandler.config(every=5, level="global_iteration")
+    def every_five(engine):
+        calls.append(("global", engine.global_iteration))
+
+    @PostIterationHandler.config(every=20, level="samples", eval_stub=False)
+    def every_twenty_samples(engine):
+        calls.append(("samples", engine.samples_seen))
+
+    ng.attach_event(every_five)
+    ng.attach_event(every_twenty_samples)
+    assert every_five.schedule == Schedule("global_iteration", 5)
+
+    # epochs of 8 iterations, the cadence does not restart with the epoch
+    ng([Train("train_loader"), Evaluate("eval_loader"), Train("train_loader")])
+
+    assert ng.global_iteration == 16 and ng.samples_seen == 60
+    assert [v for k, v in calls if k == "global"] == [5, 10, 15]
+    # fired when a multiple of 20 is crossed, the last batch of an epoch has 2
+    assert [v for k, v in calls if k == "samples"] == [20, 42, 60]
+    assert ng.state_dict()["engine"]["global_iteration"] == 16
+
+    # wall-clock deadlines
+    @PostEpochHandler.config(every=60.0, level="seconds")
+    def every_minute(engine):
+        calls.append(("seconds", int(engine.elapsed_seconds // 60)))
+
+    ng.attach_event(every_minute)
+    calls.clear()
+    ng.when_epoch_finishes()
+    assert calls == []
+    ng._clock_start -= 150
+    ng.when_epoch_finishes()
+    ng.when_epoch_finishes()
+    assert calls == [("seconds", 2)]
+
+    # the default trigger supports the same levels
+    handler = PostIterationHandler(lambda _: None, every=5, level="global_iteration")
+    ng.global_iteration = 4
+    assert not handler.trigger(ng)
+    ng.global_iteration = 6
+    assert handler.trigger(ng) and not handler.trigger(ng)
+
+    # crossings start over when the engine is reset or loaded
+    ng = Engine()
+    ng.train_loader = torch.utils.data.DataLoader(torch.randn(40, 1), batch_size=4)
+    ng.per_batch = lambda batch: None
+    calls = []
+    ng.attach_event(
+        PostIterationHandler(
+            lambda engine: calls.append(engine.global_iteration),
+            every=4,
+            level="global_iteration",
+        )
+    )
+    ng([Train("train_loader")])
+    ng.reset_engine()
+    ng([Train("train_loader")])
+    assert calls == [4, 8, 4, 8]
+
+    state = ng.state_dict()
+    state["engine"]["global_iteration"] = 10
+    calls.clear()
+    ng.load_state_dict(state)
+    ng([Train("train_loader")])
+    assert calls == [12, 16, 20]
+
+    with pytest.raises(ValueError):
+        PostIterationHandler(lambda _: None, level="minutes")
+
+
+def test_aggregated_iteration_handler():
+
+    ng = Engine()
+    ng.dataloader = torch.utils.data.DataLoader(torch.arange(10.0), batch_size=1)
+    ng.ema = ExponentialMovingAverage(0.5)
+    blocks = []
+
+    def per_batch(batch):
+        ng.ema.update(batch[0])
+        if ng.global_iteration == 13:
+            raise BreakIteration(True)
+
+    ng.per_batch = per_batch
+
+    @AggregatedIterationHandler.config(fields=("global_iteration", "ema.mean"), size=4)
+    def export(engine, block):
+        blocks.append(block)
+
+    ng.attach_event(export)
+    ng(Train("dataloader")(2))
+
+    # blocks of 4 rows, flushed at the end of the epoch and at the break
+    assert [len(b["global_iteration"]) for b in blocks] == [4, 4, 2, 3]
+    rows = np.concatenate([b["global_iteration"] for b in blocks])
+    assert rows.tolist() == list(range(1, 14))
+    means = np.concatenate([b["ema.mean"] for b in blocks])
+    assert isinstance(blocks[0]["ema.mean"], np.ndarray)
+    assert means[0] == 0.0 and means[1] == 0.5 and means[-1] != means[-2]
+    assert len(export) == 0
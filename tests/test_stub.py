@@ -1,3 +1,5 @@
+import pytest
+
 import torchliter
 
 
@@ -7,7 +9,7 @@ def test_train_stub():
 
     assert s.dataloader == "loader"
 
-    assert "iteration" in s.__dict__
+    assert "iteration" in s.state_dict()["kwargs"]
 
     assert s.iteration == 0
 
@@ -27,7 +29,7 @@ def test_lambda_stub():
 
     s = torchliter.stub.Lambda("_method_name&*")
 
-    assert "action" in s.__dict__
+    assert "action" in s.state_dict()["kwargs"]
     assert s.action == "_method_name__"
 
     print(s)
@@ -38,3 +40,59 @@ def test_stub_duplicate():
     assert torchliter.stub.StubBase(kw="kw")(0) is None
 
     assert len(torchliter.stub.StubBase(kw="kw")(10)) == 10
+
+
+def test_stub_state_dict():
+
+    s = torchliter.stub.Train("loader", accumulate=2)
+    s.iteration = 10
+
+    t = torchliter.stub.build_stub(s.state_dict())
+
+    assert isinstance(t, torchliter.stub.Train)
+    assert t.iteration == 10
+    assert t.accumulate == 2
+
+    s = torchliter.stub.build_stub(torchliter.stub.Lambda("hello").state_dict())
+    assert s.action == "hello"
+
+    # attributes that cannot be pickled are dropped
+    s = torchliter.stub.Train("loader", transfer=lambda batch: batch, accumulate=2)
+    (r,) = s(2, lazy=True)
+    with pytest.warns(UserWarning, match="transfer"):
+        t = torchliter.stub.build_stub(r.state_dict())
+    assert not hasattr(t.stub, "transfer") and t.stub.accumulate == 2
+
+
+def test_stub_slots():
+
+    s = torchliter.stub.Train("loader")
+    assert vars(s) == {}
+
+    s = torchliter.stub.Train("loader", accumulate=2)
+    assert vars(s) == {"accumulate": 2}
+    assert s.replicate(1)[0].accumulate == 2
+    assert "accumulate" in repr(s)
+
+
+def test_repeat_stub():
+
+    (r,) = torchliter.stub.Train("loader", accumulate=2)(3, lazy=True)
+
+    assert isinstance(r, torchliter.stub.Repeat)
+    assert len(r) == 3
+
+    s = r.pop()
+    assert isinstance(s, torchliter.stub.Train)
+    assert s.accumulate == 2
+    assert s is not r.stub
+    assert len(r) == 2
+    assert len(r.expand()) == 2
+
+    t = torchliter.stub.build_stub(r.state_dict())
+    assert isinstance(t, torchliter.stub.Repeat)
+    assert isinstance(t.stub, torchliter.stub.Train)
+    assert t.stub.accumulate == 2
+    assert len(t) == 2
+
+    print(r)
@@ -1,4 +1,8 @@
 import os
+import subprocess
+import sys
+
+import torch
 
 import torchliter
 
@@ -26,3 +30,79 @@ def test_csv_writer():
         assert string == "a,b\n0.1,0.2\n0.1,0.2\n"
 
     os.remove("tmp.csv")
+
+
+def test_checkpoint_writer(tmp_path):
+
+    engine = torchliter.engine.EngineBase()
+    engine.model = torch.nn.Linear(2, 2)
+    engine.optimizer = torch.optim.Adam(engine.model.parameters())
+    engine.smoother = torchliter.buffers.ScalarSmoother(3)
+    engine.smoother(1.0)
+
+    with torchliter.writer.CheckpointWriter(
+        str(tmp_path), keep_last=2, keep_every=2
+    ) as writer:
+        print(writer)
+        paths = []
+        for epoch in range(1, 6):
+            engine.epoch = epoch
+            paths.append(writer.save(engine))
+            # the snapshot does not alias the live state
+            with torch.no_grad():
+                engine.model.weight.add_(1.0)
+            engine.smoother(2.0)
+        writer.wait()
+
+    files = sorted(os.listdir(tmp_path))
+    # epochs 3 and 5 are the last two rotated, even epochs 2 and 4 are kept
+    assert files == sorted(os.path.basename(paths[i]) for i in (1, 2, 3, 4))
+
+    state_dict = torch.load(paths[-1], weights_only=False)
+    assert state_dict["engine"]["epoch"] == 5
+    assert torch.allclose(
+        state_dict["model"]["model"]["weight"], engine.model.weight.detach() - 1.0
+    )
+    assert list(state_dict["buffer"]["smoother"]["queue"]) == [2.0, 2.0, 2.0]
+
+    # writers are callable actions of event handlers
+    with torchliter.writer.CheckpointWriter(str(tmp_path)) as writer:
+        handler = torchliter.engine.events.PostEpochHandler(writer)
+        assert repr(handler).splitlines()[-1].strip() == "CheckpointWriter"
+
+
+def test_checkpoint_writer_exit(tmp_path):
+    # the pending checkpoint is written when the interpreter exits
+    script = f"""
+import torch
+import torchliter
+
+engine = torchliter.engine.EngineBase()
+engine.model = torch.nn.Linear(256, 256)
+writer = torchliter.writer.CheckpointWriter({str(tmp_path)!r})
+writer.save(engine, tag="last")
+"""
+    stale = tmp_path / ".tmp-checkpoint-epoch0001-iter000000-abc.pt"
+    stale.write_bytes(b"")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-c", script], check=True, env=env)
+
+    assert sorted(os.listdir(tmp_path)) == ["checkpoint-last.pt"]
+    state_dict = torch.load(tmp_path / "checkpoint-last.pt", weights_only=False)
+    assert state_dict["model"]["model"]["weight"].shape == (256, 256)
+
+
+def test_checkpoint_writer_handler(tmp_path):
+    # the checkpoints of writers attached to an engine are written when the
+    # engine finishes
+    engine = torchliter.engine.Engine()
+    engine.model = torch.nn.Linear(2, 2)
+    engine.dataloader = torch.utils.data.DataLoader(torch.randn(4, 2), batch_size=2)
+    engine.per_batch = lambda batch: None
+    writer = torchliter.writer.CheckpointWriter(str(tmp_path), keep_last=None)
+    engine.attach_event(torchliter.engine.events.PostEpochHandler(writer))
+    engine(torchliter.stub.Train("dataloader")(2))
+
+    assert writer._queue.unfinished_tasks == 0
+    assert len(os.listdir(tmp_path)) == 2
+    writer.close()